@@ -1,60 +1,236 @@
+import contextlib
+import copy
 import json
 import os
+import shutil
+import time
+import uuid
+from collections import Counter
 from logging import Logger
 from os import path
 
+import numpy as np
 import pandas as pd
 import seaborn as sns
+from flatland.envs.line_generators import sparse_line_generator
+from flatland.envs.rail_env import RailEnv
+from flatland.envs.rail_generators import sparse_rail_generator
 from matplotlib import pyplot as plt
 
+from rasch.file import create_path_if_not_exist, read_from_pickle_file
+from rasch.horizon import estimate_horizon
+from rasch.instance_generation import generate_instance_lines
+from rasch.job_queue import JobQueue
 from rasch.rasch_config import RaSchConfig, get_config, get_horizons
-from rasch.rasch_setup import solve_with_timeout
+from rasch.results_store import (
+     ResultsStore,
+     environment_seed,
+     file_hash,
+     flatten_statistics,
+     git_revision,
+)
+from rasch.scaling import (
+     find_regressions,
+     scaling_cases,
+     scaling_points,
+     write_environments,
+)
+from rasch.worker_pool import WorkerPool, solve_kwargs
 
 #TODO: (bonus) async
 
+RESULT_KEYS = ['fl_result', 'summary', 'solving', 'problem', 'horizon', 'horizon_source', 'instance', 'solver_options', 'models', 'validation', 'cache', 'peak_memory', 'phases', 'profile', 'anytime', 'strategy', 'schedule', 'prioritized', 'cbs', 'rolling', 'pipeline']
+
+COMPARE_METRICS = ['summary.times.total', 'summary.times.solve', 'solving.solvers.choices', 'problem.lp.atoms', 'schedule.flowtime']
+""" Columns of the results store that compare reports, medians of the successful runs."""
+
+def outcome(result: dict) -> str:
+     """fl_result, successful runs whose search was interrupted are solved, not proven optimal"""
+     optimality = (result.get('anytime') or {}).get('optimality')
+     if(result['fl_result'] == "success" and optimality == "not proven optimal"):
+          return "solved, not proven optimal"
+     return result['fl_result']
+
 class Benchmark:
      def __init__(self, *,
                  logger: Logger,
                  config: RaSchConfig = get_config()) -> None:
         self._logger = logger
         self._config = config
+        self.throughput = 0.0
+        """ Finished jobs per minute of the last run_jobs call."""
 
      def basic_save(self, stats:dict, name = 'test') -> None:
           """save stats from dict to a json"""
 
+          create_path_if_not_exist(path=self._config.statistics_output_path)
           full_path = os.path.join(self._config.statistics_output_path, f'{name}_stats.json')
 
           self._logger.info(f"Statistics saved to: {full_path}")
           with open(full_path, 'w') as f: 
                json.dump(stats, f, indent=4,sort_keys=True,separators=(',', ': '))
 
-     def bench_envs(self, args, enc_name: str, save: bool) -> dict:
-          """
-          benchmark one encoding on all environments found in flatland_environments_path from the config
-          """
+     def _store(self) -> ResultsStore:
+          """results store in the statistics output path"""
+          return ResultsStore(os.path.join(self._config.statistics_output_path, self._config.results_store))
+
+     def _run_row(self, args, job: tuple[str, str, int], result: dict, name: str, batch: str, mode: str) -> dict:
+          """metadata and flattened statistics of a finished job for the results store"""
+          enc_name, env_name, limit = job
+          git_hash, git_dirty = git_revision()
+          enc_dir = self._config.encodings_path(incremental=args.incremental, compressed=args.compressed,
+                                                windows=getattr(args, 'windows', False), rolling=getattr(args, 'rolling', False))
+          return {
+               **flatten_statistics(result),
+               'recorded': time.time(),
+               'batch': batch,
+               'benchmark': name,
+               'mode': mode,
+               'git_hash': git_hash,
+               'git_dirty': git_dirty,
+               'encoding': enc_name,
+               'encoding_hash': file_hash(os.path.join(enc_dir, f'{enc_name}.lp')),
+               'environment': env_name,
+               'seed': environment_seed(env_name),
+               'horizon': result.get('horizon', limit),
+               'threads': (result.get('solver_options') or {}).get('threads') or getattr(args, 'threads', None) or self._config.solver_threads,
+               'cache_hit': bool((result.get('cache') or {}).get('hit'))
+          }
+
+     def _result_stats(self, cc: dict) -> dict:
+          """pick the statistics of a successful run that are saved"""
+          return {key: cc[key] for key in RESULT_KEYS if key in cc}
+
+     def _encodings(self, args) -> list[str]:
+          """names of all encodings found in the encodings path of the solving mode"""
+          enc_dir = get_config().encodings_path(incremental=args.incremental, compressed=args.compressed,
+                                                windows=getattr(args, 'windows', False), rolling=getattr(args, 'rolling', False))
+          return [os.path.splitext(enc)[0] for enc in sorted(os.listdir(enc_dir)) if enc.endswith('.lp')]
+
+     def _horizon(self, env_name: str) -> int:
+          """horizon of an environment, estimated or from the rasch_horizon table depending on horizon_source, -1 if there is none"""
+          if(get_config().horizon_source == 'config'):
+               return get_horizons(key=env_name, logger=self._logger)
+
+          env = read_from_pickle_file(f'{env_name}.pkl')
+          env.reset()
+          limit = estimate_horizon(env)
+          if(limit is None):
+               self._logger.warning(f"An agent can not reach its target in {env_name}, skipping.")
+               return -1
+          return limit
+
+     def _env_jobs(self, enc_name: str) -> list[tuple[str, str, int]]:
+          """(encoding, environment, horizon) jobs for all environments with a horizon"""
           env_dir = get_config().flatland_environments_path
-          args.encoding = enc_name
-          stats = {}
+          jobs = []
 
-          for env in os.listdir(env_dir): #iterate through environments
+          for env in sorted(os.listdir(env_dir)): #iterate through environments
                if not env.endswith('.pkl'):
                     continue
-               args.environment = os.path.splitext(env)[0]
+               env_name = os.path.splitext(env)[0]
 
-               args.limit = get_horizons(key=args.environment, logger=self._logger)
-               if(args.limit==-1): #skip environment if no horizon is defined
+               limit = self._horizon(env_name)
+               if(limit==-1): #skip environment if no horizon is defined
                     continue
 
-               cc = solve_with_timeout(args=args, logger=self._logger)
-
-               if(cc['fl_result']=="success"):
-                    stats[args.environment] = {
-                         'fl_result': cc['fl_result'],
-                         'summary': cc['summary'], 
-                         'solving': cc['solving']
-                    }
+               jobs.append((enc_name, env_name, limit))
+
+          return jobs
+
+     def _job_kwargs(self, args, job: tuple[str, str, int]) -> dict:
+          """solve_and_simulate arguments of a single job"""
+          job_args = copy.copy(args)
+          job_args.encoding, job_args.environment, job_args.limit = job
+          job_args.no_cache = True #a cached result would report the timings of an earlier run as measured now
+          return solve_kwargs(job_args)
+
+     def _mode(self, args) -> str:
+          """name of the solving mode of args"""
+          mode = '_'.join(flag for flag in ['incremental', 'compressed', 'windows', 'rolling'] if getattr(args, flag, False)) or 'default'
+          if(getattr(args, 'threads', None)):
+               mode += f'_t{args.threads}'
+          if(getattr(args, 'strategy', None) not in (None, 'monolithic')):
+               mode += f'_{args.strategy}'
+          if(getattr(args, 'heuristic', None)):
+               mode += f'_{args.heuristic.lower()}'
+          return mode
+
+     def _jobs_path(self, args, name: str) -> str:
+          """directory of the job results of a benchmark in the solving mode of args on the current commit,
+          so a new commit solves every job again instead of resuming the results of the last one"""
+          git_hash, git_dirty = git_revision()
+          revision = (git_hash[:12] + ('_dirty' if git_dirty else '')) if git_hash else 'no_git'
+          return os.path.join(self._config.statistics_output_path, 'jobs', name, self._mode(args), revision)
+
+     def _clear_jobs(self, args, name: str) -> None:
+          """forget the finished jobs of a benchmark on the current commit, on disk and in the job queue of args.queue"""
+          jobs_path = self._jobs_path(args, name)
+          shutil.rmtree(jobs_path)
+          if(getattr(args, 'queue', None)): #the queue would answer the next submit with the old results
+               JobQueue(args.queue).clear(jobs_path)
+
+     def run_jobs(self, args, jobs: list[tuple[str, str, int]], name: str) -> dict:
+          """
+          run (encoding, environment, horizon) jobs on a pool of warm worker processes,
+          or publish them to the job queue file args.queue and wait for the workers there.
+          every result is written to disk as soon as it is finished and appended to the results store,
+          jobs that already have a result on disk are skipped
+          """
+          jobs_path = self._jobs_path(args, name)
+          create_path_if_not_exist(path=jobs_path)
+
+          results = {}
+          pending = []
+          for job in jobs:
+               job_file = os.path.join(jobs_path, '{}_{}_{}.json'.format(*job))
+               if os.path.exists(job_file): #resume from earlier run
+                    with open(job_file, 'r') as f:
+                         results[job] = json.load(f)
+               else:
+                    pending.append(job)
+
+          store = self._store()
+          batch = uuid.uuid4().hex #runs of this call share a batch
+          start_time = time.perf_counter()
+          with contextlib.ExitStack() as stack:
+               if(getattr(args, 'queue', None)): #workers started with rasch worker solve the jobs
+                    job_queue = JobQueue(args.queue)
+                    job_queue.submit(jobs_path, {job: self._job_kwargs(args, job) for job in pending})
+                    self._logger.info(f"Published {len(pending)} jobs to {args.queue}, {len(results)} already done.")
+                    finished = job_queue.results(jobs_path, pending)
                else:
-                    stats[args.environment] = cc
+                    processes = args.processes or self._config.benchmark_processes
+                    self._logger.info(f"Running {len(pending)} jobs on {processes} processes, {len(results)} already done.")
+                    pool = stack.enter_context(WorkerPool(processes=processes, pipeline_depth=self._config.pipeline_depth))
+                    for job in pending:
+                         pool.submit(job, self._job_kwargs(args, job))
+                    finished = pool.results()
+
+               for job, cc in finished:
+                    results[job] = self._result_stats(cc) if cc['fl_result']=="success" else dict(cc)
+
+                    job_file = os.path.join(jobs_path, '{}_{}_{}.json'.format(*job))
+                    with open(f'{job_file}.tmp', 'w') as f:
+                         json.dump(results[job], f)
+                    os.replace(f'{job_file}.tmp', job_file) #never leave a partial result behind
+                    store.append(self._run_row(args, job, results[job], name, batch, self._mode(args)))
+
+          elapsed = time.perf_counter() - start_time
+          self.throughput = len(pending) / elapsed * 60 if pending else 0.0
+          self._logger.info(f"Finished {len(pending)} jobs in {elapsed:.1f}s ({self.throughput:.2f} jobs per minute).")
+
+          outcomes = Counter(outcome(result) for result in results.values())
+          self._logger.info("Outcomes: " + ", ".join(f"{count} {name}" for name, count in outcomes.most_common()))
+
+          return results
+
+     def bench_envs(self, args, enc_name: str, save: bool) -> dict:
+          """
+          benchmark one encoding on all environments found in flatland_environments_path from the config
+          """
+          results = self.run_jobs(args, self._env_jobs(enc_name), name=enc_name)
+          stats = {env_name: result for (_, env_name, _), result in results.items()}
           
           if(save):
                _stats = {
@@ -69,83 +245,278 @@ class Benchmark:
           """
           benchmark one environment on all encodings found in asp_encodings_path from the config
           """
-          enc_dir = get_config().asp_encodings_path
+          limit = self._horizon(env_name) if args.limit is None else int(args.limit)
+          if(limit==-1):
+               return {}
+          jobs = [(enc_name, env_name, limit) for enc_name in self._encodings(args)]
+          results = self.run_jobs(args, jobs, name=env_name)
+          stats = {enc_name: {env_name: result} for (enc_name, env_name, _), result in results.items()}
+
+          if(save):
+               self.basic_save(stats=stats, name=env_name)
+
+          return stats
+
+     def bench_all(self, args, save = True) -> dict:
+          jobs = [job for enc_name in self._encodings(args) for job in self._env_jobs(enc_name)]
+          results = self.run_jobs(args, jobs, name="all")
           stats = {}
 
-          for enc in os.listdir(enc_dir): #iterate through encodings
-               if not enc.endswith('.lp'):
-                    continue
-               args.encoding = os.path.splitext(enc)[0]
+          for (enc_name, env_name, _), result in results.items():
+               stats.setdefault(enc_name, {})[env_name] = result
 
-               stats[args.encoding] = {}
+          if(save):
+               self.basic_save(stats=stats, name="all") #save to json
+          
+          return stats
      
-               cc = solve_with_timeout(args=args, logger=self._logger)
-
-               if(cc['fl_result']=="success"):
-                    stats[args.encoding][env_name] = {
-                         'fl_result': cc['fl_result'],
-                         'summary': cc['summary'], 
-                         'solving': cc['solving']
-                    }
-               else:
-                    stats[args.encoding][env_name] = cc
+     def bench_threads(self, args, enc_name: str, thread_counts = (1, 2, 4, 8), save = True) -> dict:
+          """
+          benchmark one encoding on all environments with different numbers of solver threads
+          """
+          args = copy.copy(args)
+          args.processes = 1 #parallel jobs would compete with the solver threads
+          stats = {}
+
+          for threads in thread_counts:
+               args.threads = threads
+               results = self.run_jobs(args, self._env_jobs(enc_name), name=enc_name)
+               stats[threads] = {env_name: result for (_, env_name, _), result in results.items()}
+
+          for env_name, result in stats[thread_counts[0]].items(): #wall clock speedup to the first thread count
+               if(result['fl_result']!="success"):
+                    continue
+               for threads in thread_counts[1:]:
+                    other = stats[threads][env_name]
+                    if(other['fl_result']=="success"):
+                         speedup = result['summary']['times']['total'] / other['summary']['times']['total']
+                         self._logger.info(f"{env_name}: {threads} threads are {speedup:.2f}x as fast as {thread_counts[0]}.")
 
           if(save):
-               self.basic_save(stats=stats, name=env_name)
+               self.basic_save(stats={enc_name: stats}, name=f"{enc_name}_threads")
 
           return stats
 
-     def bench_all(self, args, save = True) -> dict:
-          enc_dir = get_config().asp_encodings_path
+     def bench_windows(self, args, enc_name: str, save = True) -> dict:
+          """
+          compare the ground program of one encoding with and without reachability windows on all environments
+          """
           stats = {}
+          for windows in (False, True):
+               args = copy.copy(args)
+               args.windows = windows
+               results = self.run_jobs(args, self._env_jobs(enc_name), name=enc_name)
+               stats['windows' if windows else 'default'] = {env_name: result for (_, env_name, _), result in results.items()}
+
+          reduction = {}
+          for env_name, result in stats['default'].items():
+               other = stats['windows'].get(env_name, {})
+               if('problem' not in result or 'problem' not in other):
+                    continue
+               reduction[env_name] = {key: 1 - other['problem']['lp'][key] / result['problem']['lp'][key]
+                                      for key in ('atoms', 'rules')}
+               self._logger.info(f"{env_name}: {reduction[env_name]['atoms']:.0%} fewer ground atoms, "
+                                 f"{reduction[env_name]['rules']:.0%} fewer ground rules with windows.")
+          stats['reduction'] = reduction
+
+          if(save):
+               self.basic_save(stats={enc_name: stats}, name=f"{enc_name}_windows")
 
-          for enc in os.listdir(enc_dir): #iterate through encodings
-               if not enc.endswith('.lp'):
+          return stats
+
+     def bench_heuristic(self, args, enc_name: str, save = True) -> dict:
+          """
+          compare choices, conflicts and time to the first model of one encoding with and without domain heuristics on all environments
+          """
+          stats = {}
+          for heuristic in (None, 'Domain'):
+               args = copy.copy(args)
+               args.heuristic = heuristic
+               results = self.run_jobs(args, self._env_jobs(enc_name), name=enc_name)
+               stats[heuristic or 'default'] = {env_name: result for (_, env_name, _), result in results.items()}
+
+          comparison = {}
+          for env_name, result in stats['default'].items():
+               other = stats['Domain'].get(env_name, {})
+               if('solving' not in result or 'solving' not in other):
                     continue
-               enc_name = os.path.splitext(enc)[0]
+               comparison[env_name] = {key: {'default': result['solving']['solvers'][key],
+                                             'domain': other['solving']['solvers'][key]}
+                                       for key in ('choices', 'conflicts')}
+               comparison[env_name]['first_model_time'] = {'default': (result.get('anytime') or {}).get('first_model_time'),
+                                                           'domain': (other.get('anytime') or {}).get('first_model_time')}
+               self._logger.info(f"{env_name}: {other['solving']['solvers']['choices']:.0f} choices instead of "
+                                 f"{result['solving']['solvers']['choices']:.0f}, {other['solving']['solvers']['conflicts']:.0f} "
+                                 f"conflicts instead of {result['solving']['solvers']['conflicts']:.0f} with domain heuristics.")
+          stats['comparison'] = comparison
 
-               stats[enc_name] = self.bench_envs(enc_name=enc_name, args=args, save=False)
+          if(save):
+               self.basic_save(stats={enc_name: stats}, name=f"{enc_name}_heuristic")
+
+          return stats
 
+     def bench_scaling(self, args, update_baseline = False, save = True) -> list[str]:
+          """
+          benchmark all encodings on generated environments of growing size and agent count,
+          compare the scaling curves to the stored baseline and return the regressions.
+          every strategy from scaling_strategies gets its own curves, named encoding@strategy
+          except for monolithic, and is compared to the monolithic solve
+          """
+          cases = scaling_cases()
+          envs = write_environments(cases)
+
+          args = copy.copy(args)
+          args.environments_path = self._config.scaling_environments_path
+          args.no_cache = True #cached statistics would hide regressions
+
+          limits = {}
+          for case in cases:
+               limits[case.name] = estimate_horizon(envs[case.name])
+               if(limits[case.name] is None):
+                    self._logger.warning(f"An agent can not reach its target in {case.name}, skipping.")
+
+          results = {}
+          throughput = {}
+          for strategy in self._config.scaling_strategies:
+               args.strategy = strategy
+               enc_names = self._encodings(args)
+               if(strategy == 'prioritized'): #only encodings with reservations can be planned by priority
+                    enc_names = [enc_name for enc_name in enc_names
+                                 if os.path.exists(f"{self._config.asp_reservations_path}{enc_name}.lp")]
+               if(strategy == 'cbs'): #only encodings with cbs constraints can plan single agents
+                    enc_names = [enc_name for enc_name in enc_names
+                                 if os.path.exists(f"{self._config.asp_cbs_path}{enc_name}.lp")]
+               jobs = [(enc_name, case.name, limits[case.name]) for case in cases if limits[case.name] is not None
+                       for enc_name in enc_names]
+
+               for (enc_name, env_name, _), result in self.run_jobs(args, jobs, name="scaling").items():
+                    label = enc_name if strategy == 'monolithic' else f"{enc_name}@{strategy}"
+                    results.setdefault(label, {})[env_name] = result
+               throughput[strategy] = self.throughput
+               self._clear_jobs(args, "scaling") #only resume unfinished runs, a new run measures again
+
+          points = scaling_points(results, cases)
+          self._compare_strategies(points, throughput)
           if(save):
-               self.basic_save(stats=stats, name="all") #save to json
-          
+               self.basic_save(stats={'points': points, 'runs': results, 'throughput': throughput}, name="scaling")
+               self.visualise_scaling(points)
+
+          regressions = []
+          baseline_path = self._config.scaling_baseline_path
+          if(os.path.exists(baseline_path) and not update_baseline):
+               with open(baseline_path, 'r') as f:
+                    regressions = find_regressions(points, json.load(f))
+               for regression in regressions:
+                    self._logger.error(f"Scaling regression: {regression}")
+          else: #the first run or an intended change becomes the new baseline
+               create_path_if_not_exist(path=os.path.dirname(baseline_path))
+               with open(baseline_path, 'w') as f:
+                    json.dump(points, f, indent=4, sort_keys=True)
+               self._logger.info(f"Scaling baseline saved to: {baseline_path}")
+
+          return regressions
+
+     def _compare_strategies(self, points: dict, throughput: dict):
+          """log success rate, time and flowtime of every strategy next to the monolithic solve"""
+          for strategy, jobs_per_minute in throughput.items():
+               self._logger.info(f"{strategy}: {jobs_per_minute:.2f} jobs per minute.")
+
+          for label, enc_points in points.items():
+               if('@' not in label):
+                    continue
+               monolithic = points.get(label.split('@')[0], {})
+               for point_name, point in enc_points.items():
+                    other = monolithic.get(point_name)
+                    if(other is None):
+                         continue
+                    message = f"{label} {point_name}: success rate {other['success_rate']:.0%} -> {point['success_rate']:.0%}"
+                    for key in ('time', 'flowtime'):
+                         if(point[key] is not None and other[key] is not None):
+                              message += f", {key} {other[key]:.2f} -> {point[key]:.2f}"
+                    self._logger.info(message)
+
+     def bench_instance_generation(self, sizes = (50, 100, 200), repeats = 5, save = True) -> dict:
+          """
+          compare the cell by cell and the vectorised instance generation on all environments
+          found in flatland_environments_path and on generated sparse maps of the given sizes
+          """
+          env_dir = get_config().flatland_environments_path
+          envs = {}
+
+          for env in os.listdir(env_dir): #iterate through environments
+               if not env.endswith('.pkl'):
+                    continue
+               envs[os.path.splitext(env)[0]] = read_from_pickle_file(env)
+
+          for size in sizes: #generate large maps with fixed seeds
+               envs[f"{size}x{size}-sparse"] = RailEnv(width=size,
+                                                       height=size,
+                                                       number_of_agents=size // 10,
+                                                       rail_generator=sparse_rail_generator(max_num_cities=size // 10, seed=size),
+                                                       line_generator=sparse_line_generator(seed=size))
+
+          stats = {}
+          for env_name, env in envs.items():
+               env.reset()
+               times = {}
+               lines = {}
+               for vectorised in [False, True]:
+                    start_time = time.perf_counter()
+                    for _ in range(repeats):
+                         lines[vectorised] = generate_instance_lines(env, 20, vectorised=vectorised)
+                    times[vectorised] = (time.perf_counter() - start_time) / repeats
+
+               stats[env_name] = {
+                    'lines': len(lines[True]),
+                    'identical': lines[False] == lines[True],
+                    'loop': times[False],
+                    'vectorised': times[True],
+                    'speedup': times[False] / times[True]
+               }
+               self._logger.info(f"{env_name}: {stats[env_name]['speedup']:.2f}x faster instance generation.")
+
+               if not stats[env_name]['identical']:
+                    self._logger.error(f"Vectorised instance generation differs for {env_name}.")
+
+          if(save):
+               self.basic_save(stats=stats, name="instance_generation")
+
           return stats
-     
-     def visualise(self, file_path = path.join(get_config().statistics_output_path, 'all_stats.json')):
-          # Read the nested JSON file
-          with open(file_path, 'r') as file:
-               stats = json.load(file)
-
-          # create Dataframe readable for seaborn
-          lst = []
-          for encoding in stats:  
-               for environment in stats[encoding]:
-                    if(stats[encoding][environment]["fl_result"] == "success"):
-                         tmp_lst = [
-                              encoding,
-                              environment,
-                              stats[encoding][environment]["solving"]["solvers"]["choices"],
-                              stats[encoding][environment]["solving"]["solvers"]["conflicts"],
-                              stats[encoding][environment]["summary"]["times"]["total"],
-                              stats[encoding][environment]["summary"]["times"]["solve"],
-                              "success"
-                         ]
-                    else:
-                         tmp_lst = [
-                              encoding,
-                              environment,
-                              None,
-                              None,
-                              None,
-                              None,
-                              stats[encoding][environment]["fl_result"]
-                         ]
-                    lst.append(tmp_lst)
-
-          df = pd.DataFrame(lst, columns=["enc","env","choices","conflicts","total","solve", "fl_result"])#.fillna(-1)
-
-          # Create a grouped bar plot
-          fig, axes = plt.subplots(ncols=2, figsize=(10, 5))
+
+     def visualise(self, file_path = path.join(get_config().statistics_output_path, get_config().results_store)):
+          """
+          plot choices, conflicts, times and phases of the newest run of every encoding and environment
+          in the results store, or of the runs in a json file saved by basic_save
+          """
+          if(file_path.endswith('.json')):
+               with open(file_path, 'r') as file:
+                    stats = json.load(file)
+               runs = pd.json_normalize([{'encoding': encoding, 'environment': environment, **result}
+                                         for encoding, results in stats.items() for environment, result in results.items()])
+          else:
+               runs = ResultsStore(file_path).latest()
+          runs = runs.reindex(columns=runs.columns.union(['solving.solvers.choices', 'solving.solvers.conflicts',
+                                                          'summary.times.total', 'summary.times.solve', 'anytime.optimality'], sort=False))
+
+          # create Dataframe readable for seaborn, statistics of failed runs are left empty
+          success = runs['fl_result'] == "success"
+          df = pd.DataFrame({
+               'enc': runs['encoding'],
+               'env': runs['environment'],
+               'choices': runs['solving.solvers.choices'].where(success),
+               'conflicts': runs['solving.solvers.conflicts'].where(success),
+               'total': runs['summary.times.total'].where(success),
+               'solve': runs['summary.times.solve'].where(success),
+               'fl_result': runs['fl_result'].mask(success & (runs['anytime.optimality'] == "not proven optimal"),
+                                                   "solved, not proven optimal")
+          })
+
+          phases = runs.filter(regex=r'^phases\..+\.self$').dropna(how='all') #wall time outside nested phases, e.g. simulate without step and render
+          phases.columns = phases.columns.str.slice(len('phases.'), -len('.self'))
+          phases.index = (runs['encoding'] + "\n" + runs['environment']).loc[phases.index]
+
+          # Create a grouped bar plot, with a third plot for the phases if they were measured
+          fig, axes = plt.subplots(ncols=2 if phases.empty else 3, figsize=(10 if phases.empty else 15, 5))
           
           #Barplot 1
           sns.barplot(x='env', y='choices', hue='enc', data=df, palette='muted', ax=axes[0], legend=False)
@@ -169,9 +540,61 @@ class Benchmark:
           #for container in axes[1].containers:
                #axes[1].bar_label(container, fmt='%.2f', size=6)
 
+          #Barplot 3
+          if(not phases.empty): #nested phases are not counted twice, the stack is the measured time
+               phases.groupby(level=0).sum().plot(kind='bar', stacked=True, ax=axes[2])
+               axes[2].set(title='Time per Phase', xlabel='Run', ylabel='Time [s]')
+               axes[2].set_xticks(ticks=axes[2].get_xticks(), labels=axes[2].get_xticklabels(), rotation=45, ha='right') #rotate
+               axes[2].legend(title='Phase', fontsize=6)
+
           sns.set_theme(font_scale=1)
           plt.tight_layout()
           plt.show()
           fig.savefig('test.png',dpi=300)
 
+     def compare(self, revisions: list[str], metrics = COMPARE_METRICS, file_path = None) -> pd.DataFrame:
+          """
+          compare the runs of two commits in the results store per encoding, environment and solving mode.
+          reports the success rate and the medians of metrics over the successful runs of every commit
+          and the ratio of the second commit to the first, saved as csv in the statistics output path
+          """
+          revisions = list(dict.fromkeys(revisions))
+          runs = ResultsStore(file_path or self._store().path).revisions(
+               revisions, ['encoding', 'environment', 'mode', 'fl_result', *metrics])
+          runs['revision'] = np.select([runs['git_hash'].str.startswith(revision) for revision in revisions], revisions, default=None)
+          success = runs['fl_result'] == "success"
+          runs[metrics] = runs[metrics].apply(pd.to_numeric, errors='coerce').where(success, axis=0)
+
+          table = runs.assign(success=success).groupby(['encoding', 'environment', 'mode', 'revision']) \
+               .agg(success_rate=('success', 'mean'), **{metric: (metric, 'median') for metric in metrics}) \
+               .unstack('revision')
+          first, second = revisions[0], revisions[-1]
+          table = table.reindex(columns=pd.MultiIndex.from_product([['success_rate', *metrics], [*revisions, 'ratio']]))
+          for metric in ['success_rate', *metrics]:
+               table[(metric, 'ratio')] = table[(metric, second)] / table[(metric, first)]
+
+          create_path_if_not_exist(path=self._config.statistics_output_path)
+          full_path = os.path.join(self._config.statistics_output_path, f'compare_{first}_{second}.csv')
+          table.to_csv(full_path)
+          self._logger.info(f"{len(runs)} runs of {', '.join(revisions)}:\n{table.to_string()}")
+          self._logger.info(f"Comparison saved to: {full_path}")
+          return table
+
+     def visualise_scaling(self, points: dict, file_name = 'scaling.png'):
+          """plot ground size, time and success rate of every encoding over the number of cells"""
+          df = pd.DataFrame([{'enc': enc_name, **point} for enc_name, enc_points in points.items()
+                             for point in enc_points.values()])
+
+          fig, axes = plt.subplots(ncols=3, figsize=(15, 5))
+          for ax, (key, title, label) in zip(axes, [('atoms', 'Ground Atoms', 'Atoms'),
+                                                     ('time', 'Total Time', 'Time [s]'),
+                                                     ('success_rate', 'Success Rate', '')]):
+               sns.lineplot(x='cells', y=key, hue='enc', style='agents', markers=True, data=df, ax=ax)
+               ax.set(title=title, xlabel='Cells', ylabel=label)
+          axes[0].set_yscale('log')
 
+          plt.tight_layout()
+          full_path = os.path.join(self._config.statistics_output_path, file_name)
+          fig.savefig(full_path, dpi=300)
+          plt.close(fig)
+          self._logger.info(f"Scaling curves saved to: {full_path}")
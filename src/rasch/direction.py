@@ -14,3 +14,7 @@ class Direction(Enum):
     """ South"""
     w = 3
     """ West"""
+
+
+DIFFS = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+""" Position differences to the adjacent cell for each direction (north, east, south, west)."""
@@ -0,0 +1,48 @@
+import math
+
+from flatland.envs.rail_env import RailEnv
+
+from rasch.instance_generation import goal_distances
+from rasch.rasch_config import get_config
+
+
+def shortest_path_lengths(env: RailEnv) -> list[int | None]:
+    """ Get the number of moves every agent needs to its target without other agents.
+
+        Read from the goal_distances of the (position, orientation) states of the rail.
+
+        Returns:
+            Number of moves by agent, None if the target can not be reached
+    """
+    lengths = []
+    for agent, distances in zip(env.agents, goal_distances(env)):
+        distance = distances[(*agent.initial_position, agent.initial_direction)]
+        lengths.append(None if distance < 0 else int(distance))
+    return lengths
+
+
+def estimate_horizon(env: RailEnv,
+                     slack: int | None = None,
+                     slack_factor: float | None = None) -> int | None:
+    """ Estimate a horizon from the longest shortest path of all agents.
+
+        The longest path is a lower bound for the horizon. Slack leaves room
+        for agents waiting for each other: horizon = longest * (1 + slack_factor) + slack.
+
+        Args:
+            env: Environment with agents
+            slack: Steps added to the lower bound, horizon_slack from the config if None
+            slack_factor: Share of the lower bound that is added, horizon_slack_factor from the config if None
+
+        Returns:
+            Horizon, None if an agent can not reach its target
+    """
+    slack = get_config().horizon_slack if slack is None else slack
+    slack_factor = get_config().horizon_slack_factor if slack_factor is None else slack_factor
+
+    lengths = shortest_path_lengths(env)
+    if not lengths or None in lengths:
+        return None
+
+    longest = max(lengths)
+    return longest + math.ceil(longest * slack_factor) + slack
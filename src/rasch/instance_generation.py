@@ -1,11 +1,26 @@
 import logging
+from collections.abc import Iterator
 
+import numpy as np
+from clingo import Function, Number, Symbol, Tuple_
 from flatland.envs.rail_env import RailEnv
+from flatland.envs.step_utils.states import TrainState
 
-from rasch.direction import Direction
+from rasch.direction import DIFFS, Direction
 
 logger = logging.getLogger("railway")
 
+NIBBLE_DIRECTIONS = [[direction for direction in Direction if (nibble >> (3 - direction.value)) & 1]
+                     for nibble in range(16)]
+""" Possible directions for every 4 bit transition value of an agent orientation."""
+
+NIBBLE_COUNT = np.array([len(directions) for directions in NIBBLE_DIRECTIONS])
+""" Number of possible directions for every 4 bit transition value."""
+
+NIBBLE_LITERALS = [f"({';'.join(str(direction.value) for direction in directions)})"
+                   for directions in NIBBLE_DIRECTIONS]
+""" Possible directions as ASP pool for every 4 bit transition value."""
+
 
 def schedule_literal(agent) -> str:
     """ Get agent schedule as ASP literal."""
@@ -24,28 +39,12 @@ def cell_literal(x: int, y: int, agent_orientation: Direction, directions: list[
     return f"cell(({x},{y}),{agent_orientation.value},({';'.join([str(direction.value) for direction in directions])}))."
 
 
-def generate_instance_lines(env: RailEnv, limit: int) -> list[str]:
-    """ Generate ASP instance lines from Flatland environment."""
-
-    # TODO: Error handling? Yes? No? Maybe? I dont know! Can you repeat the question...
-    if (env.rail is None):
-        return []
-
-    logger.debug("Generating ASP instance.")
-
-    limit_literal = f"limit({limit})."
-
-    schedules = ["",
-                 "% (agentID,start,target,starting-orientation,earliest-departure)",
-                 *[schedule_literal(agent) for agent in env.agents]
-                 ]
-
-    logger.debug(f"{len(schedules)} schedule literals done.")
+def cell_transitions(env: RailEnv) -> Iterator[tuple[int, int, Direction, list[Direction]]]:
+    """ Decode the transitions of every rail cell.
 
-    cells = [
-        "",
-        "%grid definition cell((Y,X),train orientation, (possible directions))"
-    ]
+        Yields (y, x, agent orientation, possible directions) in the order
+        in which the cell literals are written to the instance.
+    """
     for y, row in enumerate(env.rail.grid):
         for x, cell in enumerate(row):
             if not cell:
@@ -66,12 +65,295 @@ def generate_instance_lines(env: RailEnv, limit: int) -> list[str]:
                         # add the possibility to move
                         # off of it in case the agent starts on it
                         if j == (i+2) % 4:
-                            cells.append(cell_literal(
-                                y, x, Direction(j), [Direction(j)]))
+                            yield y, x, Direction(j), [Direction(j)]
 
                 if len(valid_directions) > 0:
-                    cells.append(cell_literal(
-                        y, x, Direction(i), valid_directions))
+                    yield y, x, Direction(i), valid_directions
+
+
+def transition_nibbles(env: RailEnv) -> np.ndarray:
+    """ Get the transition bits of every cell and agent orientation.
+
+        nibbles[y, x, i] holds the possible directions when facing i,
+        bit 3-d is set if direction d is possible.
+    """
+    grid = np.asarray(env.rail.grid, dtype=np.uint16)
+    return (grid[..., np.newaxis] >> (12 - 4 * np.arange(4))) & 0xF
+
+
+def cell_transition_table(env: RailEnv) -> np.ndarray:
+    """ Decode the transitions of every rail cell at once.
+
+        Returns one row (y, x, agent orientation, transition bits) per cell literal
+        in the same order as cell_transitions. Bit 3-d of the transition bits
+        is set if direction d is possible.
+    """
+    orientations = np.arange(4)
+    nibbles = transition_nibbles(env)
+
+    # if the cell is a dead end add the possibility to move
+    # off of it in case the agent starts on it
+    backwards = (orientations + 2) % 4
+    dead_ends = (nibbles >> (3 - backwards)) & 1
+
+    # per orientation the dead end literal comes before the regular one
+    literals = np.stack([dead_ends, nibbles], axis=-1)
+    y, x, i, kind = np.nonzero(literals)
+
+    table = np.empty((len(y), 4), dtype=np.int64)
+    table[:, 0] = y
+    table[:, 1] = x
+    table[:, 2] = np.where(kind == 0, backwards[i], i)
+    table[:, 3] = np.where(kind == 0, 1 << (3 - backwards[i]), nibbles[y, x, i])
+
+    return table
+
+
+def cell_transition_bits(env: RailEnv) -> np.ndarray:
+    """ Get the transition bits of every cell and agent orientation as in the cell literals.
+
+        Unlike transition_nibbles this includes moving off dead ends.
+    """
+    bits = np.zeros((*np.shape(env.rail.grid), 4), dtype=np.int64)
+    y, x, orientation, nibble = cell_transition_table(env).T
+    np.bitwise_or.at(bits, (y, x, orientation), nibble)
+    return bits
+
+
+def _shift(array: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """ Move the first two axes of an array by (dy, dx), filling with zeros."""
+    height, width = array.shape[:2]
+    shifted = np.zeros_like(array)
+    shifted[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+        array[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+    return shifted
+
+
+def _distances(bits: np.ndarray, sources: np.ndarray, max_distance: int, reverse: bool = False) -> np.ndarray:
+    """ Breadth first search over (y, x, orientation) states, -1 for states further than max_distance.
+
+        With reverse the distance from every state to the sources is computed instead.
+    """
+    directions = [(bits >> (3 - direction)) & 1 == 1 for direction in range(4)]
+    distances = np.where(sources, 0, -1)
+    frontier = sources
+
+    for distance in range(1, max_distance + 1):
+        reached = np.zeros_like(frontier)
+        for direction, (dy, dx) in enumerate(DIFFS):
+            if reverse:  # states from which moving in direction enters a frontier state
+                reached |= _shift(frontier[..., direction], -dy, -dx)[..., np.newaxis] & directions[direction]
+            else:  # moving in direction enters the state (y + dy, x + dx, direction)
+                reached[..., direction] |= _shift((frontier & directions[direction]).any(axis=2), dy, dx)
+
+        frontier = reached & (distances < 0)
+        if not frontier.any():
+            break
+        distances[frontier] = distance
+
+    return distances
+
+
+def reachability_windows(env: RailEnv, limit: int) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+    """ Get the time window in which each agent can use each (cell, orientation).
+
+        The earliest time is the smallest number of moves from the start of the agent.
+        The latest time is the limit minus the smallest number of moves to the target.
+        Other agents are ignored, so every schedule stays inside these windows.
+
+        Yields:
+            (agent handle, earliest, latest) with arrays of shape (height, width, 4)
+            that are -1 where the agent can not be within limit + 1 moves
+    """
+    bits = cell_transition_bits(env)
+
+    for agent in env.agents:
+        start = np.zeros(bits.shape, dtype=bool)
+        start[(*agent.initial_position, agent.direction)] = True
+        target = np.zeros(bits.shape, dtype=bool)
+        target[tuple(agent.target)] = True
+
+        earliest = _distances(bits, start, limit + 1)
+        to_target = _distances(bits, target, limit + 1, reverse=True)
+
+        # keep states on a path of at most limit + 1 moves,
+        # encodings decide how moves relate to their time steps
+        usable = (earliest >= 0) & (to_target >= 0) & (earliest + to_target <= limit + 1)
+        yield (agent.handle,
+               np.where(usable, earliest, -1),
+               np.where(usable, limit - to_target, -1))
+
+
+def goal_distances(env: RailEnv) -> list[np.ndarray]:
+    """ Get the smallest number of moves from every (cell, orientation) to the target of each agent.
+
+        Returns:
+            Array of shape (height, width, 4) for each agent, -1 where the target can not be reached
+    """
+    bits = cell_transition_bits(env)
+    distances = []
+    for agent in env.agents:
+        target = np.zeros(bits.shape, dtype=bool)
+        target[tuple(agent.target)] = True
+        distances.append(_distances(bits, target, bits.size, reverse=True))
+    return distances
+
+
+def useful_states(env: RailEnv, limit: int | None = None) -> np.ndarray:
+    """ Get the (cell, orientation) states that lie on an oriented path from the start to the target of some agent.
+
+        With a limit only paths that fit into the horizon count, as in reachability_windows.
+
+        Returns:
+            Boolean array of shape (height, width, 4)
+    """
+    if limit is not None:
+        windows = [earliest >= 0 for _, earliest, _ in reachability_windows(env, limit)]
+        return np.logical_or.reduce(windows) if windows else np.zeros((*np.shape(env.rail.grid), 4), dtype=bool)
+
+    bits = cell_transition_bits(env)
+    useful = np.zeros(bits.shape, dtype=bool)
+    for agent, to_target in zip(env.agents, goal_distances(env)):
+        start = np.zeros(bits.shape, dtype=bool)
+        start[(*agent.initial_position, agent.direction)] = True
+        useful |= (_distances(bits, start, bits.size) >= 0) & (to_target >= 0)
+    return useful
+
+
+def prune_cell_table(env: RailEnv, table: np.ndarray, limit: int | None = None) -> np.ndarray:
+    """ Remove the rows of cell_transition_table that no agent can use on its way to its target.
+
+        Only whole (cell, orientation) states are removed. The directions of the states that are kept
+        stay the same, as the encodings derive the actions from the number of directions.
+    """
+    useful = useful_states(env, limit)
+    pruned = table[useful[table[:, 0], table[:, 1], table[:, 2]]]
+
+    transitions = NIBBLE_COUNT[table[:, 3]].sum() - NIBBLE_COUNT[pruned[:, 3]].sum()
+    cells = len(np.unique(table[:, :2], axis=0)) - len(np.unique(pruned[:, :2], axis=0))
+    logger.debug(f"Pruned {cells} cells and {transitions} transitions no agent can use.")
+    return pruned
+
+
+def generate_state_symbols(env: RailEnv, limit: int, distances: list[np.ndarray]) -> list[Symbol]:
+    """ Generate the facts of a planning window that starts at the current state of the environment.
+
+        Contains limit(L), a schedule for every agent that has not arrived yet, starting at its current
+        position and direction (the initial position if it is not on the map yet), and goal_distance(ID,(Y,X),O,D)
+        facts for the states the agent can reach within the window, taken from goal_distances.
+    """
+    bits = cell_transition_bits(env)
+    symbols = [Function("limit", [Number(limit)])]
+
+    for agent in env.agents:
+        if agent.state == TrainState.DONE:
+            continue
+        position = agent.position or agent.initial_position
+        symbols.append(Function("schedule", [Number(agent.handle),
+                                             position_symbol(position),
+                                             position_symbol(agent.target),
+                                             Number(agent.direction),
+                                             Number(0)]))
+
+        start = np.zeros(bits.shape, dtype=bool)
+        start[(*position, agent.direction)] = True
+        reachable = (_distances(bits, start, limit) >= 0) & (distances[agent.handle] >= 0)
+        for y, x, orientation in zip(*np.nonzero(reachable)):
+            symbols.append(Function("goal_distance", [Number(agent.handle),
+                                                      position_symbol((y, x)),
+                                                      Number(orientation),
+                                                      Number(distances[agent.handle][y, x, orientation])]))
+    return symbols
+
+
+def generate_heuristic_symbols(env: RailEnv, limit: int) -> list[Symbol]:
+    """ Generate toward_target(ID,(Y,X),O,D) facts for the domain heuristics in asp_heuristics_path.
+
+        Moving in direction D from cell (Y,X) in orientation O is a move on a shortest path
+        to the target of the agent, taken from goal_distances. Only states the agent
+        can reach within limit moves from its start are included.
+    """
+    bits = cell_transition_bits(env)
+    symbols = []
+    for agent, distances in zip(env.agents, goal_distances(env)):
+        start = np.zeros(bits.shape, dtype=bool)
+        start[(*agent.initial_position, agent.direction)] = True
+        reachable = (_distances(bits, start, limit) >= 0) & (distances > 0)
+
+        for direction, (dy, dx) in enumerate(DIFFS):
+            # distance of the state entered by moving in direction from every cell
+            following = _shift(distances[..., direction], -dy, -dx)[..., np.newaxis]
+            toward = reachable & ((bits >> (3 - direction)) & 1 == 1) & (following == distances - 1)
+            for y, x, orientation in zip(*np.nonzero(toward)):
+                symbols.append(Function("toward_target", [Number(agent.handle),
+                                                          position_symbol((y, x)),
+                                                          Number(orientation),
+                                                          Number(direction)]))
+    return symbols
+
+
+def generate_window_symbols(env: RailEnv, limit: int) -> list[Symbol]:
+    """ Generate window(ID,(Y,X),O,E,L) facts from reachability_windows as clingo symbols."""
+    symbols = []
+    for handle, earliest, latest in reachability_windows(env, limit):
+        for y, x, orientation in zip(*np.nonzero(earliest >= 0)):
+            symbols.append(Function("window", [Number(handle),
+                                               position_symbol((y, x)),
+                                               Number(orientation),
+                                               Number(earliest[y, x, orientation]),
+                                               Number(latest[y, x, orientation])]))
+    return symbols
+
+
+def generate_window_lines(env: RailEnv, limit: int) -> list[str]:
+    """ Generate window(ID,(Y,X),O,E,L) facts from reachability_windows as ASP instance lines."""
+    lines = ["", "% time windows window(agentID,(Y,X),orientation,earliest,latest)"]
+    for handle, earliest, latest in reachability_windows(env, limit):
+        lines.extend(f"window({handle},({y},{x}),{orientation},{earliest[y, x, orientation]},{latest[y, x, orientation]})."
+                     for y, x, orientation in zip(*np.nonzero(earliest >= 0)))
+    return lines
+
+
+def generate_instance_lines(env: RailEnv, limit: int, vectorised: bool = True, prune: bool = False) -> list[str]:
+    """ Generate ASP instance lines from Flatland environment.
+
+        Args:
+            env: Flatland environment to generate the instance of
+            limit: Horizon of the instance
+            vectorised: Decode the rail grid with NumPy instead of cell by cell
+            prune: Leave out the cells that no agent can use within the horizon, see prune_cell_table
+    """
+
+    # TODO: Error handling? Yes? No? Maybe? I dont know! Can you repeat the question...
+    if (env.rail is None):
+        return []
+
+    logger.debug("Generating ASP instance.")
+
+    limit_literal = f"limit({limit})."
+
+    schedules = ["",
+                 "% (agentID,start,target,starting-orientation,earliest-departure)",
+                 *[schedule_literal(agent) for agent in env.agents]
+                 ]
+
+    logger.debug(f"{len(schedules)} schedule literals done.")
+
+    cells = [
+        "",
+        "%grid definition cell((Y,X),train orientation, (possible directions))",
+    ]
+    if vectorised:
+        table = cell_transition_table(env)
+        if prune:
+            table = prune_cell_table(env, table, limit)
+        cells.extend(f"cell(({y},{x}),{orientation},{NIBBLE_LITERALS[nibble]})."
+                     for y, x, orientation, nibble in table.tolist())
+    else:
+        useful = useful_states(env, limit) if prune else None
+        cells.extend(cell_literal(y, x, orientation, directions)
+                     for y, x, orientation, directions in cell_transitions(env)
+                     if useful is None or useful[y, x, orientation.value])
 
     logger.debug(f"{len(cells)} cell literals done.")
 
@@ -85,3 +367,48 @@ def generate_instance_lines(env: RailEnv, limit: int) -> list[str]:
     ]
 
     return [limit_literal, *schedules, *cells, *diffs]
+
+
+def position_symbol(position: tuple[int, int]) -> Symbol:
+    """ Get grid position as ASP tuple."""
+    return Tuple_([Number(position[0]), Number(position[1])])
+
+
+def generate_instance_symbols(env: RailEnv, limit: int, prune: bool = False) -> list[Symbol]:
+    """ Generate ASP instance facts as clingo symbols from Flatland environment.
+
+        Contains the same facts as generate_instance_lines, but can be handed
+        to clingo directly without writing and parsing an instance file.
+        With prune the cells that no agent can use within the horizon are left out.
+    """
+    if (env.rail is None):
+        return []
+
+    logger.debug("Generating ASP instance symbols.")
+
+    symbols = [Function("limit", [Number(limit)])]
+
+    symbols.extend(
+        Function("schedule", [Number(agent.handle),
+                              position_symbol(agent.initial_position),
+                              position_symbol(agent.target),
+                              Number(agent.direction),
+                              Number(0)])
+        for agent in env.agents)
+
+    table = cell_transition_table(env)
+    if prune:
+        table = prune_cell_table(env, table, limit)
+    for y, x, orientation, nibble in table.tolist():
+        position = position_symbol((y, x))
+        symbols.extend(
+            Function("cell", [position, Number(orientation), Number(direction.value)])
+            for direction in NIBBLE_DIRECTIONS[nibble])
+
+    symbols.extend(
+        Function("diff", [Number(direction.value), Number(dy), Number(dx)])
+        for direction, (dy, dx) in zip(Direction, [(-1, 0), (0, 1), (1, 0), (0, -1)]))
+
+    logger.debug(f"{len(symbols)} instance symbols done.")
+
+    return symbols
@@ -0,0 +1,123 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from rasch.file import create_path_if_not_exist
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILERS = ['cprofile', 'tracemalloc']
+
+
+def peak_memory() -> float | None:
+    """ Peak resident memory of this process in MB, None if it can not be determined."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, KB otherwise
+
+
+class PhaseTimer:
+    """ Measures wall time, CPU time and peak memory of the phases of a run.
+
+        Phases with the same name are added up. Phases can be nested, the wall time
+        a phase spends outside of the phases nested in it is recorded as self,
+        so the self times of all phases add up to the measured time. With the tracemalloc profiler
+        the peak of memory allocated by Python during each phase is recorded as well,
+        with cProfile the whole run is profiled.
+    """
+
+    def __init__(self, profiler: str | None = None) -> None:
+        if profiler not in (None, *PROFILERS):
+            raise ValueError(f"Unknown profiler {profiler}, use one of {PROFILERS}.")
+
+        self.profiler = profiler
+        self.phases: dict[str, dict[str, float]] = {}
+        """ wall, cpu, self, rss_high_water and with tracemalloc traced_peak in MB per phase name.
+
+            rss_high_water is the high-water mark of the whole process when the phase ended,
+            in warm pool workers it includes the memory of the jobs solved before.
+        """
+        self._nested: list[float] = []
+        """ Wall time of the phases nested in each open phase."""
+        self._traced_peaks: list[float] = []
+        """ Traced peak of each open phase before the phases nested in it reset the peak."""
+        self._profile: cProfile.Profile | None = None
+
+    def start(self) -> None:
+        """ Start the profiler, if any."""
+        if self.profiler == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.profiler == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Measure the enclosed block as phase name."""
+        if self.profiler == 'tracemalloc':
+            if self._traced_peaks:  # the peak of the enclosing phase so far
+                self._traced_peaks[-1] = max(self._traced_peaks[-1], tracemalloc.get_traced_memory()[1])
+            self._traced_peaks.append(0)
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += wall
+            phase = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'self': 0.0})
+            phase['wall'] += wall
+            phase['cpu'] += time.process_time() - cpu
+            phase['self'] += wall - nested
+            phase['rss_high_water'] = peak_memory()
+            if self.profiler == 'tracemalloc':
+                traced_peak = max(self._traced_peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._traced_peaks:
+                    self._traced_peaks[-1] = max(self._traced_peaks[-1], traced_peak)
+                phase['traced_peak'] = max(phase.get('traced_peak', 0.0), traced_peak / 2**20)
+
+    def stop(self, path: str, name: str, top: int = 15) -> dict | None:
+        """ Stop the profiler and save its results.
+
+            Args:
+                path: Directory for the profile file
+                name: File name of the profile without extension
+                top: Number of entries in the returned summary
+
+            Returns:
+                Profile file and its most expensive functions or allocation sites,
+                None without profiler
+        """
+        if self.profiler == 'cprofile' and self._profile is not None:
+            self._profile.disable()
+            create_path_if_not_exist(path=path)
+            file_path = os.path.join(path, f"{name}.prof")
+            self._profile.dump_stats(file_path)
+
+            summary = io.StringIO()
+            pstats.Stats(self._profile, stream=summary).sort_stats('cumulative').print_stats(top)
+            return {'file': file_path, 'top': summary.getvalue().splitlines()}
+
+        if self.profiler == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            create_path_if_not_exist(path=path)
+            file_path = os.path.join(path, f"{name}.tracemalloc")
+            snapshot.dump(file_path)
+
+            return {'file': file_path, 'top': [str(stat) for stat in snapshot.statistics('lineno')[:top]]}
+
+        return None
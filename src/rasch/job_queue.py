@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import closing
+from typing import Any
+
+from rasch.file import create_path_if_not_exist
+from rasch.rasch_config import get_config
+from rasch.worker_pool import WorkerPool
+
+logger = logging.getLogger("railway")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    batch TEXT NOT NULL,
+    job TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    statistics TEXT,
+    submitted REAL NOT NULL,
+    finished REAL,
+    PRIMARY KEY (batch, job)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until);
+"""
+
+
+def _key(job: tuple) -> str:
+    return json.dumps(list(job))
+
+
+def worker_name() -> str:
+    """ Name of this process in the queue, host and process id."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """ Benchmark jobs in an SQLite file that workers on several machines share.
+
+        Jobs belong to a batch, e.g. the results directory of a benchmark, and are identified
+        by their (encoding, environment, horizon) tuple within it, so submitting a job twice keeps
+        the first one. A worker claims a job for lease seconds and renews the lease while it runs.
+        Jobs whose lease expired, because the worker died or lost the file, are claimed again by
+        the next worker, up to max_attempts times before they are reported as error.
+        The file must be on a file system with working locks for SQLite.
+
+        Example:
+            queue = JobQueue('data/queue.sqlite')
+            queue.submit('all', {job: kwargs[job] for job in jobs})
+            for job, statistics in queue.results('all', jobs):
+                ...
+    """
+
+    def __init__(self, path: str, lease: float | None = None, max_attempts: int | None = None) -> None:
+        self.path = path
+        self.lease = get_config().queue_lease if lease is None else lease
+        self.max_attempts = get_config().queue_max_attempts if max_attempts is None else max_attempts
+        if os.path.dirname(path):
+            create_path_if_not_exist(path=os.path.dirname(path))
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Connection in autocommit mode, transactions are started explicitly."""
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def submit(self, batch: str, jobs: dict[tuple, dict[str, Any]]) -> None:
+        """ Add jobs with their solve_and_simulate arguments, jobs already in the batch are kept."""
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (batch, job, kwargs, submitted) VALUES (?, ?, ?, ?)",
+                [(batch, _key(job), json.dumps(kwargs), now) for job, kwargs in jobs.items()])
+            connection.execute("COMMIT")
+
+    def clear(self, batch: str) -> None:
+        """ Remove every job of the batch, so submitting it again solves all jobs again."""
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM jobs WHERE batch = ?", (batch,))
+
+    def claim(self, worker: str, count: int = 1) -> list[tuple[str, tuple, dict[str, Any]]]:
+        """ Claim up to count pending jobs or jobs whose lease expired, oldest first.
+
+            Returns:
+                (batch, job, kwargs) of every claimed job
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")  # no other worker claims in between
+            connection.execute(
+                "UPDATE jobs SET state = ?, statistics = ?, finished = ? "
+                "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (DONE, json.dumps({'fl_result': "error", 'error': "lease expired"}), now,
+                 RUNNING, now, self.max_attempts))
+            rows = connection.execute(
+                "SELECT batch, job, kwargs FROM jobs WHERE state = ? OR (state = ? AND lease_until < ?) "
+                "ORDER BY submitted, rowid LIMIT ?",
+                (PENDING, RUNNING, now, count)).fetchall()
+            connection.executemany(
+                "UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE batch = ? AND job = ?",
+                [(RUNNING, worker, now + self.lease, batch, job) for batch, job, _ in rows])
+            connection.execute("COMMIT")
+        return [(batch, tuple(json.loads(job)), json.loads(kwargs)) for batch, job, kwargs in rows]
+
+    def renew(self, worker: str, jobs: list[tuple[str, tuple]]) -> None:
+        """ Extend the lease of the (batch, job) jobs the worker still holds."""
+        with closing(self._connect()) as connection:
+            connection.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE batch = ? AND job = ? AND worker = ? AND state = ?",
+                [(time.time() + self.lease, batch, _key(job), worker, RUNNING) for batch, job in jobs])
+
+    def complete(self, worker: str, batch: str, job: tuple, statistics: dict) -> bool:
+        """ Store the statistics of a job.
+
+            Returns:
+                False if the job was claimed by another worker after the lease expired, its result is dropped
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, statistics = ?, finished = ?, lease_until = NULL "
+                "WHERE batch = ? AND job = ? AND worker = ? AND state = ?",
+                (DONE, json.dumps(statistics), time.time(), batch, _key(job), worker, RUNNING))
+            return cursor.rowcount == 1
+
+    def counts(self, batch: str) -> dict[str, int]:
+        """ Number of jobs of the batch in every state."""
+        with closing(self._connect()) as connection:
+            return dict(connection.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE batch = ? GROUP BY state", (batch,)).fetchall())
+
+    def results(self, batch: str, jobs: list[tuple], poll: float | None = None) -> Iterator[tuple[tuple, dict]]:
+        """ Yield (job, statistics) of the given jobs as the workers finish them."""
+        poll = get_config().queue_poll if poll is None else poll
+        remaining = {_key(job): job for job in jobs}
+        while remaining:
+            with closing(self._connect()) as connection:
+                rows = connection.execute(
+                    "SELECT job, statistics FROM jobs WHERE batch = ? AND state = ?", (batch, DONE)).fetchall()
+            finished = [(remaining.pop(job), json.loads(statistics)) for job, statistics in rows if job in remaining]
+            yield from finished
+            if remaining and not finished:
+                time.sleep(poll)
+
+
+def run_worker(path: str,
+               processes: int | None = None,
+               idle_exit: bool = False,
+               poll: float | None = None) -> int:
+    """ Solve jobs of the queue in path on a WorkerPool until stopped.
+
+        Claims as many jobs as the pool can take, so the timeout and hang handling of the pool apply.
+        Leases are renewed while the jobs run. With idle_exit the worker stops once it finds no job to claim.
+
+        Returns:
+            Number of jobs solved
+    """
+    job_queue = JobQueue(path)
+    poll = get_config().queue_poll if poll is None else poll
+    worker = worker_name()
+    claimed: dict[tuple[str, tuple], dict] = {}
+    solved = 0
+    renewed = time.monotonic()
+
+    with WorkerPool(processes=processes, pipeline_depth=get_config().pipeline_depth) as pool:
+        logger.info(f"Worker {worker} takes jobs from {path}.")
+        while True:
+            if pool.running < pool.capacity:
+                for batch, job, kwargs in job_queue.claim(worker, count=pool.capacity - pool.running):
+                    claimed[(batch, job)] = kwargs
+                    pool.submit((batch, job), kwargs)
+
+            if not pool.running:
+                if idle_exit:
+                    break
+                time.sleep(poll)
+                continue
+
+            for (batch, job), statistics in pool.poll(timeout=poll):
+                claimed.pop((batch, job))
+                if not job_queue.complete(worker, batch, job, statistics):
+                    logger.warning(f"Lease of job {job} expired, another worker solves it.")
+                solved += 1
+
+            if time.monotonic() - renewed > job_queue.lease / 3:
+                job_queue.renew(worker, list(claimed))
+                renewed = time.monotonic()
+
+    logger.info(f"Worker {worker} solved {solved} jobs.")
+    return solved
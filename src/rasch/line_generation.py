@@ -1,5 +1,6 @@
 from typing import Any, Optional
 
+from flatland.core.grid.grid4 import Grid4TransitionsEnum
 from flatland.core.transition_map import GridTransitionMap
 from flatland.envs.line_generators import BaseLineGen
 from flatland.envs.timetable_utils import Line
@@ -73,9 +74,10 @@ class FixedLineGen(BaseLineGen):
                 raise Exception(
                     f"Orientation {orientation} does not lead to a valid path.")
 
-            agent_positions.append(start)
+            # Flatland lines hold the waypoints of each agent, here only the start
+            agent_positions.append([start])
             agent_targets.append(target)
-            agent_orientations.append(orientation)
+            agent_orientations.append([Grid4TransitionsEnum(orientation)])
 
         return Line(agent_positions=agent_positions, agent_directions=agent_orientations,
                     agent_targets=agent_targets, agent_speeds=speeds)
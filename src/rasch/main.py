@@ -1,4 +1,5 @@
 import argparse
+import sys
 from os import path
 
 from flatland.envs.line_generators import sparse_line_generator
@@ -7,12 +8,24 @@ from flatland.envs.rail_env import RailEnv
 from flatland.envs.rail_generators import sparse_rail_generator
 
 from rasch.benchmark import Benchmark
+from rasch.instrumentation import PROFILERS
+from rasch.job_queue import run_worker
 from rasch.logging import get_logger_by_level
 from rasch.rasch_config import get_config
-from rasch.rasch_setup import solve_and_simulate, solve_with_timeout
+from rasch.rasch_setup import solve_and_simulate
+from rasch.rasch_solver import HEURISTICS, STRATEGIES
+from rasch.rasch_validator import VALIDATORS
+from rasch.solution_file import convert_json_solution
+from rasch.worker_pool import solve_with_timeout
 
 
 def main():
+    if(sys.argv[1:2] == ['worker']): #rasch worker <queue>, solve jobs published by benchmarks on other machines
+        args = define_worker_args(sys.argv[2:])
+        get_logger_by_level(args.loglevel)
+        run_worker(args.queue, processes=args.processes, idle_exit=args.idle_exit)
+        return
+
     args = define_args()
     logger = get_logger_by_level(args.loglevel) #get logger for specific level
 
@@ -20,6 +33,15 @@ def main():
         if(args.visualise):
             Benchmark(logger=logger).visualise(args.visualise)
             return
+
+        if(args.compare): #medians of two commits from the results store
+            Benchmark(logger=logger).compare(args.compare)
+            return
+
+        if(args.convert_solution):
+            file_path = convert_json_solution(args.convert_solution)
+            logger.info(f"Solution converted to: {file_path}")
+            return
         
         if(args.random):
             rail_generator = sparse_rail_generator(max_num_cities=2)
@@ -40,14 +62,27 @@ def main():
             for agent in env.agents:
                 agent.earliest_departure = 0
 
-            logger.debug(env._max_episode_steps)
             #TODO: think about a way to change this to solve_with_timeout
             solve_and_simulate(env=env, 
                              env_name="random", 
                              enc_name=args.encoding, 
-                             limit=env._max_episode_steps, 
+                             limit=None, 
                              norender=args.norender,
-                             loglevel=args.loglevel)
+                             loglevel=args.loglevel,
+                             incremental=args.incremental,
+                             write_instance=args.write_instance,
+                             compressed=args.compressed,
+                             windows=args.windows,
+                             threads=args.threads,
+                             parallel_mode=args.parallel_mode,
+                             configuration=args.configuration,
+                             keep_models=args.keep_models,
+                             validator=args.validator,
+                             use_cache=False if args.no_cache else None,
+                             profiler=args.profile,
+                             strategy=args.strategy,
+                             rolling=args.rolling,
+                             heuristic=args.heuristic)
             return
 
         match args.benchmark:
@@ -57,9 +92,21 @@ def main():
                 Benchmark(logger=logger).bench_encs(args, args.environment)
             case 'env': #compare enviornments on one encoding
                 Benchmark(logger=logger).bench_envs(args, enc_name=args.encoding, save=True)
+            case 'instance': #compare instance generation implementations
+                Benchmark(logger=logger).bench_instance_generation()
+            case 'threads': #compare thread counts for one encoding on all environments
+                Benchmark(logger=logger).bench_threads(args, enc_name=args.encoding)
+            case 'windows': #compare ground program sizes with and without reachability windows
+                Benchmark(logger=logger).bench_windows(args, enc_name=args.encoding)
+            case 'heuristic': #compare the search with and without domain heuristics
+                Benchmark(logger=logger).bench_heuristic(args, enc_name=args.encoding)
+            case 'scaling': #all encodings on generated environments, fails if the baseline regresses
+                regressions = Benchmark(logger=logger).bench_scaling(args, update_baseline=args.update_baseline)
+                if(regressions):
+                    sys.exit(1)
             case _: #else
                 
-                result_stats = solve_with_timeout(args=args, logger=logger)
+                result_stats = solve_with_timeout(args=args)
 
                 if((args.benchmark == "") & (result_stats == -1)): # -b has no argument, give benchmark for this encoding and env
                     benchmark = Benchmark(logger=logger)
@@ -77,10 +124,37 @@ def define_args():
     parser = argparse.ArgumentParser(description='Railway Scheduling with Flatland and ASP')
     parser.add_argument('encoding', default=get_config().default_encoding, nargs='?')
     parser.add_argument('environment', default=get_config().default_environment, nargs='?')
-    parser.add_argument('limit', default=20, nargs='?') 
-    parser.add_argument('-b','--benchmark', type=str, nargs='?', const='', choices=['','all','env','enc'], help="Activates Benchmarking. This outputs statistics to a file.")
+    parser.add_argument('limit', default=None, nargs='?', help='Horizon. Estimated from the shortest paths of the agents if not given.') 
+    parser.add_argument('-b','--benchmark', type=str, nargs='?', const='', choices=['','all','env','enc','instance','threads','windows','heuristic','scaling'], help="Activates Benchmarking. This outputs statistics to a file.")
+    parser.add_argument('-p','--processes', type=int, help='Number of jobs that are solved in parallel while benchmarking. Defaults to benchmark_processes from the config.')
+    parser.add_argument('-q','--queue', type=str, help='Publish the jobs of a benchmark to this SQLite job queue file and wait for rasch worker processes to solve them.')
+    parser.add_argument('-t','--threads', type=int, help='Number of clingo solver threads. Defaults to solver_threads from the config.')
+    parser.add_argument('--parallel-mode', type=str, choices=['compete','split'], help='How clingo threads share the search. Defaults to solver_parallel_mode from the config.')
+    parser.add_argument('--configuration', type=str, help='clasp configuration (e.g. crafty, many) or portfolio file with one configuration per thread. Defaults to solver_configuration from the config.')
+    parser.add_argument('--heuristic', choices=HEURISTICS, help='clasp decision heuristic. Domain adds #heuristic directives from asp_heuristics_path that try moves along the shortest paths to the targets first and halting last. Defaults to solver_heuristic from the config.')
+    parser.add_argument('--strategy', choices=STRATEGIES, help='Solve all agents at once (monolithic), in groups by priority, each avoiding the cells of the groups before (prioritized), or every agent on its own with conflict-based search (cbs). Defaults to solve_strategy from the config.')
+    parser.add_argument('-km','--keep-models', action='store_true', help='Flag: Keep every model in the solution file for debugging')
+    parser.add_argument('--no-cache', action='store_true', help='Flag: Always solve, do not use or store results in the result cache')
+    parser.add_argument('--profile', choices=PROFILERS, help='Profile the run with cProfile or tracemalloc, the profile is saved in the profiles directory of statistics_output_path')
+    parser.add_argument('--validator', choices=VALIDATORS, help='How schedules are checked: stepping Flatland, replaying them on the rail grid or both with a comparison. Defaults to validator from the config.')
+    parser.add_argument('--update-baseline', action='store_true', help='Flag: Save the results of -b scaling as the new baseline instead of comparing to it')
     parser.add_argument('-nr','--norender', action='store_false', help='Flag: Dont visualise actions')
-    parser.add_argument('-v', '--visualise', type=str, nargs='?', const=path.join(get_config().statistics_output_path,'all_stats.json'))
+    parser.add_argument('-v', '--visualise', type=str, nargs='?', const=path.join(get_config().statistics_output_path, get_config().results_store), help='Plot the newest runs of the results store, or the runs of a json file saved by a benchmark.')
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('COMMIT', 'COMMIT'), help='Compare the benchmark runs of two commits (abbreviated hashes work) from the results store.')
+    parser.add_argument('--convert-solution', type=str, help='Convert a JSON solution file into the compact .npz format.')
     parser.add_argument('-ll', '--loglevel', type=str, nargs='?', choices=['debug','info','warning'], default='info', help='Sets the desired log level.')
     parser.add_argument('-r','--random', action='store_true')
+    parser.add_argument('-wi','--write-instance', action='store_true', help='Flag: Additionally write the instance to asp_instances_path for debugging')
+    parser.add_argument('-w','--windows', action='store_true', help='Flag: Add reachability time windows of the agents and use the encodings in the windows subdirectory')
+    parser.add_argument('-c','--compressed', action='store_true', help='Flag: Precompute the rail graph and use the encodings in the compressed subdirectory')
+    parser.add_argument('--rolling', action='store_true', help='Flag: Plan windows of rolling_window steps from the current state while simulating, rolling_commit steps of each window are carried out. Uses the encodings in asp_rolling_encodings_path')
+    parser.add_argument('-i','--incremental', action='store_true', help='Flag: Grow the horizon step by step up to limit using the incremental encodings')
     return parser.parse_args() 
+
+def define_worker_args(argv: list[str]):
+    parser = argparse.ArgumentParser(prog='rasch worker', description='Solve benchmark jobs from a shared job queue')
+    parser.add_argument('queue', help='SQLite job queue file the benchmarks publish to with --queue.')
+    parser.add_argument('-p','--processes', type=int, help='Number of jobs that are solved in parallel. Defaults to benchmark_processes from the config.')
+    parser.add_argument('--idle-exit', action='store_true', help='Flag: Stop once no job is left to claim instead of waiting for new ones')
+    parser.add_argument('-ll', '--loglevel', type=str, nargs='?', choices=['debug','info','warning'], default='info', help='Sets the desired log level.')
+    return parser.parse_args(argv)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from clingo import Function, Number, Symbol
+from flatland.envs.rail_env import RailEnv
+
+from rasch.direction import DIFFS
+from rasch.file import create_path_if_not_exist
+from rasch.instance_generation import cell_transition_table, position_symbol
+from rasch.rasch_config import get_config
+
+logger = logging.getLogger("railway")
+
+_rail_graphs: dict[str, tuple[list, list]] = {}
+""" Compressed rail graphs of this process by environment key."""
+
+
+def rail_graph_key(env: RailEnv) -> str:
+    """ Get a key that identifies the rail and the agent stations of an environment."""
+    grid = np.asarray(env.rail.grid, dtype=np.uint16)
+    stations = [(agent.initial_position, agent.target) for agent in env.agents]
+
+    key = hashlib.sha256(grid.tobytes())
+    key.update(str((grid.shape, stations)).encode())
+    return key.hexdigest()
+
+
+def compress_rail_graph(env: RailEnv) -> tuple[list, list]:
+    """ Compress the rail of an environment into a graph of decision points.
+
+        Vertices are agent starts and targets, switches and dead ends.
+        Edges connect two vertices by a path that only requires moving forward,
+        the same as vertex/1 and edge/6 in vertex.lp.
+
+        Returns:
+            Sorted vertices as (y, x) and sorted edges as
+            (from position, orientation, direction, to position, exit direction, length)
+    """
+    cells: dict[tuple[tuple[int, int], int], list[int]] = {}
+    for y, x, orientation, nibble in cell_transition_table(env).tolist():
+        directions = cells.setdefault(((y, x), orientation), [])
+        directions.extend(direction for direction in range(4)
+                          if (nibble >> (3 - direction)) & 1 and direction not in directions)
+
+    positions = {position for position, _ in cells}
+
+    vertices = set()
+    for agent in env.agents:
+        vertices.add(tuple(agent.initial_position))
+        vertices.add(tuple(agent.target))
+    for (position, _), directions in cells.items():
+        if len(directions) > 1:
+            vertices.add(position)
+    for position in positions:
+        if all(len(cells.get((position, orientation), [])) == 1 for orientation in range(4)):
+            vertices.add(position)
+
+    edges = set()
+    for (start, orientation), directions in cells.items():
+        if start not in vertices:
+            continue
+
+        for direction in directions:
+            position = start
+            exit_direction = direction
+            length = 0
+            visited = set()
+
+            # follow the track until the next vertex is reached
+            while True:
+                dy, dx = DIFFS[exit_direction]
+                position = (position[0] + dy, position[1] + dx)
+                length += 1
+
+                if position not in positions:
+                    break
+                if position in vertices:
+                    edges.add((start, orientation, direction, position, exit_direction, length))
+                    break
+                if (position, exit_direction) in visited \
+                        or not cells.get((position, exit_direction)):
+                    break
+
+                visited.add((position, exit_direction))
+                exit_direction = cells[(position, exit_direction)][0]
+
+    return sorted(vertices), sorted(edges)
+
+
+def get_rail_graph(env: RailEnv) -> tuple[list, list]:
+    """ Get the compressed rail graph of an environment.
+
+        Graphs are cached in memory and in graph_cache_path,
+        so they are only computed once per environment.
+    """
+    key = rail_graph_key(env)
+    if key in _rail_graphs:
+        return _rail_graphs[key]
+
+    file_path = os.path.join(get_config().graph_cache_path, f"{key}.json")
+
+    if os.path.exists(file_path):
+        logger.debug(f"Loading rail graph from {file_path}.")
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        vertices = [tuple(vertex) for vertex in data["vertices"]]
+        edges = [(tuple(p), o, d, tuple(p_), d_, length) for p, o, d, p_, d_, length in data["edges"]]
+    else:
+        vertices, edges = compress_rail_graph(env)
+        logger.debug(f"Compressed rail graph into {len(vertices)} vertices and {len(edges)} edges.")
+
+        create_path_if_not_exist(path=get_config().graph_cache_path)
+        with open(file_path, 'w') as f:
+            json.dump({"vertices": vertices, "edges": edges}, f)
+
+    _rail_graphs[key] = vertices, edges
+    return vertices, edges
+
+
+def rail_graph_symbols(env: RailEnv) -> list[Symbol]:
+    """ Get vertex/1 and edge/6 facts of the compressed rail graph as clingo symbols."""
+    vertices, edges = get_rail_graph(env)
+
+    return [
+        *[Function("vertex", [position_symbol(vertex)]) for vertex in vertices],
+        *[Function("edge", [position_symbol(start), Number(orientation), Number(direction),
+                            position_symbol(end), Number(exit_direction), Number(length)])
+          for start, orientation, direction, end, exit_direction, length in edges]
+    ]
+
+
+def rail_graph_lines(env: RailEnv) -> list[str]:
+    """ Get vertex/1 and edge/6 facts of the compressed rail graph as ASP instance lines."""
+    vertices, edges = get_rail_graph(env)
+
+    return [
+        "",
+        "% compressed rail graph vertex((Y,X)) and",
+        "% edge(from,orientation,direction,to,exit direction,length)",
+        *[f"vertex(({y},{x}))." for y, x in vertices],
+        *[f"edge(({y},{x}),{orientation},{direction},({y_},{x_}),{exit_direction},{length})."
+          for (y, x), orientation, direction, (y_, x_), exit_direction, length in edges]
+    ]
@@ -1,3 +1,4 @@
+import os
 from functools import lru_cache
 from logging import Logger
 from typing import Any
@@ -13,10 +14,92 @@ class RaSchConfig(yaml.YAMLObject):
     flatland_environments_path: str
     solver_output_path: str
     statistics_output_path:str
+    results_store: str = 'results.sqlite'
+    """ File in statistics_output_path every benchmark run is appended to."""
+    asp_incremental_encodings_path: str = 'data/encodings/incremental/'
+    asp_reservations_path: str = 'data/encodings/reservations/'
+    """ Constraints for the reservations of higher priority agents, one file per encoding that supports prioritized planning."""
+    asp_rolling_encodings_path: str = 'data/encodings/rolling/'
+    asp_cbs_path: str = 'data/encodings/cbs/'
+    """ Constraints of conflict-based search for a single agent, one file per encoding that supports it."""
+    asp_heuristics_path: str = 'data/encodings/heuristics/'
+    """ #heuristic directives of the encodings, used with the Domain solver heuristic."""
+    graph_cache_path: str = 'data/graphs/'
+    result_cache: bool = False
+    result_cache_path: str = 'data/cache/'
+    result_cache_size: float = 512
+    """ Size of the result cache in MB before old results are removed."""
+    benchmark_processes: int = 1
+    solve_timeout: float = 60
+    """ Seconds for grounding and solving a job before the solver is interrupted."""
+    worker_hang_grace: float = 30
+    """ Seconds after solve_timeout before a worker that does not answer is replaced."""
+    pipeline_depth: int = 1
+    """ Jobs each benchmark worker prepares ahead of the solver, 0 runs loading, solving and validation one after another."""
+    queue_lease: float = 120
+    """ Seconds a job claimed from a job queue stays with its worker without renewal before others may claim it."""
+    queue_max_attempts: int = 3
+    """ Times a job of a job queue is claimed before it is reported as error."""
+    queue_poll: float = 2
+    """ Seconds between looking for new jobs or results in a job queue."""
+    solver_threads: int = 1
+    solver_parallel_mode: str = 'compete'
+    solver_configuration: str | None = None
+    solver_heuristic: str | None = None
+    """ clasp decision heuristic, Domain adds moves toward the targets as guidance."""
+    solve_strategy: str = 'monolithic'
+    """ monolithic (all agents in one solve call), prioritized (groups of agents one after another)
+        or cbs (every agent on its own, conflicts are resolved by conflict-based search)."""
+    priority_group_size: int = 1
+    """ Number of agents planned together by the prioritized strategy."""
+    cbs_max_nodes: int = 1000
+    """ Nodes conflict-based search expands before giving up, 3x4x4-single_cycle is not solved within 1000."""
+    rolling_window: int = 20
+    """ Steps planned at once by rolling horizon planning."""
+    rolling_commit: int = 10
+    """ Steps of each window that are carried out before planning again."""
+    rolling_window_timeout: float | None = 5
+    """ Seconds for planning one window, the best plan found until then is carried out. None lets a window use all the time that is left."""
+    solution_format: str = 'npz'
+    validator: str = 'flatland'
+    """ flatland, fast (replay on the rail grid, Flatland decides about the schedules it rejects) or cross (both, compared)."""
+    prune_rails: bool = True
+    """ Leave out the cells of the instance that no agent can use on its way from its start to its target within the horizon."""
+    horizon_source: str = 'estimate'
+    """ estimate (shortest paths of the agents plus slack) or config (rasch_horizon table) for runs without a limit."""
+    horizon_slack: int = 5
+    horizon_slack_factor: float = 0.5
+    scaling_environments_path: str = 'data/scaling/environments/'
+    scaling_baseline_path: str = 'data/scaling/baseline.json'
+    scaling_sizes: list[int] = [20, 25, 30]
+    scaling_agents: list[int] = [1, 2, 3]
+    scaling_seeds: list[int] = [1, 2]
+    scaling_fixed_cases: list[dict] = []
+    """ Cases with fixed agent placements: width, height, seed and placements as [[y, x], [y, x], orientation] per agent."""
+    scaling_strategies: list[str] = ['monolithic', 'prioritized', 'cbs']
+    scaling_tolerance: float = 0.5
+    """ Share by which ground size and time may grow before the scaling suite fails."""
 
     yaml_tag: str = '!config'
     yaml_loader = yaml.SafeLoader
 
+    def encodings_path(self, incremental: bool = False, compressed: bool = False, windows: bool = False,
+                       rolling: bool = False) -> str:
+        """ Get the directory of the encodings for the given solving mode.
+
+            Encodings using the compressed rail graph are in the subdirectory compressed/,
+            encodings using reachability windows in windows/.
+            Rolling horizon encodings are in their own directory.
+        """
+        if rolling:
+            return self.asp_rolling_encodings_path
+        path = self.asp_incremental_encodings_path if incremental else self.asp_encodings_path
+        if compressed:
+            path = os.path.join(path, 'compressed/')
+        if windows:
+            path = os.path.join(path, 'windows/')
+        return path
+
 
 @lru_cache
 def get_config() -> RaSchConfig:
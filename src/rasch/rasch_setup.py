@@ -1,15 +1,114 @@
-import multiprocessing as mp
+import logging
+import os
+from logging import Logger
+from typing import NamedTuple
 
-from clingo import Control
+from clingo import Control, Symbol
 from flatland.envs.rail_env import RailEnv
 from flatland.utils.rendertools import AgentRenderVariant, RenderTool
 
 from rasch.file import read_from_pickle_file, write_lines_to_file
-from rasch.instance_generation import generate_instance_lines
+from rasch.horizon import estimate_horizon
+from rasch.instance_generation import (
+     generate_heuristic_symbols,
+     generate_instance_lines,
+     generate_instance_symbols,
+     generate_window_lines,
+     generate_window_symbols,
+)
+from rasch.instrumentation import PhaseTimer, peak_memory
 from rasch.logging import get_logger_by_level
-from rasch.rasch_config import get_config
+from rasch.rail_graph import rail_graph_lines, rail_graph_symbols
+from rasch.rasch_config import get_config, get_horizons
 from rasch.rasch_simulator import RaSchSimulator
-from rasch.rasch_solver import RaSchSolver
+from rasch.rasch_solver import (
+     STRATEGIES,
+     RaSchSolver,
+     clingo_arguments,
+     schedule_quality,
+)
+from rasch.rasch_validator import VALIDATORS, RaSchValidator
+from rasch.result_cache import ResultCache, result_key
+from rasch.rolling_horizon import RollingHorizonPlanner
+
+
+class PreparedJob(NamedTuple):
+     """environment, horizon and instance facts of a job, see prepare_job"""
+     env: RailEnv
+     limit: int
+     horizon_source: str
+     instance_symbols: list[Symbol]
+     phases: dict
+     """phases measured while preparing"""
+
+
+class SolvedJob(NamedTuple):
+     """schedule of a job that still has to be validated, see finish_job"""
+     env: RailEnv
+     enc_name: str
+     env_name: str
+     agent_actions: dict
+     limit: int
+     statistics: dict
+     """clingo statistics of the solve call"""
+     details: dict
+     """horizon, options, models and instance of the run, added to the statistics of valid schedules"""
+     validator: str
+     norender: bool
+     timer: PhaseTimer
+     logger: Logger
+
+
+def prepare_job(env: RailEnv,
+                limit=None,
+                compressed: bool = False,
+                windows: bool = False,
+                heuristic: str | None = None,
+                rolling: bool = False,
+                timer: PhaseTimer | None = None,
+                env_name: str | None = None) -> PreparedJob:
+     """takes the horizon from the rasch_horizon table or estimates it if limit is None and generates the instance facts.
+     the table is only used with horizon_source config, env_name is its key.
+     only needs the environment, so it can run ahead of the solver for the next job.
+     rolling horizon planning generates its facts per window, the instance is left empty"""
+     timer = timer or PhaseTimer()
+     #TODO: remove if earliest departure more than 0 is supported
+     for agent in env.agents:
+          agent.earliest_departure = 0
+
+     horizon_source = 'limit'
+     if(limit is None and env_name is not None and get_config().horizon_source == 'config'): #horizon of the rasch_horizon table
+          limit = get_horizons(key=env_name, logger=logging.getLogger("railway"))
+          horizon_source = 'config'
+          if(limit == -1): #not in the table
+               limit = None
+     if(limit is None): #estimate from the shortest paths of the agents if none defined
+          with timer.phase('horizon'):
+               limit = estimate_horizon(env)
+          horizon_source = 'estimate'
+     if(limit is None): #take flatland Horizon if an agent can not reach its target
+          limit = env._max_episode_steps
+          horizon_source = 'flatland'
+
+     instance_symbols = []
+     if(not rolling):
+          with timer.phase('instance'):
+               instance_symbols = generate_instance_symbols(env, limit, prune=get_config().prune_rails)
+
+          if(compressed): #vertices and edges are precomputed instead of grounded
+               with timer.phase('graph'):
+                    instance_symbols.extend(rail_graph_symbols(env))
+
+          if(windows): #time windows in which each agent can use a cell
+               with timer.phase('windows'):
+                    instance_symbols.extend(generate_window_symbols(env, limit))
+
+          if((heuristic or get_config().solver_heuristic) == 'Domain'): #moves on the shortest paths to the targets are tried first
+               with timer.phase('heuristic'):
+                    instance_symbols.extend(generate_heuristic_symbols(env, limit))
+
+     return PreparedJob(env, limit, horizon_source, instance_symbols, timer.phases)
+
 
 #TODO: whack name, what is a good name?
 
@@ -18,79 +117,286 @@ def solve_and_simulate(env_name: str,
                          loglevel: str,
                          limit=None,
                          norender: bool = False,
-                         result_queue = None,
-                         env: RailEnv = None):
-     """creates environment and instance, solves it and returns statistics"""
+                         env: RailEnv | None = None,
+                         incremental: bool = False,
+                         write_instance: bool = False,
+                         compressed: bool = False,
+                         windows: bool = False,
+                         threads: int | None = None,
+                         parallel_mode: str | None = None,
+                         configuration: str | None = None,
+                         keep_models: bool = False,
+                         validator: str | None = None,
+                         use_cache: bool | None = None,
+                         profiler: str | None = None,
+                         env_path: str | None = None,
+                         timeout: float | None = None,
+                         on_model = None,
+                         strategy: str | None = None,
+                         rolling: bool = False,
+                         heuristic: str | None = None,
+                         prepared: PreparedJob | None = None,
+                         defer_validation: bool = False):
+     """creates environment and instance, solves it and returns statistics.
+     grounding and solving stop after timeout seconds, the best schedule found until then is used.
+     on_model is called with cost, time and agent_actions of every improved model.
+     strategy monolithic solves all agents at once, prioritized one group of agents after another,
+     cbs every agent on its own with conflict-based search.
+     rolling plans windows of rolling_window steps while simulating instead of the whole horizon at once.
+     heuristic is the clasp decision heuristic, Domain guides the solver along the shortest paths to the targets.
+     prepared is the result of prepare_job for the same arguments if it already ran, e.g. in a pipeline.
+     with defer_validation a schedule is returned as SolvedJob instead of being validated, finish_job validates it"""
      try:
           logger = get_logger_by_level(loglevel=loglevel)
-          if(env is None):
-               env = read_from_pickle_file(f'{env_name}.pkl')
-               env.reset()
-          
-          #TODO: remove if earliest departure more than 0 is supported
-          for agent in env.agents:
-               agent.earliest_departure = 0
+          strategy = strategy or get_config().solve_strategy
+          if(strategy not in STRATEGIES):
+               raise ValueError(f"Unknown strategy {strategy}, use one of {STRATEGIES}.")
+          if(incremental and strategy != 'monolithic'):
+               raise ValueError(f"Incremental solving does not support the {strategy} strategy.")
+          if(rolling and (incremental or compressed or windows or strategy != 'monolithic')):
+               raise ValueError("Rolling horizon planning only supports the monolithic strategy without incremental, compressed or windows.")
+          validator = validator or get_config().validator
+          if(validator not in VALIDATORS):
+               raise ValueError(f"Unknown validator {validator}, use one of {VALIDATORS}.")
+          heuristic = heuristic or get_config().solver_heuristic
+          if(heuristic == 'Domain' and (incremental or rolling)):
+               raise ValueError("Domain heuristics are not supported for incremental solving and rolling horizon planning.")
+          timer = PhaseTimer(profiler=profiler)
+          timer.start()
+          profile_path = os.path.join(get_config().statistics_output_path, 'profiles')
+
+          if(prepared is None):
+               if(env is None):
+                    with timer.phase('load'):
+                         env = read_from_pickle_file(f'{env_name}.pkl', path=env_path or get_config().flatland_environments_path)
+                         env.reset()
+               prepared = prepare_job(env, limit, compressed=compressed, windows=windows, heuristic=heuristic,
+                                      rolling=rolling, timer=timer, env_name=env_name)
+          else: #prepared ahead, the phases count for this run
+               timer.phases.update(prepared.phases)
+          env, limit, horizon_source, instance_symbols, _ = prepared
+          logger.debug(f"Horizon {limit} from {horizon_source}.")
 
           instance_name = f"{enc_name}_{env_name}_instance"
           logger.debug(f"Creating instance: {instance_name}.")
+
+          solver_options = { #take solver settings from config if none defined
+               'threads': threads or get_config().solver_threads,
+               'parallel_mode': parallel_mode or get_config().solver_parallel_mode,
+               'configuration': configuration or get_config().solver_configuration,
+               'heuristic': heuristic
+          }
+
+          if(rolling): #the horizon only limits the episode, every window is planned from the state reached
+               solver = RaSchSolver(environment=env,
+                                   clingo_control=Control(),
+                                   logger=logger,
+                                   on_improvement=on_model,
+                                   timer=timer
+                                   )
+               planner = RollingHorizonPlanner(solver=solver,
+                                               encoding_name=enc_name,
+                                               window=get_config().rolling_window,
+                                               arguments=clingo_arguments(**solver_options),
+                                               timeout=timeout,
+                                               window_timeout=get_config().rolling_window_timeout)
+
+               with timer.phase('simulate'):
+                    renderer = RenderTool(
+                         env, agent_render_variant=AgentRenderVariant.AGENT_SHOWS_OPTIONS)
+                    simulator = RaSchSimulator(
+                         environment=env, renderer=renderer, logger=logger, timer=timer)
+                    valid = simulator.simulate_rolling(planner, commit=get_config().rolling_commit,
+                                                       max_steps=limit, render=norender)
+
+               solver.agent_actions = simulator.agent_actions
+               with timer.phase('save'):
+                    solver.save(file_name=f"{enc_name}_{env_name}_solve.{get_config().solution_format}")
+
+               statistics = planner.statistics
+               if(valid):
+                    statistics['fl_result'] = "success"
+               elif(planner.timed_out):
+                    logger.warning(f"Planning timed out. ({enc_name}, {env_name})")
+                    statistics['fl_result'] = "timeout"
+               elif(planner.failed):
+                    logger.warning(f"No plan found for a window. ({enc_name}, {env_name})")
+                    statistics['fl_result'] = "no actions"
+               else:
+                    logger.warning(f"Agents did not arrive within the horizon. ({enc_name}, {env_name})")
+                    statistics['fl_result'] = "invalid actions"
+
+               statistics['horizon'] = limit
+               statistics['horizon_source'] = horizon_source
+               statistics['solver_options'] = solver_options
+               statistics['strategy'] = strategy
+               statistics['rolling'] = {**planner.rolling_statistics, 'commit': get_config().rolling_commit}
+               statistics['schedule'] = schedule_quality(simulator.agent_actions)
+               statistics['validation'] = {'validator': 'flatland', 'flatland_time': timer.phases['simulate']['wall']}
+               statistics['peak_memory'] = peak_memory()
+               statistics['phases'] = timer.phases
+               statistics['profile'] = timer.stop(path=profile_path, name=f"{enc_name}_{env_name}")
+               return statistics
           
-          if(limit is None):
-               limit = env._max_episode_steps #take flatland Horizon if none defined
-               logger.debug(f"Flatland Horizon: {limit}")
-          
-          instance_lines = generate_instance_lines(env, limit)
-     
-          write_lines_to_file(file_name=f"{instance_name}.lp",
-                              path=get_config().asp_instances_path,
-                              lines=instance_lines)
+          if(write_instance): #only needed for debugging, the solver gets the facts directly
+               with timer.phase('write_instance'):
+                    instance_lines = generate_instance_lines(env, limit, prune=get_config().prune_rails)
+                    if(compressed):
+                         instance_lines.extend(rail_graph_lines(env))
+                    if(windows):
+                         instance_lines.extend(generate_window_lines(env, limit))
+                    if(heuristic == 'Domain'):
+                         instance_lines.extend(f"{symbol}." for symbol in generate_heuristic_symbols(env, limit))
+               
+                    write_lines_to_file(file_name=f"{instance_name}.lp",
+                                        path=get_config().asp_instances_path,
+                                        lines=instance_lines)
 
-          clingo_control = Control()
+          clingo_control = Control(clingo_arguments(**solver_options))
 
           solver = RaSchSolver(environment=env,
                               clingo_control=clingo_control,
-                              logger=logger
+                              logger=logger,
+                              keep_models=keep_models,
+                              timeout=timeout,
+                              on_improvement=on_model,
+                              timer=timer,
+                              domain_heuristic=heuristic == 'Domain'
                               )
-          
-          solver.solve(encoding_name=enc_name,
-                       instance_name=instance_name)
-          
-          solver.save(file_name=f"{enc_name}_{env_name}_solve.json")
 
-          if(result_queue is not None):
-               result_queue.put(True)
+          if(use_cache is None):
+               use_cache = get_config().result_cache
 
-          if len(solver.agent_actions.items()) == 0:
-               logger.warning(
-                    f"No actions generated, check the solver and ASP encoding. ({enc_name}, {env_name})")
-               clingo_control.statistics.clear()
-               clingo_control.statistics['fl_result'] = "no actions" 
+          cache = None
+          cached = None
+          if(use_cache and not keep_models): #models are not cached
+               cache = ResultCache()
+               encoding_files = [f"{get_config().encodings_path(incremental=incremental, compressed=compressed, windows=windows)}{enc_name}.lp"]
+               if(strategy == 'prioritized'): #files the solver loads with the encoding
+                    encoding_files.append(f"{get_config().asp_reservations_path}{enc_name}.lp")
+               if(strategy == 'cbs'):
+                    encoding_files.append(f"{get_config().asp_cbs_path}{enc_name}.lp")
+               if(heuristic == 'Domain'):
+                    encoding_files.append(f"{get_config().asp_heuristics_path}{enc_name}.lp")
+               with timer.phase('cache'):
+                    key_symbols = instance_symbols
+                    if(get_config().prune_rails): #the pruned cells depend on the horizon, results of other horizons have to share the key
+                         key_symbols = generate_instance_symbols(env, limit)
+                    cache_key = result_key(encoding_files, key_symbols, {**solver_options, 'incremental': incremental,
+                                                                        'strategy': strategy,
+                                                                        'prune': get_config().prune_rails,
+                                                                        'group_size': get_config().priority_group_size})
+                    cached = cache.get(cache_key, limit)
 
-               if(result_queue is not None):
-                    result_queue.put(clingo_control.statistics)
-               else:
-                    return clingo_control.statistics
+          if(cached is not None): #reuse the schedule of an earlier run without grounding and solving
+               logger.debug(f"Cached result found for horizon {cached['horizon']}.")
+               solver.agent_actions = cached['agent_actions']
+               statistics = cached['statistics']
+               model_statistics = statistics.pop('models', None)
+               anytime = statistics.pop('anytime', None)
+               if(incremental and cached['satisfiable']):
+                    limit = cached['horizon']
+          else:
+               if(strategy == 'monolithic'): #prioritized groups and cbs agents get their facts one by one
+                    with timer.phase('hand_off'):
+                         solver.add_instance_symbols(instance_symbols)
                
-               return None
-          
-          renderer = RenderTool(
-               env, agent_render_variant=AgentRenderVariant.AGENT_SHOWS_OPTIONS)
+               if(strategy == 'prioritized'): #groups of agents avoid the cells of the groups before
+                    solver.solve_prioritized(encoding_name=enc_name,
+                                             instance_symbols=instance_symbols,
+                                             limit=limit,
+                                             arguments=clingo_arguments(**solver_options),
+                                             compressed=compressed,
+                                             windows=windows)
+                    logger.debug(f"Planned with priorities {solver.priority_order} after {solver.restarts} restarts.")
+               elif(strategy == 'cbs'): #agents are planned on their own and kept apart by constraints
+                    solver.solve_cbs(encoding_name=enc_name,
+                                     instance_symbols=instance_symbols,
+                                     limit=limit,
+                                     arguments=clingo_arguments(**solver_options),
+                                     compressed=compressed,
+                                     windows=windows)
+                    logger.debug(f"Expanded {solver.cbs_statistics['nodes_expanded']} CBS nodes.")
+               elif(incremental): #grow the horizon up to limit step by step
+                    solver.solve_incremental(encoding_name=enc_name,
+                                             instance_name=None,
+                                             max_horizon=limit,
+                                             compressed=compressed)
+                    if(solver.horizon is not None):
+                         logger.debug(f"First solution found at horizon {solver.horizon}.")
+                         limit = solver.horizon
+               else:
+                    solver.solve(encoding_name=enc_name, compressed=compressed, windows=windows)
 
-          simulator = RaSchSimulator(
-               environment=env, renderer=renderer, logger=logger)
+               statistics = solver.statistics
+               model_statistics = {
+                    'count': solver.model_count,
+                    'retained': len(solver.models),
+                    'callback_time': solver.model_callback_time
+               }
+               if(strategy == 'prioritized'):
+                    statistics['prioritized'] = {'restarts': solver.restarts, 'order': solver.priority_order}
+               if(strategy == 'cbs'):
+                    statistics['cbs'] = dict(solver.cbs_statistics)
+               anytime = {
+                    'cost': solver.cost,
+                    'optimality': solver.optimality,
+                    'first_model_time': solver.first_model_time,
+                    'interrupted': solver.interrupted
+               }
 
-          if(simulator.simulate_actions(max_steps=limit,
-               agent_actions=solver.agent_actions, render=norender)): # if simulator succeeds
-               clingo_control.statistics['fl_result'] = "success"
-          else:
+               if(solver.interrupted and not solver.agent_actions): #no schedule to validate
+                    logger.warning(f"Solving timed out. ({enc_name}, {env_name})")
+                    return {'fl_result': "timeout", 'horizon': limit, 'phases': timer.phases,
+                            **{key: statistics[key] for key in ('prioritized', 'cbs') if key in statistics},
+                            'profile': timer.stop(path=profile_path, name=f"{enc_name}_{env_name}")}
+               if(solver.interrupted):
+                    logger.info(f"Solving timed out, using the best schedule found. ({enc_name}, {env_name})")
+
+               if(cache is not None and not solver.interrupted): #unfinished searches are not cached
+                    with timer.phase('cache'): #lookup and storing count as one phase
+                         satisfiable = len(solver.agent_actions) > 0
+                         cache.put(cache_key, limit, satisfiable, solver.agent_actions,
+                                   {**statistics, 'models': model_statistics, 'anytime': anytime})
+                         if(incremental and satisfiable and limit > 0): #every smaller horizon was tried without success
+                              cache.put(cache_key, limit - 1, False, {}, {})
+          
+          with timer.phase('save'):
+               solver.save(file_name=f"{enc_name}_{env_name}_solve.{get_config().solution_format}")
+
+          if len(solver.agent_actions.items()) == 0:
                logger.warning(
-                    f"Invalid actions, check the actions generator in the encoding. ({enc_name}, {env_name})")
-               clingo_control.statistics.clear()
-               clingo_control.statistics['fl_result'] = "invalid actions" # actions generated but simulator failed
+                    f"No actions generated, check the solver and ASP encoding. ({enc_name}, {env_name})")
+               search = {key: statistics[key] for key in ('prioritized', 'cbs') if key in statistics} #how far the search got
+               statistics.clear()
+               statistics.update(search)
+               statistics['fl_result'] = "no actions" 
+               statistics['phases'] = timer.phases
+               statistics['profile'] = timer.stop(path=profile_path, name=f"{enc_name}_{env_name}")
+               return statistics
           
-          if(result_queue is not None):
-               result_queue.put(clingo_control.statistics)
-          else:
-               return clingo_control.statistics
+          details = {
+               'horizon': limit,
+               'horizon_source': horizon_source,
+               'solver_options': solver_options,
+               'models': model_statistics,
+               'anytime': anytime,
+               'strategy': strategy,
+               'schedule': schedule_quality(solver.agent_actions),
+               'cache': {'hit': cached is not None, 'horizon': cached['horizon'] if cached else None},
+               'instance': {
+                    'facts': len(instance_symbols),
+                    'construction': timer.phases['instance']['wall'],
+                    'graph': timer.phases.get('graph', {}).get('wall', 0),
+                    'windows': timer.phases.get('windows', {}).get('wall', 0),
+                    'hand_off': timer.phases.get('hand_off', {}).get('wall', 0)
+               }
+          }
+          solved = SolvedJob(env=env, enc_name=enc_name, env_name=env_name, agent_actions=solver.agent_actions,
+                             limit=limit, statistics=statistics, details=details,
+                             validator=validator, norender=norender,
+                             timer=timer, logger=logger)
+          return solved if defer_validation else finish_job(solved)
      
      except FileNotFoundError as e:
           logger.error(f"{e}")
@@ -100,31 +406,56 @@ def solve_and_simulate(env_name: str,
                logger.error(f"Parsing failed for encoding: {enc_name} with environment: {env_name}")
           raise
 
-def solve_with_timeout(args, logger):
-     result_queue = mp.Queue()
-     logger.info(f"Solving {args.environment} with {args.encoding}.")
-     process = mp.Process(target=solve_and_simulate, 
-                         args=(
-                              args.environment, 
-                              args.encoding, 
-                              args.loglevel,
-                              int(args.limit), 
-                              args.norender,
-                              result_queue))
-     process.start()
-     process.join(timeout=60)
-
-     #if process is still running and no result was put into queue, terminate it
-     if(process.is_alive() & result_queue.empty()):
-          logger.warn("Solving timed out.")
-          process.terminate()
-          process.join()
-          result_stats = {}
-          result_stats["fl_result"] = "timeout"
-          return result_stats
-     else: #process is successful
-          if(process.is_alive()):
-               logger.warn("Simulator is still running.")
-          while not result_queue.empty():
-               result_stats = result_queue.get() #get last added item
-          return result_stats
\ No newline at end of file
+
+def finish_job(solved: SolvedJob) -> dict:
+     """validates the schedule of a job solved by solve_and_simulate and returns the statistics of the run"""
+     env, enc_name, env_name, agent_actions, limit, statistics, details, validator, norender, timer, logger = solved
+     if(validator not in VALIDATORS):
+          raise ValueError(f"Unknown validator {validator}, use one of {VALIDATORS}.")
+     profile_path = os.path.join(get_config().statistics_output_path, 'profiles')
+     validation = {'validator': validator}
+
+     if(validator in ('fast', 'cross')): #replay the schedule on the rail grid without Flatland
+          with timer.phase('validate'):
+               fast_validator = RaSchValidator(environment=env, logger=logger)
+               valid = fast_validator.validate_actions(max_steps=limit, agent_actions=agent_actions)
+          validation['time'] = timer.phases['validate']['wall']
+          if(fast_validator.first_violation is not None):
+               violation, step, agents = fast_validator.first_violation
+               validation['violation'] = {'type': violation.name, 'step': step, 'agents': agents}
+
+     if(validator != 'fast' or not valid): #the fast validator is conservative, Flatland decides about the schedules it rejects
+          with timer.phase('simulate'):
+               renderer = RenderTool(
+                    env, agent_render_variant=AgentRenderVariant.AGENT_SHOWS_OPTIONS)
+
+               simulator = RaSchSimulator(
+                    environment=env, renderer=renderer, logger=logger, timer=timer)
+
+               fast_valid = None if validator == 'flatland' else valid
+               valid = simulator.simulate_actions(max_steps=limit,
+                    agent_actions=agent_actions, render=norender)
+          validation['flatland_time'] = timer.phases['simulate']['wall']
+
+          if(fast_valid is not None): #Flatland decides, the comparison is only reported
+               validation['agree'] = fast_valid == valid
+               if(fast_valid and not valid):
+                    logger.warning(
+                         f"Validators disagree: Flatland {valid}, fast {fast_valid}. ({enc_name}, {env_name})")
+               elif(fast_valid != valid):
+                    logger.debug(f"Flatland resolves the {validation['violation']['type']} the fast validator found. ({enc_name}, {env_name})")
+
+     if(valid): # if validator succeeds
+          statistics['fl_result'] = "success"
+     else:
+          logger.warning(
+               f"Invalid actions, check the actions generator in the encoding. ({enc_name}, {env_name})")
+          statistics.clear()
+          statistics['fl_result'] = "invalid actions" # actions generated but validator failed
+
+     statistics.update(details)
+     statistics['validation'] = validation
+     statistics['peak_memory'] = peak_memory()
+     statistics['phases'] = timer.phases
+     statistics['profile'] = timer.stop(path=profile_path, name=f"{enc_name}_{env_name}")
+     return statistics
@@ -1,12 +1,16 @@
-import copy
+import logging
 import time
+from collections.abc import Callable
 from logging import Logger
 
 from flatland.envs.rail_env import RailEnv, RailEnvActions
+from flatland.envs.step_utils.states import TrainState
 from flatland.utils.rendertools import RenderTool
 
 from rasch.action import Action
+from rasch.instrumentation import PhaseTimer
 from rasch.rasch_config import RaSchConfig, get_config
+from rasch.trajectory import Trajectory
 
 
 class RaSchSimulator:
@@ -14,12 +18,17 @@ class RaSchSimulator:
                  environment: RailEnv,
                  renderer: RenderTool,
                  logger: Logger,
-                 config: RaSchConfig = get_config()) -> None:
+                 config: RaSchConfig = get_config(),
+                 timer: PhaseTimer | None = None) -> None:
         self.environment = environment
         self._config = config
         self._logger = logger
         self.renderer = renderer
-        self.agents_at_step = {}
+        self.trajectory: Trajectory | None = None
+        self.timer = timer or PhaseTimer()
+        """ Collects the time spent in Flatland steps and rendering."""
+        self.agent_actions: dict[int, dict[int, int]] = {}
+        """ Actions carried out by simulate_rolling, by agent and step of the schedule."""
 
     def simulate_actions(self,
                          agent_actions: dict,
@@ -34,50 +43,119 @@ class RaSchSimulator:
         step = 0
         agents_step = {}
 
+        agents = self.environment.agents
+        self.trajectory = Trajectory(len(agents), max_steps)
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+
         try:
-            for id, actions in agent_actions.items():
-                self._logger.debug(f"Agent {id} action count {len(actions)}")
+            if debug:
+                for id, actions in agent_actions.items():
+                    self._logger.debug(f"Agent {id} action count {len(actions)}")
 
             while not self.environment.dones["__all__"] and step < max_steps:
                 actionsdict = {}
-                self._logger.debug(f"Actions for step: {step}")
-                for idx, agent in enumerate(self.environment.agents):
+                for idx, agent in enumerate(agents):
                     if agent.position:
                         if not self.environment.dones[idx]:
-                            if idx in agents_step:
-                                agents_step[idx] += 1
-                            else:
-                                agents_step[idx] = 0
+                            agents_step[idx] = agents_step.get(idx, -1) + 1
                             actionsdict[agent.handle] = agent_actions[idx][agents_step[idx]]
                     else:
                         actionsdict[agent.handle] = RailEnvActions.MOVE_FORWARD
 
-                    if idx in agents_step:
-                        self._logger.debug(
-                            f"Agent({idx}) is at {agent.position} and chose {Action(actionsdict[agent.handle])} at step {agents_step[idx]}/{len(agent_actions[idx])-1}.")
-                    else:
-                        self._logger.debug(
-                            f"Agent({idx}) not spawned yet. {agent.state}")
-
-                self.environment.step(actionsdict)
+                if debug:
+                    self._log_step(step, actionsdict, agents_step, agent_actions)
 
-                self.agents_at_step[step] = copy.deepcopy(
-                    self.environment.agents)
-
-                if render:
-                    self.renderer.render_env(
-                        show=True, show_rowcols=True, show_observations=False)
-
-                    time.sleep(step_delay)
+                self._advance(step, actionsdict, step_delay, render)
                 step += 1
             # Show last frame
             if render:
-                self.renderer.render_env(
-                    show=True, show_rowcols=True, show_observations=False)
+                with self.timer.phase('render'):
+                    self.renderer.render_env(
+                        show=True, show_rowcols=True, show_observations=False)
             
-            return self.environment.dones["__all__"]
+            # dones are also set when the episode ends, only arrived agents count
+            return all(agent.state == TrainState.DONE for agent in self.environment.agents)
                 
         except KeyError as keyerror: #TODO
             self._logger.error(f"Missing actions at index {keyerror!s}")
             return False
 
+    def simulate_rolling(self,
+                         plan: Callable[[int], dict],
+                         commit: int,
+                         max_steps: int = 30,
+                         step_delay: float = 0.5,
+                         render: bool = False) -> bool:
+        """ Step Flatland while planning, e.g. with a RollingHorizonPlanner.
+
+            plan is called with the agents at their current positions and the number of steps left
+            and returns their actions by agent and step, starting at 0. The first commit steps are
+            carried out before plan is called again. The actions that were carried out are kept in agent_actions.
+
+            Returns:
+                True if every agent arrived within max_steps
+        """
+        max_steps += 2 #account for spawning in Flatland
+        self.environment._max_episode_steps = max_steps
+        agents = self.environment.agents
+        self.trajectory = Trajectory(len(agents), max_steps)
+        self.agent_actions = {}
+
+        step = 0
+
+        def spawning() -> list:
+            return [agent for agent in agents if agent.position is None and not self.environment.dones[agent.handle]]
+
+        while spawning() and step < max_steps:
+            self._advance(step, {agent.handle: RailEnvActions.MOVE_FORWARD for agent in spawning()}, step_delay, render)
+            step += 1
+        start = step
+
+        while not self.environment.dones["__all__"] and step < max_steps:
+            actions = plan(max_steps - step)
+            if not actions:
+                self._logger.warning(f"No plan found at step {step}.")
+                return False
+
+            for offset in range(commit):
+                if self.environment.dones["__all__"] or step >= max_steps:
+                    break
+                actionsdict = {}
+                for agent in agents:
+                    if agent.position is not None and not self.environment.dones[agent.handle]:
+                        if offset not in actions.get(agent.handle, {}):
+                            self._logger.error(f"Missing action of agent {agent.handle} at step {step}.")
+                            return False
+                        actionsdict[agent.handle] = actions[agent.handle][offset]
+                        self.agent_actions.setdefault(agent.handle, {})[step - start] = actions[agent.handle][offset]
+
+                self._advance(step, actionsdict, step_delay, render)
+                step += 1
+
+        # dones are also set when the episode ends, only arrived agents count
+        return all(agent.state == TrainState.DONE for agent in agents)
+
+    def _advance(self, step: int, actionsdict: dict, step_delay: float, render: bool) -> None:
+        """ Step Flatland once, record the positions and render the new state."""
+        with self.timer.phase('step'):
+            self.environment.step(actionsdict)
+
+        self.trajectory.record(step, self.environment.agents)
+
+        if render:
+            with self.timer.phase('render'):
+                self.renderer.render_env(
+                    show=True, show_rowcols=True, show_observations=False)
+
+            time.sleep(step_delay)
+
+    def _log_step(self, step: int, actionsdict: dict, agents_step: dict, agent_actions: dict) -> None:
+        """ Log the chosen actions, only called when debug logging is enabled."""
+        self._logger.debug(f"Actions for step: {step}")
+        for idx, agent in enumerate(self.environment.agents):
+            if idx in agents_step and agent.handle in actionsdict:
+                self._logger.debug(
+                    f"Agent({idx}) is at {agent.position} and chose {Action(actionsdict[agent.handle])} at step {agents_step[idx]}/{len(agent_actions[idx])-1}.")
+            else:
+                self._logger.debug(
+                    f"Agent({idx}) not spawned yet. {agent.state}")
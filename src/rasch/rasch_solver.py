@@ -1,13 +1,75 @@
+import heapq
+import itertools
 import json
+import math
+import os
+import time
+from collections.abc import Callable
 from logging import Logger
 from typing import Any, Tuple
 
-from clingo import Model
+from clingo import Function, Model, Number, SolveResult, Symbol
 from clingo.control import Control
 from flatland.envs.rail_env import RailEnv
 
 from rasch.file import create_path_if_not_exist
+from rasch.horizon import shortest_path_lengths
+from rasch.instance_generation import position_symbol
+from rasch.instrumentation import PhaseTimer
 from rasch.rasch_config import RaSchConfig, get_config
+from rasch.rasch_validator import RaSchValidator, Violation
+from rasch.solution_file import write_solution
+
+STRATEGIES = ['monolithic', 'prioritized', 'cbs']
+
+HEURISTICS = ['Berkmin', 'Vmtf', 'Vsids', 'Domain', 'Unit', 'None']
+""" Decision heuristics of clasp."""
+
+AGENT_FACTS = ('schedule', 'window')
+""" Instance facts that belong to the agent given as first argument."""
+
+
+def clingo_arguments(threads: int = 1,
+                     parallel_mode: str = 'compete',
+                     configuration: str | None = None,
+                     heuristic: str | None = None) -> list[str]:
+    """ Get command line arguments for a clingo control.
+
+        Args:
+            threads: Number of solver threads
+            parallel_mode: compete (every thread solves the whole problem) or
+                           split (the search space is split between threads)
+            configuration: clasp configuration like crafty or many, or a portfolio
+                           file with one configuration per thread
+            heuristic: clasp decision heuristic like Vsids, Domain enables #heuristic directives
+    """
+    arguments = [f"--parallel-mode={threads},{parallel_mode}"]
+    if configuration:
+        arguments.append(f"--configuration={configuration}")
+    if heuristic:
+        arguments.append(f"--heuristic={heuristic}")
+    return arguments
+
+
+def add_statistics(total: dict, statistics: dict) -> dict:
+    """ Add the clingo statistics of another solve call to total, values that are not numbers are replaced."""
+    for key, value in statistics.items():
+        if isinstance(value, dict):
+            add_statistics(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and isinstance(total.get(key), (int, float)):
+            total[key] += value
+        else:
+            total[key] = value
+    return total
+
+
+def schedule_quality(agent_actions: dict) -> dict[str, int]:
+    """ Get flowtime (sum of the arrival steps of all agents) and makespan (latest arrival) of a schedule.
+
+        An agent arrives after the step of its last action.
+    """
+    arrivals = [max(int(step) for step in steps) + 1 for steps in agent_actions.values() if steps]
+    return {'flowtime': sum(arrivals), 'makespan': max(arrivals, default=0)}
 
 
 class RaSchSolver:
@@ -15,66 +77,555 @@ class RaSchSolver:
                  environment: RailEnv = None,
                  clingo_control: Control,
                  logger: Logger,
-                 config: RaSchConfig = get_config()) -> None:
+                 config: RaSchConfig = get_config(),
+                 keep_models: bool = False,
+                 timer: PhaseTimer | None = None,
+                 timeout: float | None = None,
+                 on_improvement: Callable[[dict], None] | None = None,
+                 domain_heuristic: bool = False) -> None:
         self.environment = environment
         self._logger = logger
         self._config = config
         self.clingo_control = clingo_control
+        self.keep_models = keep_models
+        """ Also keep every model as strings for debugging, the actions are those of the latest model either way."""
+        self.timer = timer or PhaseTimer()
+        """ Collects the time spent grounding, solving and saving."""
+        self.timeout = timeout
+        """ Seconds for grounding and solving, after that the search is interrupted."""
+        self.interrupted = False
+        """ Whether the last solve call ran out of time."""
+        self.on_improvement = on_improvement
+        """ Called with cost, time and agent_actions of every model, each one is better than the last when optimizing."""
+        self.domain_heuristic = domain_heuristic
+        """ Load the #heuristic directives of the encoding from asp_heuristics_path, clingo needs --heuristic=Domain."""
+        self._deadline: float | None = None
+        self._start_time = 0.0
 
         self.models = []
         self.agent_actions = {}
         """ Actions each agent is supposed to make."""
         self.agent_paths: dict[Any, list[Tuple[int, int]]] = {}
         """ Path for each agent resulting from the given actions."""
-        self.number_of_symbols = 10000
+        self.horizon = None
+        """ Horizon at which the first solution was found in incremental mode."""
+        self.model_count = 0
+        self.model_callback_time = 0.0
+        """ Total time spent in the model callback."""
+        self.cost: list[int] = []
+        """ Cost of the latest model, empty if the encoding does not optimize."""
+        self.first_model_time: float | None = None
+        """ Seconds from the start of grounding to the first model."""
+        self.exhausted = False
+        """ Whether the last search was completed, so the latest model is optimal."""
+        self._action_atoms: list[tuple[int, int, int, int]] = []
+        """ (literal, agent, action, step) of every ground agent_action/3 atom."""
+        self._planned_actions: dict[int, dict[int, int]] = {}
+        """ Actions of the agents planned in earlier groups when solving prioritized."""
+        self._summed_statistics: dict | None = None
+        """ Clingo statistics added up over all clingo controls when solving prioritized or with CBS."""
+        self.priority_order: list[int] = []
+        """ Agents from the highest to the lowest priority of the last prioritized solve."""
+        self.restarts = 0
+        """ Times the priorities were changed after a group could not be planned."""
+        self.cbs_statistics: dict[str, int] = {}
+        """ nodes_expanded, nodes_generated, conflicts_resolved and low_level_solves of the last CBS solve."""
+        self._agent_controls: dict[int, tuple[Control, list, frozenset[Symbol]]] = {}
+        """ Clingo control, action atoms and constraints switched on of every agent during a CBS solve."""
+
+    def _collect_action_atoms(self):
+        """ Remember the program literals of all agent_action/3 atoms after grounding."""
+        self._action_atoms = [
+            (atom.literal, *[argument.number for argument in atom.symbol.arguments])
+            for atom in self.clingo_control.symbolic_atoms.by_signature("agent_action", 3)]
 
     def _on_clingo_model(self, model: Model):
         """ Populate RaSchASPSolver with data based on found model.
 
+            Only the actions of the latest model are kept, which is the best one
+            found so far when optimizing. With keep_models every model is also stored,
+            the actions are the same.
+
             Args:
                 model: Model that was found, which satisfies the provided instance/encoding
         """
-        symbols = model.symbols(shown=True)
+        start_time = time.perf_counter()
+        self.model_count += 1
+        self.cost = list(model.cost)
+        if self.first_model_time is None:
+            self.first_model_time = start_time - self._start_time
+
+        agent_actions = dict(self._planned_actions)
+        for literal, id, action, step in self._action_atoms:
+            if model.is_true(literal):
+                agent_actions.setdefault(id, {})[step] = action
+        self.agent_actions = agent_actions
+
+        if self.keep_models:
+            self._store_model(model)
 
+        if self.on_improvement is not None:
+            self.on_improvement({'cost': self.cost,
+                                 'time': start_time - self._start_time,
+                                 'agent_actions': self.agent_actions})
+
+        self.model_callback_time += time.perf_counter() - start_time
+
+    def _store_model(self, model: Model):
+        """ Store the shown symbols of the model as strings."""
         self.models.append(
             [f'{symbol.name}({",".join([str(arg) for arg in symbol.arguments])})'
-             for symbol in symbols])
+             for symbol in model.symbols(shown=True)])
 
-        if len(symbols) < self.number_of_symbols:
-            self._logger.debug(
-                f"Shorter model found {self.number_of_symbols} > {len(symbols)}")
-            self.number_of_symbols = len(symbols)
-            self.agent_actions = {}
-        else:
-            return
+    def _start_deadline(self) -> None:
+        self.interrupted = False
+        self._start_time = time.perf_counter()
+        self._deadline = None if self.timeout is None else self._start_time + self.timeout
+
+    def _solve(self) -> SolveResult | None:
+        """ Solve the ground program, interrupt the async solve handle at the deadline.
+
+            Returns:
+                Result of the search, None if the deadline passed before it started
+        """
+        self.exhausted = False
+        if self._deadline is None:
+            result = self.clingo_control.solve(on_model=lambda x: self._on_clingo_model(x))
+            self.exhausted = result.exhausted
+            return result
+
+        remaining = self._deadline - time.perf_counter()
+        if remaining <= 0:
+            self.interrupted = True
+            return None
 
-        for symbol in symbols:
-            if symbol.name == "agent_action":
-                id = symbol.arguments[0].number
-                action = symbol.arguments[1].number
-                step = symbol.arguments[2].number
+        with self.clingo_control.solve(on_model=lambda x: self._on_clingo_model(x), async_=True) as handle:
+            if not handle.wait(remaining):
+                handle.cancel()
+                self.interrupted = True
+                self._logger.debug(f"Solving interrupted after {self.timeout}s.")
+            result = handle.get()
+        self.exhausted = result.exhausted and not self.interrupted
+        return result
 
-                self.agent_actions.setdefault(id, {})[step] = action
+    @property
+    def statistics(self) -> dict:
+        """ Clingo statistics of the last solve call, added up over all clingo controls when solving prioritized or with CBS."""
+        if self._summed_statistics is not None:
+            return self._summed_statistics
+        return self.clingo_control.statistics
 
-    def solve(self, encoding_name: str, instance_name: str):
+    @property
+    def optimality(self) -> str | None:
+        """ optimal, not proven optimal or no objective for the latest model, None without a model."""
+        if self.model_count == 0:
+            return None
+        if not self.cost:
+            return "no objective"
+        return "optimal" if self.exhausted else "not proven optimal"
+
+    def add_instance_symbols(self, symbols: list[Symbol]):
+        """ Add instance facts directly to the clingo control.
+
+            Use instead of an instance file by passing no instance_name to solve.
+        """
+        with self.clingo_control.backend() as backend:
+            for symbol in symbols:
+                backend.add_rule([backend.add_atom(symbol)])
+
+    def _heuristic_files(self, encoding_name: str) -> list[str]:
+        """ Get the file with the domain heuristics of the encoding if they are enabled."""
+        if not self.domain_heuristic:
+            return []
+        heuristics_file = f"{self._config.asp_heuristics_path}{encoding_name}.lp"
+        if not os.path.exists(heuristics_file):
+            raise FileNotFoundError(
+                f"No domain heuristics for {encoding_name} in {self._config.asp_heuristics_path}.")
+        return [heuristics_file]
+
+    def solve(self, encoding_name: str, instance_name: str | None = None, compressed: bool = False,
+              windows: bool = False, rolling: bool = False):
         # Load instance from file
-        self.clingo_control.load(
-            f"{self._config.asp_instances_path}{instance_name}.lp")
+        if instance_name is not None:
+            self.clingo_control.load(
+                f"{self._config.asp_instances_path}{instance_name}.lp")
         # Load encoding from file
         self.clingo_control.load(
-            f"{self._config.asp_encodings_path}{encoding_name}.lp")
+            f"{self._config.encodings_path(compressed=compressed, windows=windows, rolling=rolling)}{encoding_name}.lp")
+        if not rolling:
+            for file in self._heuristic_files(encoding_name):
+                self.clingo_control.load(file)
 
+        self._start_deadline()
         self._logger.debug("Start grounding.")
-        self.clingo_control.ground()
+        with self.timer.phase('ground'):
+            self.clingo_control.ground()
+            self._collect_action_atoms()
 
         self._logger.debug("Start solving.")
-        self.clingo_control.solve(
-            on_model=lambda x: self._on_clingo_model(x))
+        with self.timer.phase('solve'):
+            self._solve()
         
         self._logger.debug(
-            f"Finished solving, best model has {self.number_of_symbols} symbols.")
+            f"Finished solving after {self.model_count} models.")
+
+    def solve_incremental(self, encoding_name: str, instance_name: str | None, max_horizon: int,
+                          compressed: bool = False):
+        """ Solve by growing the horizon step by step inside one clingo control.
+
+            The encoding has to be split into the programs base, step(t) and check(t),
+            where check(t) only holds while the external query(t) is true.
+            Ground programs and learned nogoods are kept between the steps.
+
+            Args:
+                encoding_name: Name of the encoding in asp_incremental_encodings_path
+                instance_name: Name of the instance in asp_instances_path,
+                               None if the instance symbols were already added
+                max_horizon: Largest horizon that is tried before giving up
+                compressed: Use the encoding variant for the compressed rail graph
+        """
+        if instance_name is not None:
+            self.clingo_control.load(
+                f"{self._config.asp_instances_path}{instance_name}.lp")
+        self.clingo_control.load(
+            f"{self._config.encodings_path(incremental=True, compressed=compressed)}{encoding_name}.lp")
+
+        self._start_deadline()
+        parts = [("base", [])]
+        step = 0
+
+        while step <= max_horizon:
+            if step > 0:
+                self.clingo_control.release_external(
+                    Function("query", [Number(step - 1)]))
+                parts.append(("step", [Number(step)]))
+            parts.append(("check", [Number(step)]))
+
+            self._logger.debug(f"Start grounding horizon {step}.")
+            with self.timer.phase('ground'):
+                self.clingo_control.ground(parts)
+                self._collect_action_atoms()
+            self.clingo_control.assign_external(
+                Function("query", [Number(step)]), True)
+
+            self._logger.debug(f"Start solving horizon {step}.")
+            with self.timer.phase('solve'):
+                result = self._solve()
+
+            if result is not None and result.satisfiable: #also if interrupted after a model was found
+                self.horizon = step
+                self._logger.debug(
+                    f"Finished solving at horizon {step} after {self.model_count} models.")
+                return
+
+            if self.interrupted:
+                self._logger.debug(f"Ran out of time at horizon {step}.")
+                return
+
+            parts = []
+            step += 1
+
+        self._logger.debug(f"No solution found up to horizon {max_horizon}.")
+
+    def _reservations(self, agent_actions: dict, limit: int) -> list[Symbol]:
+        """ Get reserved/2 and reserved_edge/3 facts of the cells and edges used by the planned agents.
+
+            A cell is reserved from the step the agent is on it until the agent arrives at its target.
+        """
+        replay = RaSchValidator(environment=self.environment, logger=self._logger).replay(agent_actions, limit)
+        symbols = []
+        for id in agent_actions:
+            for step in range(limit):
+                if not replay.present[step, id]:
+                    break
+                position = position_symbol(replay.positions[step + 1, id].tolist())
+                symbols.append(Function("reserved", [position, Number(step)]))
+                if replay.moved[step, id]:
+                    origin = position_symbol(replay.positions[step, id].tolist())
+                    symbols.append(Function("reserved_edge", [origin, position, Number(step)]))
+        return symbols
+
+    def _split_instance_symbols(self, instance_symbols: list[Symbol]) -> tuple[list[Symbol], dict[int, list[Symbol]]]:
+        """ Separate the facts of the rail from the facts of each agent."""
+        shared_symbols = []
+        agent_symbols: dict[int, list[Symbol]] = {}
+        for symbol in instance_symbols:
+            if symbol.name in AGENT_FACTS:
+                agent_symbols.setdefault(symbol.arguments[0].number, []).append(symbol)
+            else:
+                shared_symbols.append(symbol)
+        return shared_symbols, agent_symbols
+
+    def _ground(self, files: list[str], symbols: list[Symbol], arguments: list[str]) -> None:
+        """ Ground the files and facts in a new clingo control, which becomes clingo_control."""
+        self.clingo_control = Control(arguments)
+        with self.timer.phase('hand_off'):
+            self.add_instance_symbols(symbols)
+        for file in files:
+            self.clingo_control.load(file)
+        with self.timer.phase('ground'):
+            self.clingo_control.ground()
+            self._collect_action_atoms()
+
+    def _solve_group(self, files: list[str], symbols: list[Symbol], arguments: list[str]) -> SolveResult | None:
+        """ Ground and solve the agents of one group in a new clingo control."""
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            self.interrupted = True
+            return None
+
+        self._ground(files, symbols, arguments)
+        with self.timer.phase('solve'):
+            result = self._solve()
+
+        add_statistics(self._summed_statistics, self.clingo_control.statistics)
+        return result
+
+    def solve_prioritized(self, encoding_name: str, instance_symbols: list[Symbol], limit: int,
+                          arguments: list[str] | None = None, compressed: bool = False, windows: bool = False,
+                          group_size: int | None = None, max_restarts: int | None = None):
+        """ Plan the agents group by group in the order of their priority instead of all at once.
+
+            Each group is solved in its own clingo control. The cells and edges used by the
+            groups planned before are added as reserved/2 and reserved_edge/3 facts, so collisions
+            are only checked between the agents of one group. Agents with the longest shortest path
+            get the highest priority. If a group can not be planned, its agents get the highest
+            priority and planning starts again.
+
+            Args:
+                encoding_name: Name of the encoding, asp_reservations_path needs a file with the same name
+                instance_symbols: Instance facts of all agents
+                limit: Horizon of the schedule
+                arguments: Command line arguments for the clingo control of each group
+                compressed: Use the encoding variant for the compressed rail graph
+                windows: Use the encoding variant for reachability windows
+                group_size: Number of agents planned together, priority_group_size from the config if None
+                max_restarts: Changes of the priorities before giving up, the number of agents if None
+        """
+        reservations_file = f"{self._config.asp_reservations_path}{encoding_name}.lp"
+        if not os.path.exists(reservations_file):
+            raise FileNotFoundError(
+                f"No reservations for {encoding_name} in {self._config.asp_reservations_path}, "
+                "it can not be solved prioritized.")
+        files = [f"{self._config.encodings_path(compressed=compressed, windows=windows)}{encoding_name}.lp",
+                 reservations_file, *self._heuristic_files(encoding_name)]
+        group_size = group_size or self._config.priority_group_size
+        shared_symbols, agent_symbols = self._split_instance_symbols(instance_symbols)
+
+        lengths = shortest_path_lengths(self.environment)
+        order = sorted(range(len(lengths)), key=lambda id: math.inf if lengths[id] is None else lengths[id],
+                       reverse=True)
+        max_restarts = len(order) if max_restarts is None else max_restarts
+
+        self._start_deadline()
+        self._summed_statistics = {}
+        self.restarts = 0
+        while True:
+            self._planned_actions = {}
+            self.agent_actions = {}
+            cost: list[int] = []
+            exhausted = True
+            failed = None
+
+            for start in range(0, len(order), group_size):
+                group = order[start:start + group_size]
+                symbols = [*shared_symbols,
+                           *[symbol for id in group for symbol in agent_symbols.get(id, [])],
+                           *self._reservations(self._planned_actions, limit)]
+                self._logger.debug(f"Planning agents {group}.")
+                result = self._solve_group(files, symbols, arguments or [])
+
+                if result is None or not result.satisfiable:
+                    failed = start
+                    break
+                self._planned_actions = dict(self.agent_actions)
+                cost = [a + b for a, b in zip(cost, self.cost)] if cost else list(self.cost)
+                exhausted &= self.exhausted
+
+            if failed is None:
+                break
+
+            self.agent_actions = {}
+            if self.interrupted:
+                self._logger.debug(f"Ran out of time planning agents {order[failed:failed + group_size]}.")
+                break
+            if failed == 0 or self.restarts >= max_restarts:
+                self._logger.debug(f"Agents {order[failed:failed + group_size]} can not be planned.")
+                break
+
+            # the agents that failed are planned first in the next attempt
+            group = order[failed:failed + group_size]
+            order = group + [id for id in order if id not in group]
+            self.restarts += 1
+            self._logger.debug(f"Restarting with priorities {order}.")
+
+        self._planned_actions = {}
+        self.priority_order = order
+        self.cost = cost
+        self.exhausted = exhausted and group_size >= len(order) #groups are only optimal on their own
+        self._logger.debug(f"Finished prioritized solving after {self.restarts} restarts.")
+
+    def _first_conflict(self, agent_actions: dict, limit: int) -> list[tuple[int, Symbol]] | None:
+        """ Find the first conflict between the agents by replaying their actions.
+
+            Returns:
+                None if the schedule is valid, otherwise the constraint that resolves the conflict
+                for each of the two agents involved, empty if it can not be resolved by constraints
+        """
+        validator = RaSchValidator(environment=self.environment, logger=self._logger)
+        if validator.validate_actions(agent_actions, max_steps=limit):
+            return None
+
+        violation, step, agents = validator.first_violation
+        positions = validator.replay(agent_actions, max_steps=limit).positions
+        first = agents[0]
+        if violation == Violation.COLLISION:
+            cell = positions[step + 1, first]
+            pair = [agent for agent in agents if (positions[step + 1, agent] == cell).all()][:2]
+            return [(agent, Function("forbidden", [Number(agent), position_symbol(cell.tolist()), Number(step)]))
+                    for agent in pair] if len(pair) == 2 else []
+
+        if violation == Violation.SWAP:
+            pair = [first, *[agent for agent in agents
+                             if (positions[step, agent] == positions[step + 1, first]).all()
+                             and (positions[step + 1, agent] == positions[step, first]).all()][:1]]
+            return [(agent, Function("forbidden_edge", [Number(agent),
+                                                        position_symbol(positions[step, agent].tolist()),
+                                                        position_symbol(positions[step + 1, agent].tolist()),
+                                                        Number(step)]))
+                    for agent in pair] if len(pair) == 2 else []
+
+        return []
+
+    def _plan_agent(self, agent: int, constraints: frozenset[Symbol]) -> dict[int, int] | None:
+        """ Solve the ground program of a single agent again with the given constraints switched on.
+
+            Returns:
+                Actions of the agent by step, None if there is no path or the time ran out
+        """
+        control, action_atoms, active = self._agent_controls[agent]
+        for symbol in active - constraints:
+            control.assign_external(symbol, False)
+        for symbol in constraints - active:
+            control.assign_external(symbol, True)
+        self._agent_controls[agent] = (control, action_atoms, constraints)
+
+        self.clingo_control = control
+        self._action_atoms = action_atoms
+        self.agent_actions = {}
+        with self.timer.phase('solve'):
+            result = self._solve()
+        self.cbs_statistics['low_level_solves'] += 1
+
+        if result is None or not result.satisfiable:
+            return None
+        return self.agent_actions.get(agent, {})
+
+    def solve_cbs(self, encoding_name: str, instance_symbols: list[Symbol], limit: int,
+                  arguments: list[str] | None = None, compressed: bool = False, windows: bool = False,
+                  max_nodes: int | None = None):
+        """ Plan every agent on its own and resolve the conflicts between them with conflict-based search.
+
+            The program of each agent is ground once in its own clingo control, with the constraints
+            in asp_cbs_path that add a shortest path objective and forbidden/3 and forbidden_edge/4 externals.
+            The search expands the node with the smallest sum of arrival steps. The first collision or swap
+            of its schedule, found by replaying it, branches into one node for each of the two agents, in
+            which that agent must avoid the cell or edge and is solved again. Pairs of agents that never
+            meet are never checked against each other.
+
+            Args:
+                encoding_name: Name of the encoding, asp_cbs_path needs a file with the same name
+                instance_symbols: Instance facts of all agents
+                limit: Horizon of the schedule
+                arguments: Command line arguments for the clingo control of each agent
+                compressed: Use the encoding variant for the compressed rail graph
+                windows: Use the encoding variant for reachability windows
+                max_nodes: Nodes expanded before giving up, cbs_max_nodes from the config if None
+        """
+        constraints_file = f"{self._config.asp_cbs_path}{encoding_name}.lp"
+        if not os.path.exists(constraints_file):
+            raise FileNotFoundError(
+                f"No CBS constraints for {encoding_name} in {self._config.asp_cbs_path}, "
+                "it can not be solved with CBS.")
+        files = [f"{self._config.encodings_path(compressed=compressed, windows=windows)}{encoding_name}.lp",
+                 constraints_file, *self._heuristic_files(encoding_name)]
+        max_nodes = max_nodes or self._config.cbs_max_nodes
+        shared_symbols, agent_symbols = self._split_instance_symbols(instance_symbols)
+
+        on_improvement, self.on_improvement = self.on_improvement, None  # single agent models are no schedules
+        self._start_deadline()
+        self._summed_statistics = {}
+        self.cbs_statistics = {'nodes_expanded': 0, 'nodes_generated': 0, 'conflicts_resolved': 0,
+                               'low_level_solves': 0}
+        self._agent_controls = {}
+
+        root = {}
+        for agent in sorted(agent_symbols):
+            self._ground(files, [*shared_symbols, *agent_symbols[agent]], arguments or [])
+            self._agent_controls[agent] = (self.clingo_control, self._action_atoms, frozenset())
+            root[agent] = self._plan_agent(agent, frozenset())
+            if root[agent] is None:
+                self._logger.debug(f"Agent {agent} can not reach its target.")
+                break
+
+        solution = None
+        counter = itertools.count()
+        open_nodes = []
+        if all(path is not None for path in root.values()):
+            heapq.heappush(open_nodes, (schedule_quality(root)['flowtime'], next(counter), {}, root))
+
+        while open_nodes and solution is None and not self.interrupted:
+            if self.cbs_statistics['nodes_expanded'] >= max_nodes:
+                self._logger.debug(f"No solution after expanding {max_nodes} nodes.")
+                break
+            _, _, constraints, paths = heapq.heappop(open_nodes)
+            self.cbs_statistics['nodes_expanded'] += 1
+
+            conflict = self._first_conflict(paths, limit)
+            if conflict is None:
+                solution = paths
+                self.cbs_statistics['conflicts_resolved'] = sum(len(agent_constraints)
+                                                                for agent_constraints in constraints.values())
+                break
+
+            for agent, constraint in conflict:
+                agent_constraints = constraints.get(agent, frozenset())
+                if constraint in agent_constraints:  # the constraint did not resolve the conflict
+                    continue
+                path = self._plan_agent(agent, agent_constraints | {constraint})
+                if path is None:
+                    continue
+                child = {**paths, agent: path}
+                heapq.heappush(open_nodes, (schedule_quality(child)['flowtime'], next(counter),
+                                            {**constraints, agent: agent_constraints | {constraint}}, child))
+                self.cbs_statistics['nodes_generated'] += 1
+
+        for control, _, _ in self._agent_controls.values():
+            add_statistics(self._summed_statistics, control.statistics)
+        self._agent_controls = {}
+
+        self.on_improvement = on_improvement
+        self.agent_actions = solution or {}
+        self.cost = [schedule_quality(solution)['flowtime']] if solution else []
+        self.exhausted = solution is not None and not self.interrupted  # best first with shortest paths
+        if solution and self.on_improvement is not None:
+            self.on_improvement({'cost': self.cost,
+                                 'time': time.perf_counter() - self._start_time,
+                                 'agent_actions': self.agent_actions})
+        self._logger.debug(f"Finished CBS after expanding {self.cbs_statistics['nodes_expanded']} nodes.")
 
     def save(self, file_name: str = "test_solve.json") -> None:
+        """ Save the solution and models to solver_output_path.
+
+            File names ending in .npz are written in the compact NumPy format, others as JSON.
+        """
+        if file_name.endswith('.npz'):
+            write_solution(path=self._config.solver_output_path,
+                           file_name=file_name,
+                           agent_actions=self.agent_actions,
+                           agent_paths=self.agent_paths,
+                           models=self.models)
+            return
+
         solve_data = {
             "solution": {
                 "agent_paths": self.agent_paths,
@@ -0,0 +1,204 @@
+from enum import Enum
+from logging import Logger
+from typing import NamedTuple
+
+import numpy as np
+from flatland.envs.rail_env import RailEnv
+
+from rasch.action import Action
+from rasch.direction import DIFFS
+from rasch.instance_generation import NIBBLE_COUNT, transition_nibbles
+
+_DIFFS = np.array(DIFFS)
+
+NIBBLE_ONLY_DIRECTION = np.array([max([3 - bit for bit in range(4) if (nibble >> bit) & 1] or [0])
+                                  for nibble in range(16)])
+""" Direction taken for every 4 bit transition value with a single possible direction."""
+
+VALIDATORS = ['flatland', 'fast', 'cross']
+""" Ways to check a schedule: stepping Flatland, replaying it with RaSchValidator or both with a comparison."""
+
+NO_ACTION = -1
+
+
+def _possible(nibble: np.ndarray, direction: np.ndarray) -> np.ndarray:
+    """ Whether each direction can be taken with the 4 bit transition value of the same agent."""
+    return (nibble >> (3 - direction)) & 1 == 1
+
+
+class Violation(Enum):
+    """ Ways in which a schedule can fail in Flatland."""
+    MISSING_ACTION = 0
+    """ An agent that is still on its way has no action for a step."""
+    INVALID_MOVE = 1
+    """ The chosen direction is not possible on the agent's cell."""
+    COLLISION = 2
+    """ Two agents are on the same cell."""
+    SWAP = 3
+    """ Two agents pass each other by swapping cells."""
+    MISSED_TARGET = 4
+    """ An agent has not reached its target when the schedule ends."""
+
+
+class Replay(NamedTuple):
+    """ Movement of the agents when their actions are replayed."""
+    positions: np.ndarray
+    """ Position of every agent before the actions of each step, steps + 1 x agents x 2."""
+    present: np.ndarray
+    """ Whether the agent is on the map at positions, steps + 1 x agents."""
+    moved: np.ndarray
+    """ Whether the agent moved during each step, steps x agents."""
+    done: np.ndarray
+    """ Whether the agent reached its target."""
+    violations: list[tuple[Violation, int, list[int]]]
+    """ Missing actions and invalid moves."""
+
+
+class RaSchValidator:
+    """ Replays agent actions on the transition grid without stepping Flatland.
+
+        Uses the movement rules of Flatland for agents with speed 1 and without
+        malfunctions. Steps are the steps of the schedule, a violation at step k
+        is caused by the actions at step k.
+
+        The check is conservative. Every agent is on the map from step 0, and a move into
+        an occupied cell is a COLLISION or SWAP, where Flatland holds the agent back and it
+        may still arrive in time. A schedule that is valid here is valid in Flatland, but
+        some schedules Flatland accepts are rejected, so finish_job steps those in Flatland.
+    """
+
+    def __init__(self, *,
+                 environment: RailEnv,
+                 logger: Logger) -> None:
+        self.environment = environment
+        self._logger = logger
+        self.first_violation: tuple[Violation, int, list[int]] | None = None
+        """ Type, step and involved agents of the first violation."""
+
+    def _action_matrix(self, agent_actions: dict, steps: int) -> np.ndarray:
+        """ Agents x steps matrix of the actions, NO_ACTION where an action is missing."""
+        actions = np.full((len(self.environment.agents), steps), NO_ACTION, dtype=np.int8)
+        for id, agent_steps in agent_actions.items():
+            for step, action in agent_steps.items():
+                if int(step) < steps:
+                    actions[int(id), int(step)] = action
+        return actions
+
+    def replay(self, agent_actions: dict, max_steps: int = 30) -> Replay:
+        """ Move every agent according to its actions, conflicts between agents are not checked."""
+        agents = self.environment.agents
+        steps = max_steps
+        nibbles = transition_nibbles(self.environment)
+        actions = self._action_matrix(agent_actions, steps)
+
+        # positions[t] and present[t] before the actions of step t, moved[t] during step t
+        positions = np.zeros((steps + 1, len(agents), 2), dtype=np.int64)
+        present = np.zeros((steps + 1, len(agents)), dtype=bool)
+        moved = np.zeros((steps, len(agents)), dtype=bool)
+        positions[0] = [agent.initial_position for agent in agents]
+        present[0] = True
+
+        direction = np.array([agent.initial_direction for agent in agents])
+        target = np.array([agent.target for agent in agents])
+        done = np.zeros(len(agents), dtype=bool)
+        stopped = np.zeros(len(agents), dtype=bool)
+        violations = []
+
+        for step in range(steps):
+            active = ~done
+            if not active.any():
+                break
+
+            position = positions[step]
+            action = actions[:, step]
+
+            missing = active & (action == NO_ACTION)
+            if missing.any():
+                violations.append((Violation.MISSING_ACTION, step, np.flatnonzero(missing).tolist()))
+
+            # do nothing continues the movement of the previous step
+            stop = (action == Action.HALT.value) | ((action == Action.NO_OP.value) & stopped) | missing
+            moving = active & ~stop
+
+            nibble = nibbles[position[:, 0], position[:, 1], direction]
+            single = NIBBLE_COUNT[nibble] == 1
+            left = (direction - 1) % 4
+            right = (direction + 1) % 4
+
+            # turns that are not possible fall back to moving forward
+            new_direction = direction.copy()
+            new_direction = np.where((action == Action.TURN_LEFT.value) & _possible(nibble, left), left, new_direction)
+            new_direction = np.where((action == Action.TURN_RIGHT.value) & _possible(nibble, right), right, new_direction)
+            new_direction = np.where(single, NIBBLE_ONLY_DIRECTION[nibble], new_direction)
+
+            invalid = moving & ~_possible(nibble, new_direction)
+            if invalid.any():
+                violations.append((Violation.INVALID_MOVE, step, np.flatnonzero(invalid).tolist()))
+            moving &= ~invalid
+
+            new_position = np.where(moving[:, np.newaxis], position + _DIFFS[new_direction], position)
+            direction = np.where(moving, new_direction, direction)
+            stopped = ~moving
+
+            # agents leave the map when arriving at their target
+            arrived = active & (new_position == target).all(axis=1)
+            done |= arrived
+
+            positions[step + 1] = new_position
+            present[step + 1] = active & ~arrived
+            moved[step] = moving
+
+        return Replay(positions, present, moved, done, violations)
+
+    def validate_actions(self, agent_actions: dict, max_steps: int = 30) -> bool:
+        """ Check whether the actions bring every agent to its target without conflicts.
+
+            Args:
+                agent_actions: Actions by agent and step as produced by RaSchSolver
+                max_steps: Horizon of the schedule, the same as for RaSchSimulator.simulate_actions
+
+            Returns:
+                True if the schedule is valid, otherwise first_violation is set
+        """
+        steps = max_steps
+        height, width = self.environment.height, self.environment.width
+        positions, present, moved, done, violations = self.replay(agent_actions, max_steps)
+
+        # every occupied cell per step, as one number
+        cells = np.arange(steps + 1)[:, np.newaxis] * height * width \
+            + positions[..., 0] * width + positions[..., 1]
+
+        # an agent still blocks its target in the step it arrives
+        blocking = present.copy()
+        blocking[1:] |= present[:-1] & ~present[1:]
+        occupied = cells[blocking]
+        unique, counts = np.unique(occupied, return_counts=True)
+        if (counts > 1).any():
+            index = unique[counts > 1][0] // (height * width)
+            colliding = np.flatnonzero(np.isin(cells[index], unique[counts > 1]) & blocking[index])
+            violations.append((Violation.COLLISION, max(int(index) - 1, 0), colliding.tolist()))
+
+        # a swap means an agent moves along an edge in the opposite direction of another agent
+        origin = cells[:-1] % (height * width)
+        destination = cells[1:] % (height * width)
+        step_index = np.arange(steps)[:, np.newaxis] * (height * width) ** 2
+        edges = (step_index + origin * height * width + destination)[moved]
+        reversed_edges = (step_index + destination * height * width + origin)[moved]
+        swapped = np.isin(edges, reversed_edges)
+        if swapped.any():
+            step = int(edges[swapped].min() // (height * width) ** 2)
+            agent_steps, agent_ids = np.nonzero(moved)
+            swapping = agent_ids[swapped & (agent_steps == step)]
+            violations.append((Violation.SWAP, step, sorted(swapping.tolist())))
+
+        if not done.all():
+            violations.append((Violation.MISSED_TARGET, steps, np.flatnonzero(~done).tolist()))
+
+        if violations:
+            self.first_violation = min(violations, key=lambda violation: (violation[1], violation[0].value))
+            violation, step, agents = self.first_violation
+            self._logger.debug(f"{violation.name} at step {step} by agents {agents}.")
+            return False
+
+        self.first_violation = None
+        return True
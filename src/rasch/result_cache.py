@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any
+
+from clingo import Symbol
+
+from rasch.file import create_path_if_not_exist
+from rasch.rasch_config import get_config
+
+logger = logging.getLogger("railway")
+
+SAT = "sat"
+UNSAT = "unsat"
+
+
+KEY_FACTS = ('schedule', 'cell', 'diff')
+""" Instance facts that do not depend on the horizon, the pruned cells, windows and heuristics are derived from them."""
+
+
+def result_key(encoding_files: list[str], instance_symbols: list[Symbol], solver_options: dict) -> str:
+    """ Get a key that identifies a solve run independent of its horizon.
+
+        Hashes the encoding files (the encoding and the files loaded with it, e.g. reservations),
+        the rail and schedule facts of the instance and the solver options. Facts that depend on
+        the horizon, like limit/1, windows and heuristics, are left out. The cells of instance_symbols
+        must not be pruned, the cells that are left depend on the horizon.
+    """
+    key = hashlib.sha256()
+    for encoding_file in encoding_files:
+        with open(encoding_file, 'rb') as f:
+            key.update(f.read())
+    key.update(json.dumps(solver_options, sort_keys=True).encode())
+    for symbol in instance_symbols:
+        if symbol.name in KEY_FACTS:
+            key.update(str(symbol).encode())
+            key.update(b".")
+    return key.hexdigest()
+
+
+def _int_keys(agent_actions: dict) -> dict[int, dict[int, int]]:
+    return {int(id): {int(step): action for step, action in actions.items()}
+            for id, actions in agent_actions.items()}
+
+
+class ResultCache:
+    """ Solve results on disk, keyed by result_key and horizon.
+
+        Every result is its own file written with an atomic rename, so parallel
+        workers can share the cache. A schedule found for horizon H is also used
+        for every larger horizon, and a horizon without a schedule for every smaller one.
+        The least recently used results are removed when the cache grows over max_size MB.
+    """
+
+    def __init__(self, path: str | None = None, max_size: float | None = None) -> None:
+        self.path = path or get_config().result_cache_path
+        self.max_size = (max_size or get_config().result_cache_size) * 2**20
+
+    def _results(self, key: str) -> list[tuple[int, str, str]]:
+        """ (horizon, result, file path) of every stored result for key."""
+        directory = os.path.join(self.path, key)
+        try:
+            file_names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+        results = []
+        for file_name in file_names:
+            if file_name.endswith('.json'):  # skip files that are still being written
+                horizon, result, _ = file_name.split('.')
+                results.append((int(horizon), result, os.path.join(directory, file_name)))
+        return results
+
+    def get(self, key: str, horizon: int) -> dict[str, Any] | None:
+        """ Get a stored result that holds for the given horizon.
+
+            Returns:
+                Dictionary with horizon, satisfiable, agent_actions and statistics,
+                None if nothing is stored for this horizon
+        """
+        results = self._results(key)
+        candidates = sorted(
+            [(stored, path) for stored, result, path in results if result == SAT and stored <= horizon],
+            reverse=True)
+        candidates += sorted(
+            [(stored, path) for stored, result, path in results if result == UNSAT and stored >= horizon])
+
+        for _, path in candidates:
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                os.utime(path)  # mark as recently used for eviction
+            except (FileNotFoundError, json.JSONDecodeError):  # evicted or written by another worker
+                continue
+            data["agent_actions"] = _int_keys(data["agent_actions"])
+            logger.debug(f"Using cached result of horizon {data['horizon']} for horizon {horizon}.")
+            return data
+        return None
+
+    def put(self, key: str, horizon: int, satisfiable: bool,
+            agent_actions: dict, statistics: dict) -> None:
+        """ Store the result of a solve run and evict old results if necessary."""
+        directory = os.path.join(self.path, key)
+        create_path_if_not_exist(path=directory)
+
+        data = {
+            "horizon": horizon,
+            "satisfiable": satisfiable,
+            "agent_actions": agent_actions,
+            "statistics": statistics
+        }
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(directory, f"{horizon}.{SAT if satisfiable else UNSAT}.json"))
+
+        self.evict()
+
+    def evict(self) -> None:
+        """ Remove the least recently used results until the cache fits into max_size."""
+        files = []
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            try:
+                for entry in os.scandir(directory.path):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:  # removed by another worker
+                continue
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                os.rmdir(os.path.dirname(path))  # only succeeds once the key has no results left
+            except OSError:
+                pass
+            size -= file_size
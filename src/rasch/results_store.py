@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import subprocess
+from contextlib import closing
+from functools import lru_cache
+from typing import Any
+
+import pandas as pd
+
+from rasch.file import create_path_if_not_exist
+from rasch.rasch_config import get_config
+
+METADATA = {
+    'run_id': "INTEGER PRIMARY KEY AUTOINCREMENT",
+    'recorded': "REAL",
+    'batch': "TEXT",
+    'benchmark': "TEXT",
+    'mode': "TEXT",
+    'git_hash': "TEXT",
+    'git_dirty': "INTEGER",
+    'encoding': "TEXT",
+    'encoding_hash': "TEXT",
+    'environment': "TEXT",
+    'seed': "INTEGER",
+    'horizon': "INTEGER",
+    'threads': "INTEGER",
+    'cache_hit': "INTEGER",
+}
+""" Columns every run has, the flattened statistics get a column each when they first appear."""
+
+_MEASURED = "cache_hit IS NOT 1"
+""" Condition of the runs that were solved, not taken from the result cache."""
+
+
+def flatten_statistics(statistics: dict, prefix: str = '') -> dict[str, Any]:
+    """ Flatten nested statistics to column names like solving.solvers.choices.
+
+        Lists are stored as JSON text.
+    """
+    columns = {}
+    for key, value in statistics.items():
+        if isinstance(value, dict):
+            columns.update(flatten_statistics(value, prefix=f"{prefix}{key}."))
+        elif isinstance(value, (list, tuple)):
+            columns[f"{prefix}{key}"] = json.dumps(value)
+        else:
+            columns[f"{prefix}{key}"] = value
+    return columns
+
+
+@lru_cache
+def git_revision() -> tuple[str | None, bool]:
+    """ Get the commit of the working directory and whether tracked files were changed, (None, False) outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],  # noqa: S607
+                                capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],  # noqa: S607
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(changes)
+
+
+def file_hash(file_path: str) -> str | None:
+    """ Get the sha256 of a file, None if it does not exist."""
+    try:
+        with open(file_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def environment_seed(env_name: str) -> int | None:
+    """ Get the seed of a generated scaling environment from its name, None for other environments."""
+    match = re.search(r'_s(\d+)$', env_name)
+    return int(match.group(1)) if match else None
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+class ResultsStore:
+    """ Every benchmark run as one row of an SQLite table that is only appended to.
+
+        A row holds the metadata of the run (commit, encoding hash, seed, horizon, threads, ...)
+        and its flattened statistics, one column per statistic, so runs of different commits
+        can be compared with a single query. Columns of new statistics are added when they first appear.
+
+        Example:
+            store = ResultsStore()
+            store.append({'encoding': 'vertex', 'environment': 'simple_switch_map', **flatten_statistics(statistics)})
+            df = store.latest(['encoding', 'environment', 'solving.solvers.choices'])
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or os.path.join(get_config().statistics_output_path, get_config().results_store)
+        if os.path.dirname(self.path):
+            create_path_if_not_exist(path=os.path.dirname(self.path))
+        columns = ", ".join(f"{_quote(column)} {kind}" for column, kind in METADATA.items())
+        with closing(self._connect()) as connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS runs ({columns})")
+            for column in METADATA.keys() - set(self._columns(connection)):  # stores of older versions
+                connection.execute(f"ALTER TABLE runs ADD COLUMN {_quote(column)} {METADATA[column]}")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _columns(self, connection: sqlite3.Connection) -> list[str]:
+        return [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+
+    def append(self, row: dict[str, Any]) -> None:
+        """ Add a run, row maps column names to values."""
+        row = {column: json.dumps(value) if isinstance(value, (list, tuple, dict)) else value
+               for column, value in row.items() if column != 'run_id'}
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")  # columns and row are added together
+            for column in row.keys() - set(self._columns(connection)):
+                connection.execute(f"ALTER TABLE runs ADD COLUMN {_quote(column)}")
+            connection.execute(
+                f"INSERT INTO runs ({', '.join(map(_quote, row))}) VALUES ({', '.join('?' * len(row))})",  # noqa: S608
+                list(row.values()))
+            connection.execute("COMMIT")
+
+    def _select(self, columns: list[str] | None, where: str = "", parameters: tuple = ()) -> pd.DataFrame:
+        with closing(self._connect()) as connection:
+            stored = self._columns(connection)
+            selected = stored if columns is None else [column for column in columns if column in stored]
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(map(_quote, selected))} FROM runs {where} ORDER BY run_id",  # noqa: S608
+                connection, params=parameters)
+        return df.reindex(columns=selected if columns is None else columns)  # statistics no run had are empty
+
+    def load(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """ Get all runs, only the given columns if columns is not None."""
+        return self._select(columns)
+
+    def latest(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """ Get the newest run of every encoding, environment and solving mode, cache hits are left out."""
+        return self._select(columns, "WHERE run_id IN "  # noqa: S608
+                                     f"(SELECT MAX(run_id) FROM runs WHERE {_MEASURED} GROUP BY encoding, environment, mode)")
+
+    def revisions(self, revisions: list[str], columns: list[str] | None = None) -> pd.DataFrame:
+        """ Get the runs of the given commits with their git_hash, abbreviated hashes match every commit they start with.
+
+            Cache hits are left out, their statistics were measured by an earlier run.
+        """
+        where = f"WHERE {_MEASURED} AND (" + " OR ".join("git_hash LIKE ?" for _ in revisions) + ")"
+        return self._select(None if columns is None else list(dict.fromkeys(['git_hash', *columns])), where,
+                            tuple(f"{revision}%" for revision in revisions))
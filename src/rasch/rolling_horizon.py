@@ -0,0 +1,123 @@
+import os
+import time
+
+from clingo.control import Control
+
+from rasch.instance_generation import (
+    generate_instance_symbols,
+    generate_state_symbols,
+    goal_distances,
+)
+from rasch.rasch_config import RaSchConfig, get_config
+from rasch.rasch_solver import RaSchSolver, add_statistics
+
+
+class RollingHorizonPlanner:
+    """ Plans the agents window by window from the current state of the environment.
+
+        Every call grounds and solves a window of window steps with the rolling horizon variant
+        of the encoding, so ground size and grounding time depend on the window instead of the
+        whole horizon. RaSchSimulator.simulate_rolling carries out the first steps of each
+        window and calls the planner again.
+
+        Example:
+            planner = RollingHorizonPlanner(solver=solver, encoding_name="primitive", window=20)
+            simulator.simulate_rolling(planner, commit=10, max_steps=400)
+    """
+
+    def __init__(self, *,
+                 solver: RaSchSolver,
+                 encoding_name: str,
+                 window: int,
+                 arguments: list[str] | None = None,
+                 timeout: float | None = None,
+                 window_timeout: float | None = None,
+                 config: RaSchConfig = get_config()) -> None:
+        """
+            Args:
+                solver: Solver of the environment, it gets a new clingo control for every window
+                encoding_name: Name of the encoding in asp_rolling_encodings_path
+                window: Number of steps planned at once
+                arguments: Command line arguments for the clingo control of each window
+                timeout: Seconds for all windows together
+                window_timeout: Seconds for each window, its best plan until then is carried out, at most the time that is left
+        """
+        self.solver = solver
+        self.encoding_name = encoding_name
+        self.window = window
+        self.arguments = arguments or []
+        self.window_timeout = window_timeout
+        self._deadline = None if timeout is None else time.perf_counter() + timeout
+        self.failed = False
+        """ Whether a window could not be planned."""
+        self.timed_out = False
+        """ Whether planning stopped because the time ran out."""
+
+        encoding_file = f"{config.encodings_path(rolling=True)}{encoding_name}.lp"
+        if not os.path.exists(encoding_file):
+            raise FileNotFoundError(f"{encoding_file} is missing, {encoding_name} can not be planned with a rolling horizon.")
+
+        environment = solver.environment
+        self._rail_symbols = [symbol for symbol in generate_instance_symbols(environment, window)
+                              if symbol.name in ('cell', 'diff')]
+        """ Facts of the rail, the same for every window."""
+        self._distances = goal_distances(environment)
+
+        self.rounds = 0
+        self.max_atoms = 0
+        """ Largest ground program of a window."""
+        self.max_ground_time = 0.0
+        """ Longest grounding of a window in seconds."""
+        self._statistics: dict = {}
+
+    def __call__(self, steps_left: int | None = None) -> dict:
+        """ Plan the next window from the current positions of the agents.
+
+            Args:
+                steps_left: Steps until the end of the episode, shorter windows are planned near the end
+
+            Returns:
+                Actions by agent and step, starting at 0, empty if no plan was found
+        """
+        solver = self.solver
+        solver.timeout = self.window_timeout
+        if self._deadline is not None:
+            left = self._deadline - time.perf_counter()
+            if left <= 0:
+                self.failed = self.timed_out = True
+                return {}
+            solver.timeout = left if self.window_timeout is None else min(self.window_timeout, left)
+
+        solver.clingo_control = Control(self.arguments)
+        solver.agent_actions = {}
+        with solver.timer.phase('hand_off'):
+            window = self.window if steps_left is None else min(self.window, steps_left)
+            solver.add_instance_symbols([*generate_state_symbols(solver.environment, window, self._distances),
+                                         *self._rail_symbols])
+
+        ground_time = solver.timer.phases.get('ground', {}).get('wall', 0.0)
+        solver.solve(encoding_name=self.encoding_name, rolling=True)
+
+        self.rounds += 1
+        self.max_ground_time = max(self.max_ground_time, solver.timer.phases['ground']['wall'] - ground_time)
+        statistics = solver.clingo_control.statistics
+        self.max_atoms = max(self.max_atoms, int(statistics['problem']['lp']['atoms']))
+        add_statistics(self._statistics, statistics)
+
+        if not solver.agent_actions:
+            self.failed = True
+            self.timed_out = solver.interrupted
+        return solver.agent_actions
+
+    @property
+    def statistics(self) -> dict:
+        """ Clingo statistics added up over all windows."""
+        return self._statistics
+
+    @property
+    def rolling_statistics(self) -> dict:
+        """ window, rounds, max_atoms and max_ground_time of the windows planned so far."""
+        return {'window': self.window,
+                'rounds': self.rounds,
+                'max_atoms': self.max_atoms,
+                'max_ground_time': self.max_ground_time}
@@ -0,0 +1,170 @@
+import hashlib
+from typing import NamedTuple
+
+from flatland.envs.line_generators import sparse_line_generator
+from flatland.envs.rail_env import RailEnv
+from flatland.envs.rail_generators import sparse_rail_generator
+
+from rasch.file import save_as_pickle_file
+from rasch.line_generation import FixedLineGen
+from rasch.rasch_config import get_config
+
+MIN_TIME_DIFFERENCE = 1.0
+""" Slowdowns of fewer seconds are not counted as regressions, short runs are too noisy."""
+
+
+class ScalingCase(NamedTuple):
+    """ One generated environment of the scaling suite.
+
+        placements are (start, target, orientation) of every agent for FixedLineGen,
+        without them the agents are placed by the sparse_line_generator.
+    """
+    width: int
+    height: int
+    agents: int
+    seed: int
+    placements: tuple | None = None
+
+    @property
+    def name(self) -> str:
+        """ Environment name, fixed cases get a digest of their placements so they never share a generated case's name."""
+        if self.placements is None:
+            return f"{self.height}x{self.width}x{self.agents}-sparse_s{self.seed}"
+        digest = hashlib.sha256(repr(self.placements).encode()).hexdigest()[:8]
+        return f"{self.height}x{self.width}x{self.agents}-fixed{digest}_s{self.seed}"
+
+    @property
+    def point(self) -> str:
+        """ Point of the scaling curve, the same for every seed."""
+        return f"{self.height}x{self.width}x{self.agents}"
+
+
+def scaling_cases(sizes: list[int] | None = None,
+                  agents: list[int] | None = None,
+                  seeds: list[int] | None = None) -> list[ScalingCase]:
+    """ Get the cases of the scaling suite.
+
+        Every combination of square map size, agent count and seed,
+        followed by the fixed cases from the config. Missing arguments are taken from the config.
+    """
+    config = get_config()
+    cases = [ScalingCase(width=size, height=size, agents=agent_count, seed=seed)
+             for size in sizes or config.scaling_sizes
+             for agent_count in agents or config.scaling_agents
+             for seed in seeds or config.scaling_seeds]
+
+    for fixed in config.scaling_fixed_cases:
+        placements = tuple((tuple(start), tuple(target), orientation)
+                           for start, target, orientation in fixed['placements'])
+        cases.append(ScalingCase(width=fixed['width'], height=fixed['height'], agents=len(placements),
+                                 seed=fixed['seed'], placements=placements))
+    return cases
+
+
+def generate_environment(case: ScalingCase) -> RailEnv:
+    """ Generate the environment of a case, the same seed always gives the same environment."""
+    line_generator = FixedLineGen(list(case.placements)) if case.placements else sparse_line_generator(seed=case.seed)
+    env = RailEnv(width=case.width,
+                  height=case.height,
+                  number_of_agents=case.agents,
+                  rail_generator=sparse_rail_generator(max_num_cities=max(2, min(case.width, case.height) // 15),
+                                                       seed=case.seed,
+                                                       grid_mode=False,
+                                                       max_rails_between_cities=2,
+                                                       max_rail_pairs_in_city=1),
+                  line_generator=line_generator,
+                  random_seed=case.seed)
+    env.reset(random_seed=case.seed)
+
+    # TODO: remove if earliest departure more than 0 is supported
+    for agent in env.agents:
+        agent.earliest_departure = 0
+
+    return env
+
+
+def write_environments(cases: list[ScalingCase], path: str | None = None) -> dict[str, RailEnv]:
+    """ Generate the environments of all cases and save them as pickle files for the solver processes.
+
+        Returns:
+            Environment for each case name
+    """
+    path = path or get_config().scaling_environments_path
+    envs = {}
+    for case in cases:
+        envs[case.name] = generate_environment(case)
+        save_as_pickle_file(f"{case.name}.pkl", envs[case.name], path=path)
+    return envs
+
+
+def scaling_points(results: dict[str, dict[str, dict]], cases: list[ScalingCase]) -> dict[str, dict[str, dict]]:
+    """ Combine the results of all seeds into the points of the scaling curves.
+
+        Args:
+            results: Benchmark statistics for each encoding and case name
+            cases: Cases of the suite
+
+        Returns:
+            For each encoding and point: cells, agents, runs, success_rate
+            and the mean atoms, rules, total time and flowtime of the successful runs
+    """
+    points = {}
+    for enc_name, enc_results in results.items():
+        for case in cases:
+            if case.name not in enc_results:
+                continue
+            point = points.setdefault(enc_name, {}).setdefault(case.point, {
+                'cells': case.width * case.height,
+                'agents': case.agents,
+                'runs': 0,
+                'successes': [],
+            })
+            point['runs'] += 1
+            result = enc_results[case.name]
+            if result['fl_result'] == "success":
+                point['successes'].append(result)
+
+    for enc_points in points.values():
+        for point in enc_points.values():
+            successes = point.pop('successes')
+            point['success_rate'] = len(successes) / point['runs']
+            for key, values in (('atoms', [result['problem']['lp']['atoms'] for result in successes]),
+                                ('rules', [result['problem']['lp']['rules'] for result in successes]),
+                                ('time', [result['summary']['times']['total'] for result in successes]),
+                                ('flowtime', [result['schedule']['flowtime'] for result in successes])):
+                point[key] = sum(values) / len(values) if values else None
+    return points
+
+
+def find_regressions(points: dict[str, dict[str, dict]],
+                     baseline: dict[str, dict[str, dict]],
+                     tolerance: float | None = None) -> list[str]:
+    """ Compare scaling points to a stored baseline.
+
+        A point regresses if its success rate dropped, or if its ground size or time
+        grew by more than tolerance (a share of the baseline value).
+        Points missing in either of them are not compared.
+
+        Returns:
+            Description of every regression
+    """
+    tolerance = get_config().scaling_tolerance if tolerance is None else tolerance
+    regressions = []
+    for enc_name, enc_baseline in baseline.items():
+        for point_name, expected in enc_baseline.items():
+            actual = points.get(enc_name, {}).get(point_name)
+            if actual is None:
+                continue
+
+            if actual['success_rate'] < expected['success_rate']:
+                regressions.append(f"{enc_name} {point_name}: success rate "
+                                   f"{expected['success_rate']:.0%} -> {actual['success_rate']:.0%}")
+
+            for key in ('atoms', 'rules', 'time'):
+                if actual[key] is None or expected[key] is None:
+                    continue
+                if actual[key] > expected[key] * (1 + tolerance) and \
+                        (key != 'time' or actual[key] - expected[key] > MIN_TIME_DIFFERENCE):
+                    regressions.append(f"{enc_name} {point_name}: {key} {expected[key]:.2f} -> {actual[key]:.2f}")
+    return regressions
+
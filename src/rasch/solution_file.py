@@ -0,0 +1,152 @@
+import json
+import os
+from functools import cached_property
+
+import numpy as np
+
+from rasch.file import create_path_if_not_exist
+
+NO_ACTION = -1
+""" Value of steps without an action in the action matrix."""
+
+
+def write_solution(*, path: str, file_name: str,
+                   agent_actions: dict, agent_paths: dict, models: list[list[str]]) -> str:
+    """ Write a solution as compressed NumPy archive.
+
+        The archive contains an agents x steps int8 action matrix, an
+        agents x steps x 2 position array and the models as ids into
+        a table of interned symbol strings.
+    """
+    agents = sorted({int(id) for id in [*agent_actions, *agent_paths]})
+    rows = {id: row for row, id in enumerate(agents)}
+
+    steps = max([int(step) + 1 for actions in agent_actions.values() for step in actions] or [0])
+    actions = np.full((len(agents), steps), NO_ACTION, dtype=np.int8)
+    for id, agent_steps in agent_actions.items():
+        for step, action in agent_steps.items():
+            actions[rows[int(id)], int(step)] = action
+
+    path_length = max([len(positions) for positions in agent_paths.values()] or [0])
+    positions = np.full((len(agents), path_length, 2), -1, dtype=np.int32)
+    for id, agent_path in agent_paths.items():
+        if agent_path:
+            positions[rows[int(id)], :len(agent_path)] = agent_path
+
+    symbol_ids: dict[str, int] = {}
+    model_symbols = [symbol_ids.setdefault(symbol, len(symbol_ids)) for model in models for symbol in model]
+    model_offsets = np.cumsum([0, *[len(model) for model in models]])
+
+    create_path_if_not_exist(path=path)
+    file_path = os.path.join(path, file_name)
+
+    with open(file_path, 'wb') as f:
+        np.savez_compressed(f,
+                            agents=np.array(agents, dtype=np.int32),
+                            actions=actions,
+                            positions=positions,
+                            symbols=np.array(list(symbol_ids), dtype=str),
+                            model_symbols=np.array(model_symbols, dtype=np.int32),
+                            model_offsets=model_offsets.astype(np.int64))
+
+    return file_path
+
+
+class SolutionFile:
+    """ Lazy reader for solutions written by write_solution.
+
+        Arrays are only read from the archive when they are accessed.
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self._archive = np.load(file_path, allow_pickle=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._archive.close()
+
+    @cached_property
+    def agents(self) -> np.ndarray:
+        """ Agent ids of the rows of actions and positions."""
+        return self._archive["agents"]
+
+    @cached_property
+    def actions(self) -> np.ndarray:
+        """ Agents x steps action matrix, NO_ACTION where an agent has no action."""
+        return self._archive["actions"]
+
+    @cached_property
+    def positions(self) -> np.ndarray:
+        """ Agents x steps x 2 positions of the agent paths, -1 where a path has ended."""
+        return self._archive["positions"]
+
+    @cached_property
+    def _symbols(self) -> np.ndarray:
+        return self._archive["symbols"]
+
+    @cached_property
+    def _model_offsets(self) -> np.ndarray:
+        return self._archive["model_offsets"]
+
+    @property
+    def model_count(self) -> int:
+        return len(self._model_offsets) - 1
+
+    def model(self, index: int) -> list[str]:
+        """ Get the shown symbols of a single model."""
+        start, end = self._model_offsets[index], self._model_offsets[index + 1]
+        return self._symbols[self._archive["model_symbols"][start:end]].tolist()
+
+    @property
+    def agent_actions(self) -> dict[int, dict[int, int]]:
+        """ Actions in the layout of RaSchSolver.agent_actions."""
+        return {int(id): {int(step): int(action) for step, action in enumerate(row) if action != NO_ACTION}
+                for id, row in zip(self.agents, self.actions)}
+
+    @property
+    def agent_paths(self) -> dict[int, list[tuple[int, int]]]:
+        """ Paths in the layout of RaSchSolver.agent_paths."""
+        return {int(id): [tuple(position) for position in row.tolist() if position[0] >= 0]
+                for id, row in zip(self.agents, self.positions)
+                if (row[:, 0] >= 0).any()}
+
+    def to_dict(self) -> dict:
+        """ Get the solution in the same layout as a JSON solution file after loading."""
+        return {
+            "solution": {
+                "agent_paths": {str(id): [list(position) for position in path]
+                                for id, path in self.agent_paths.items()},
+                "agent_actions": {str(id): {str(step): action for step, action in actions.items()}
+                                  for id, actions in self.agent_actions.items()}
+            },
+            "models": [self.model(index) for index in range(self.model_count)]
+        }
+
+
+def read_solution(file_path: str) -> dict:
+    """ Read a JSON or NumPy solution file into the layout of a JSON solution file."""
+    if file_path.endswith('.npz'):
+        with SolutionFile(file_path) as solution:
+            return solution.to_dict()
+
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def convert_json_solution(file_path: str) -> str:
+    """ Convert a JSON solution file into a NumPy solution file next to it."""
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+
+    path, file_name = os.path.split(file_path)
+
+    return write_solution(path=path,
+                          file_name=f"{os.path.splitext(file_name)[0]}.npz",
+                          agent_actions=data["solution"]["agent_actions"],
+                          agent_paths=data["solution"]["agent_paths"],
+                          models=data["models"])
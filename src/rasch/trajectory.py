@@ -0,0 +1,57 @@
+from typing import NamedTuple
+
+import numpy as np
+from flatland.envs.agent_utils import EnvAgent
+from flatland.envs.step_utils.states import TrainState
+
+NO_POSITION = -1
+
+
+class AgentStep(NamedTuple):
+    """ Recorded state of one agent at one step."""
+    position: tuple[int, int] | None
+    direction: int
+    state: TrainState
+
+
+class Trajectory:
+    """ Positions, directions and states of all agents for every simulated step.
+
+        Stored in arrays that are allocated once for the whole simulation.
+        Positions of agents that are not on the map are NO_POSITION.
+    """
+
+    def __init__(self, agent_count: int, max_steps: int) -> None:
+        self.positions = np.full((max_steps, agent_count, 2), NO_POSITION, dtype=np.int32)
+        """ Steps x agents x (row, column)."""
+        self.directions = np.zeros((max_steps, agent_count), dtype=np.int8)
+        """ Steps x agents orientation."""
+        self.states = np.zeros((max_steps, agent_count), dtype=np.int8)
+        """ Steps x agents TrainState value."""
+        self.steps = 0
+        """ Number of recorded steps."""
+
+    def record(self, step: int, agents: list[EnvAgent]) -> None:
+        """ Store the current state of the agents as the given step."""
+        for idx, agent in enumerate(agents):
+            if agent.position is not None:
+                self.positions[step, idx] = agent.position
+            self.directions[step, idx] = agent.direction
+            self.states[step, idx] = agent.state
+        self.steps = max(self.steps, step + 1)
+
+    def agent_at(self, agent: int, step: int) -> AgentStep:
+        """ State of one agent at the given step."""
+        if not 0 <= step < self.steps:
+            raise IndexError(f"Step {step} was not recorded, {self.steps} steps are available.")
+
+        row, column = self.positions[step, agent]
+        position = None if row == NO_POSITION else (int(row), int(column))
+        return AgentStep(position, int(self.directions[step, agent]), TrainState(self.states[step, agent]))
+
+    def at(self, step: int) -> list[AgentStep]:
+        """ State of all agents at the given step."""
+        return [self.agent_at(agent, step) for agent in range(self.positions.shape[1])]
+
+    def __len__(self) -> int:
+        return self.steps
@@ -0,0 +1,367 @@
+import copy
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from typing import Any, Self
+
+from flatland.envs.rail_env import RailEnv
+
+from rasch.file import read_from_pickle_file
+from rasch.instrumentation import PhaseTimer
+from rasch.rasch_config import get_config
+from rasch.rasch_setup import (
+    PreparedJob,
+    SolvedJob,
+    finish_job,
+    prepare_job,
+    solve_and_simulate,
+)
+
+logger = logging.getLogger("railway")
+
+ENV_CACHE_SIZE = 16
+""" Loaded environments each worker keeps for later jobs."""
+
+MODEL = "model"
+STARTED = "started"
+DONE = "done"
+
+
+def solve_kwargs(args) -> dict[str, Any]:
+    """ Get the solve_and_simulate arguments of a job from the command line arguments."""
+    return {
+        'env_name': args.environment,
+        'enc_name': args.encoding,
+        'loglevel': args.loglevel,
+        'limit': None if args.limit is None else int(args.limit),
+        'norender': args.norender,
+        'incremental': args.incremental,
+        'write_instance': args.write_instance,
+        'compressed': args.compressed,
+        'windows': args.windows,
+        'threads': args.threads,
+        'parallel_mode': args.parallel_mode,
+        'configuration': args.configuration,
+        'keep_models': args.keep_models,
+        'validator': args.validator,
+        'use_cache': False if args.no_cache else None,
+        'profiler': args.profile,
+        'env_path': getattr(args, 'environments_path', None),
+        'strategy': getattr(args, 'strategy', None),
+        'rolling': getattr(args, 'rolling', False),
+        'heuristic': getattr(args, 'heuristic', None)
+    }
+
+
+def _load_env(kwargs: dict[str, Any], envs: dict[tuple[str, str], RailEnv]) -> RailEnv:
+    """ Get the environment of a job, loading it if it is not in envs."""
+    key = (kwargs.get('env_path') or get_config().flatland_environments_path, kwargs['env_name'])
+
+    env = envs.get(key)
+    if env is None:
+        if len(envs) >= ENV_CACHE_SIZE:
+            envs.pop(next(iter(envs)))  # forget the environment loaded first
+        env = envs[key] = read_from_pickle_file(f"{kwargs['env_name']}.pkl", path=key[0])
+    return env
+
+
+def solve_job(kwargs: dict[str, Any], envs: dict[tuple[str, str], RailEnv] | None = None,
+              prepared: PreparedJob | None = None) -> dict | SolvedJob:
+    """ Solve a job with solve_and_simulate, reusing the environment if it was loaded before.
+
+        With prepared the instance of the job was generated ahead and its schedule is returned
+        as SolvedJob for finish_job, unless it is rendered or profiled.
+
+        Returns:
+            Statistics of the run, fl_result is error if it failed
+    """
+    if prepared is not None:
+        defer = not kwargs.get('norender') and not kwargs.get('profiler')
+        result = solve_and_simulate(**kwargs, prepared=prepared, defer_validation=defer)
+        return result if isinstance(result, (dict, SolvedJob)) else {'fl_result': "error"}
+
+    env = _load_env(kwargs, {} if envs is None else envs)
+    env.reset()  # undo the steps of the last simulation
+
+    statistics = solve_and_simulate(**kwargs, env=env)
+    return statistics if isinstance(statistics, dict) else {'fl_result': "error"}
+
+
+def _failed(kwargs: dict[str, Any], e: Exception) -> dict:
+    logger.error(f"Job {kwargs['enc_name']} {kwargs['env_name']} failed: {e!r}")
+    return {'fl_result': "error", 'error': repr(e)}
+
+
+def _work(tasks: mp.Queue, results: mp.Queue, pipeline_depth: int = 0) -> None:
+    """ Solve jobs from tasks until None is received.
+
+        Every improved model is sent as (job id, MODEL, model) before the final (job id, DONE, statistics).
+        With a pipeline_depth the jobs pass three stages, see _work_pipelined.
+    """
+    if pipeline_depth > 0:
+        _work_pipelined(tasks, results, pipeline_depth)
+        return
+
+    envs = {}
+    while (task := tasks.get()) is not None:
+        job_id, kwargs = task
+        def on_model(model: dict, job_id=job_id) -> None:
+            results.put((job_id, MODEL, model))
+
+        try:
+            statistics = solve_job({**kwargs, 'on_model': on_model}, envs)
+        except Exception as e:  # noqa: BLE001 the worker survives failing jobs
+            statistics = _failed(kwargs, e)
+        results.put((job_id, DONE, statistics))
+
+
+def _work_pipelined(tasks: mp.Queue, results: mp.Queue, depth: int) -> None:
+    """ Solve jobs from tasks in three stages until None is received.
+
+        A thread loads the environment and generates the instance of the next jobs while the solver
+        runs, another thread validates the schedules of the jobs solved before. At most depth jobs
+        wait between two stages. Every job gets its own copy of the environment, so the stages never share one.
+        Jobs that can not be prepared are run by the solver stage on their own, which reports their error.
+        (job id, STARTED, None) is sent when the solver takes up a job.
+    """
+    envs = {}
+    prepared_jobs = queue.Queue(maxsize=depth)
+    solved_jobs = queue.Queue(maxsize=depth)
+
+    def prepare() -> None:
+        while (task := tasks.get()) is not None:
+            job_id, kwargs = task
+            timer = PhaseTimer()
+            try:
+                with timer.phase('load'):
+                    env = copy.deepcopy(_load_env(kwargs, envs))
+                    env.reset()
+                prepared = prepare_job(env, kwargs.get('limit'), compressed=kwargs.get('compressed', False),
+                                       windows=kwargs.get('windows', False), heuristic=kwargs.get('heuristic'),
+                                       rolling=kwargs.get('rolling', False), timer=timer,
+                                       env_name=kwargs['env_name'])
+            except Exception as e:  # noqa: BLE001 the solver stage runs the job without preparation
+                logger.debug(f"Could not prepare {kwargs['enc_name']} {kwargs['env_name']}: {e!r}")
+                prepared = None
+            prepared_jobs.put((job_id, kwargs, prepared))
+        prepared_jobs.put(None)
+
+    def validate() -> None:
+        while (item := solved_jobs.get()) is not None:
+            job_id, kwargs, result, pipeline = item
+            if isinstance(result, SolvedJob):
+                try:
+                    result = finish_job(result)
+                except Exception as e:  # noqa: BLE001 the worker survives failing jobs
+                    result = _failed(kwargs, e)
+            if pipeline is not None:
+                result['pipeline'] = pipeline
+            results.put((job_id, DONE, result))
+
+    stages = [threading.Thread(target=prepare, daemon=True), threading.Thread(target=validate, daemon=True)]
+    for stage in stages:
+        stage.start()
+
+    while True:
+        waiting = time.perf_counter()
+        if (item := prepared_jobs.get()) is None:
+            break
+        wait = time.perf_counter() - waiting  # the solver was idle because the instance was not ready
+        job_id, kwargs, prepared = item
+        results.put((job_id, STARTED, None))
+        def on_model(model: dict, job_id=job_id) -> None:
+            results.put((job_id, MODEL, model))
+
+        try:
+            if prepared is None:
+                result = solve_job({**kwargs, 'on_model': on_model})
+            else:
+                result = solve_job({**kwargs, 'on_model': on_model}, prepared=prepared)
+        except Exception as e:  # noqa: BLE001 the worker survives failing jobs
+            result = _failed(kwargs, e)
+        solved_jobs.put((job_id, kwargs, result, None if prepared is None else {'solver_wait': wait}))
+
+    solved_jobs.put(None)
+    for stage in stages:
+        stage.join()
+
+
+class _Worker:
+    def __init__(self, results: mp.Queue, pipeline_depth: int = 0) -> None:
+        self.tasks = mp.Queue()
+        self.process = mp.Process(target=_work, args=(self.tasks, results, pipeline_depth), daemon=True)
+        self.process.start()
+        self.capacity = pipeline_depth + 2 if pipeline_depth > 0 else 1
+        """ Jobs given to the worker at once, one in every stage of the pipeline and depth waiting."""
+        self.jobs: dict[Any, dict] = {}
+        """ Jobs given to the worker that are not done, in the order they were given."""
+        self.job_id: Any = None
+        """ Job that is being prepared or solved, None if idle."""
+        self.started = 0.0
+
+    def stop(self) -> None:
+        self.tasks.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class WorkerPool:
+    """ Long-lived worker processes that solve jobs with solve_and_simulate.
+
+        Workers keep their imports and loaded environments between jobs.
+        The solver of every job is interrupted after timeout seconds and the best schedule
+        found until then is validated. A worker is only replaced if it does not answer
+        within timeout + hang_grace seconds, e.g. while grounding, which can not be interrupted.
+        The last model it sent is then reported as unvalidated anytime result.
+        With a pipeline_depth each worker prepares the instances of the next jobs and validates
+        the schedules of the last ones while solving, the other jobs of a replaced worker are solved again.
+
+        Example:
+            with WorkerPool(processes=4) as pool:
+                for job in jobs:
+                    pool.submit(job, kwargs[job])
+                for job, statistics in pool.results():
+                    ...
+    """
+
+    def __init__(self,
+                 processes: int | None = None,
+                 timeout: float | None = None,
+                 hang_grace: float | None = None,
+                 pipeline_depth: int = 0) -> None:
+        self.timeout = get_config().solve_timeout if timeout is None else timeout
+        self.hang_grace = get_config().worker_hang_grace if hang_grace is None else hang_grace
+        self.pipeline_depth = pipeline_depth
+        self._results = mp.Queue()
+        self._workers = [_Worker(self._results, pipeline_depth)
+                         for _ in range(processes or get_config().benchmark_processes)]
+        self._pending: deque[tuple[Any, dict]] = deque()
+        self._best: dict[Any, dict] = {}
+        """ Latest model streamed by the worker of each running job."""
+        self._ids = itertools.count()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def submit(self, job_id: Any, kwargs: dict[str, Any]) -> None:
+        """ Queue a job, kwargs are passed to solve_and_simulate."""
+        self._pending.append((job_id, {**kwargs, 'timeout': self.timeout}))
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for worker in self._workers:
+            while self._pending and len(worker.jobs) < worker.capacity:
+                job_id, kwargs = self._pending.popleft()
+                if not worker.jobs:  # an idle worker starts right away
+                    worker.job_id, worker.started = job_id, time.monotonic()
+                worker.jobs[job_id] = kwargs
+                logger.info(f"Solving {kwargs['env_name']} with {kwargs['enc_name']}.")
+                worker.tasks.put((job_id, kwargs))
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.process.terminate()
+        worker.process.join()
+        self._workers[self._workers.index(worker)] = _Worker(self._results, self.pipeline_depth)
+
+    def _check_workers(self) -> list[tuple[Any, dict]]:
+        """ Replace workers that died or hang and return the results of their jobs.
+
+            Only the job being solved fails, the other jobs of the worker are queued again.
+        """
+        failed = []
+        for worker in list(self._workers):
+            if not worker.jobs:
+                continue
+            job_id = worker.job_id if worker.job_id in worker.jobs else next(iter(worker.jobs))
+            if not worker.process.is_alive():
+                logger.error(f"Worker died while solving job {job_id}.")
+                failed.append((job_id, {'fl_result': "error"}))
+            elif worker.job_id is not None and time.monotonic() - worker.started > self.timeout + self.hang_grace:
+                logger.warning("Solving timed out, replacing the worker.")
+                statistics = {'fl_result': "timeout"}
+                if job_id in self._best:
+                    statistics['anytime'] = {**self._best[job_id], 'validated': False}
+                failed.append((job_id, statistics))
+            else:
+                continue
+            self._best.pop(job_id, None)
+            worker.jobs.pop(job_id)
+            self._pending.extendleft(reversed(worker.jobs.items()))
+            self._replace(worker)
+        return failed
+
+    @property
+    def capacity(self) -> int:
+        """ Jobs the workers can take at once."""
+        return sum(worker.capacity for worker in self._workers)
+
+    @property
+    def running(self) -> int:
+        """ Submitted jobs that are not finished."""
+        return len(self._pending) + sum(len(worker.jobs) for worker in self._workers)
+
+    def poll(self, timeout: float = 1.0) -> list[tuple[Any, dict]]:
+        """ Wait up to timeout seconds for answers of the workers and return (job id, statistics) of finished jobs."""
+        finished = []
+        try:
+            job_id, kind, payload = self._results.get(timeout=timeout)
+            worker = next((worker for worker in self._workers if job_id in worker.jobs), None)
+            if worker is None:  # answer of a replaced worker that was already reported
+                pass
+            elif kind == MODEL:
+                self._best[job_id] = payload
+            elif kind == STARTED:
+                worker.job_id, worker.started = job_id, time.monotonic()
+            else:
+                del worker.jobs[job_id]
+                if worker.job_id == job_id:  # the next job is being prepared, it gets the same deadline
+                    worker.job_id, worker.started = next(iter(worker.jobs), None), time.monotonic()
+                self._best.pop(job_id, None)
+                finished.append((job_id, payload))
+        except queue.Empty:
+            pass
+        finished += self._check_workers()
+
+        self._dispatch()
+        return finished
+
+    def results(self) -> Iterator[tuple[Any, dict]]:
+        """ Yield (job id, statistics) of the submitted jobs as they finish."""
+        while self.running:
+            yield from self.poll()
+
+    def solve(self, kwargs: dict[str, Any]) -> dict:
+        """ Solve a single job and wait for its statistics.
+
+            Results of jobs submitted before are dropped, do not mix with submit.
+        """
+        job_id = ('solve', next(self._ids))
+        self.submit(job_id, kwargs)
+        return next(statistics for finished, statistics in self.results() if finished == job_id)
+
+    def close(self) -> None:
+        """ Stop all workers."""
+        for worker in self._workers:
+            worker.stop()
+
+
+def solve_with_timeout(args, pool: WorkerPool | None = None) -> dict:
+    """ Solve the job described by args in a worker process.
+
+        Uses pool if given, otherwise a worker is started for this job only.
+    """
+    if pool is not None:
+        return pool.solve(solve_kwargs(args))
+
+    with WorkerPool(processes=1) as single_pool:
+        return single_pool.solve(solve_kwargs(args))
@@ -1,4 +1,3 @@
-import json
 import re
 from collections import defaultdict
 from typing import Any
@@ -11,6 +10,7 @@ from rasch.file import read_from_pickle_file
 from rasch.logging import get_logger
 from rasch.rasch_config import RaSchConfig
 from rasch.rasch_solver import RaSchSolver
+from rasch.solution_file import read_solution
 
 
 @pytest.fixture(scope="session")
@@ -27,6 +27,15 @@ def test_config() -> RaSchConfig:
         return data["rasch_config"]
 
 
+@pytest.fixture
+def simple_switch_map(test_config):
+    env = read_from_pickle_file('simple_switch_map.pkl', path=test_config.flatland_environments_path)
+    env.reset()
+    for agent in env.agents:
+        agent.earliest_departure = 0
+    return env
+
+
 @pytest.fixture(scope="session")
 def json_simple_switch_map_from_pkl(test_config):
     logger = get_logger()
@@ -44,15 +53,15 @@ def json_simple_switch_map_from_pkl(test_config):
     solver = RaSchSolver(environment=env,
                          clingo_control=clingo_control,
                          logger=logger,
-                         config=test_config
+                         config=test_config,
+                         keep_models=True
                          )
     solver.solve(encoding_name,f"{encoding_name}_{environment_name}_instance")
 
     solve_file = f"{encoding_name}_{environment_name}_solve.json"
     solver.save(solve_file)
 
-    with open(f"{test_config.solver_output_path}{solve_file}") as json_data:
-        data = json.load(json_data)
+    data = read_solution(f"{test_config.solver_output_path}{solve_file}")
 
     yield data
 
@@ -70,15 +79,15 @@ def json_simple_switch_map_from_instance(test_config):
     clingo_control = Control()
     solver = RaSchSolver(clingo_control=clingo_control,
                          logger=logger,
-                         config=test_config
+                         config=test_config,
+                         keep_models=True
                          )
     solver.solve(encoding_name,f"{encoding_name}_{environment_name}_instance")
 
     solve_file = f"{encoding_name}_{environment_name}_solve.json"
     solver.save(solve_file)
 
-    with open(f"{test_config.solver_output_path}{solve_file}") as json_data:
-        data = json.load(json_data)
+    data = read_solution(f"{test_config.solver_output_path}{solve_file}")
 
     yield data
 
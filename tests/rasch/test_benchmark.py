@@ -0,0 +1,102 @@
+import copy
+import logging
+import os
+from argparse import Namespace
+
+import pytest
+
+from rasch import benchmark, worker_pool
+from rasch.benchmark import Benchmark
+from rasch.job_queue import JobQueue
+
+
+@pytest.fixture
+def bench(test_config, tmp_path):
+    config = copy.copy(test_config)
+    config.statistics_output_path = str(tmp_path)
+    return Benchmark(logger=logging.getLogger("railway"), config=config)
+
+
+@pytest.fixture
+def args():
+    return Namespace(encoding=None, environment=None, limit=None, processes=2, loglevel='warning',
+                     norender=False, incremental=False, write_instance=False, compressed=False, windows=False,
+                     threads=None, parallel_mode=None, configuration=None, keep_models=False, validator=None,
+                     no_cache=False, profile=None)
+
+
+def test_run_jobs_resumes_finished_jobs(bench, args, monkeypatch, tmp_path):
+    solved_file = tmp_path / "solved.txt"
+
+    def solved():
+        jobs = [tuple(line.split()) for line in solved_file.read_text().splitlines()]
+        solved_file.write_text("")
+        return [(enc, env, int(limit)) for enc, env, limit in jobs]
+
+    def fake_solve_job(kwargs, envs=None):  # runs in the forked workers
+        with open(solved_file, "a") as f:
+            f.write(f"{kwargs['enc_name']} {kwargs['env_name']} {kwargs['limit']}\n")
+        return {"fl_result": "timeout"}
+
+    monkeypatch.setattr(worker_pool, "solve_job", fake_solve_job)
+    solved_file.write_text("")
+    jobs = [("vertex", "a", 20), ("vertex", "b", 20), ("primitive", "a", 20)]
+
+    results = bench.run_jobs(args, jobs, name="test")
+    assert sorted(solved()) == sorted(jobs)
+    assert results == {job: {"fl_result": "timeout"} for job in jobs}
+
+    results = bench.run_jobs(args, [*jobs, ("vertex", "c", 30)], name="test")
+    assert solved() == [("vertex", "c", 30)]
+    assert len(results) == 4
+
+    monkeypatch.setattr(benchmark, "git_revision", lambda: ("f" * 40, False))  # a new commit measures again
+    bench.run_jobs(args, jobs, name="test")
+    assert sorted(solved()) == sorted(jobs)
+
+
+def test_cleared_jobs_leave_the_job_queue(bench, args, tmp_path):
+    args.queue = str(tmp_path / "queue.sqlite")
+    jobs_path = bench._jobs_path(args, "scaling")
+    os.makedirs(jobs_path)
+    JobQueue(args.queue).submit(jobs_path, {("vertex", "a", 20): {'env_name': "a"}})
+
+    bench._clear_jobs(args, "scaling")
+
+    assert not os.path.exists(jobs_path)
+    assert JobQueue(args.queue).counts(jobs_path) == {}
+
+
+def test_jobs_bypass_the_result_cache(bench, args):
+    assert bench._job_kwargs(args, ("vertex", "a", 20))['use_cache'] is False
+    assert not args.no_cache
+
+
+def test_run_jobs_appends_runs_to_the_store(bench, args, monkeypatch):
+    def fake_solve_job(kwargs, envs=None):  # runs in the forked workers
+        return {"fl_result": "success", "horizon": kwargs['limit'], "summary": {"times": {"total": 1.0}}}
+
+    monkeypatch.setattr(worker_pool, "solve_job", fake_solve_job)
+    bench.run_jobs(args, [("vertex", "a", 20), ("vertex", "b_s3", 30)], name="test")
+
+    runs = bench._store().load().sort_values('environment')
+    assert runs['environment'].tolist() == ["a", "b_s3"]
+    assert runs['horizon'].tolist() == [20, 30]
+    assert runs['seed'].tolist()[1] == 3
+    assert runs['summary.times.total'].tolist() == [1.0, 1.0]
+    assert runs['git_hash'].notna().all()
+    assert runs['batch'].nunique() == 1
+
+
+def test_compare_reports_ratio_of_medians(bench):
+    store = bench._store()
+    for git_hash, total in [("aaa1", 2.0), ("aaa1", 4.0), ("bbb2", 1.5), ("ccc3", 9.0)]:
+        store.append({'git_hash': git_hash, 'encoding': "vertex", 'environment': "a", 'mode': "default",
+                      'fl_result': "success", 'summary.times.total': total})
+
+    table = bench.compare(["aaa", "bbb"], metrics=['summary.times.total'])
+
+    row = table.loc[("vertex", "a", "default")]
+    assert row[('summary.times.total', 'aaa')] == 3.0
+    assert row[('summary.times.total', 'ratio')] == 0.5
+    assert row[('success_rate', 'ratio')] == 1.0
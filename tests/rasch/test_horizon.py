@@ -0,0 +1,43 @@
+import logging
+
+from clingo.control import Control
+
+from rasch import rasch_setup
+from rasch.horizon import estimate_horizon, shortest_path_lengths
+from rasch.instance_generation import generate_instance_symbols
+from rasch.rasch_config import get_config
+from rasch.rasch_setup import prepare_job
+from rasch.rasch_solver import RaSchSolver
+
+
+def test_estimate_horizon(simple_switch_map):
+    env = simple_switch_map
+
+    assert shortest_path_lengths(env) == [2, 2]
+    assert estimate_horizon(env, slack=0, slack_factor=0) == 2
+    assert estimate_horizon(env, slack=5, slack_factor=0.5) == 2 + 1 + 5
+
+
+def test_shortest_path_is_lower_bound(test_config, simple_switch_map):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+    solver.add_instance_symbols(generate_instance_symbols(env, 20))
+
+    solver.solve_incremental(encoding_name="vertex", instance_name=None, max_horizon=20)
+
+    assert max(shortest_path_lengths(env)) <= solver.horizon <= estimate_horizon(env, slack=5, slack_factor=0.5)
+
+
+def test_prepare_job_reads_horizon_source(simple_switch_map, monkeypatch):
+    horizons = {'simple_switch_map': 13}
+    monkeypatch.setattr(rasch_setup, "get_horizons", lambda key, logger: horizons.get(key, -1))
+
+    assert prepare_job(simple_switch_map, env_name='simple_switch_map')[1:3] == (estimate_horizon(simple_switch_map),
+                                                                                 'estimate')
+    monkeypatch.setattr(get_config(), 'horizon_source', 'config')
+    assert prepare_job(simple_switch_map, env_name='simple_switch_map')[1:3] == (13, 'config')
+    assert prepare_job(simple_switch_map, env_name='other')[1:3] == (estimate_horizon(simple_switch_map), 'estimate')
+    assert prepare_job(simple_switch_map, limit=20, env_name='simple_switch_map')[1:3] == (20, 'limit')
@@ -0,0 +1,112 @@
+from clingo.control import Control
+from flatland.envs.line_generators import sparse_line_generator
+from flatland.envs.rail_env import RailEnv
+from flatland.envs.rail_generators import sparse_rail_generator
+
+from rasch.horizon import shortest_path_lengths
+from rasch.instance_generation import (
+    DIFFS,
+    generate_heuristic_symbols,
+    generate_instance_lines,
+    generate_instance_symbols,
+    generate_window_lines,
+    generate_window_symbols,
+    reachability_windows,
+    useful_states,
+)
+
+
+def test_instance_symbols_match_instance_lines(simple_switch_map):
+    clingo_control = Control()
+    clingo_control.add("base", [], "\n".join(generate_instance_lines(simple_switch_map, 20)))
+    clingo_control.ground([("base", [])])
+
+    facts = {atom.symbol for atom in clingo_control.symbolic_atoms}
+    symbols = generate_instance_symbols(simple_switch_map, 20)
+
+    assert len(symbols) == len(set(symbols))
+    assert set(symbols) == facts
+
+
+def test_vectorised_instance_lines_match_loop(simple_switch_map):
+    assert (generate_instance_lines(simple_switch_map, 20, vectorised=True)
+            == generate_instance_lines(simple_switch_map, 20, vectorised=False))
+
+
+def test_vectorised_instance_lines_match_loop_on_sparse_map():
+    env = RailEnv(width=30,
+                  height=30,
+                  number_of_agents=2,
+                  rail_generator=sparse_rail_generator(max_num_cities=3, seed=42),
+                  line_generator=sparse_line_generator(seed=42))
+    env.reset()
+
+    assert (generate_instance_lines(env, 20, vectorised=True)
+            == generate_instance_lines(env, 20, vectorised=False))
+
+
+def test_pruned_instance_keeps_paths_of_agents(simple_switch_map):
+    symbols = generate_instance_symbols(simple_switch_map, 20)
+    pruned = generate_instance_symbols(simple_switch_map, 20, prune=True)
+    useful = useful_states(simple_switch_map, 20)
+
+    assert set(pruned) < set(symbols)
+    assert set(pruned) == {symbol for symbol in symbols if symbol.name != "cell"
+                           or useful[(*[number.number for number in symbol.arguments[0].arguments],
+                                      symbol.arguments[1].number)]}
+    for agent in simple_switch_map.agents:
+        assert useful[(*agent.initial_position, agent.direction)]
+        assert useful[tuple(agent.target)].any()
+
+
+def test_pruned_instance_lines_match_symbols(simple_switch_map):
+    clingo_control = Control()
+    clingo_control.add("base", [], "\n".join(generate_instance_lines(simple_switch_map, 20, prune=True)))
+    clingo_control.ground([("base", [])])
+
+    facts = {atom.symbol for atom in clingo_control.symbolic_atoms}
+
+    assert set(generate_instance_symbols(simple_switch_map, 20, prune=True)) == facts
+    assert (generate_instance_lines(simple_switch_map, 20, vectorised=True, prune=True)
+            == generate_instance_lines(simple_switch_map, 20, vectorised=False, prune=True))
+
+
+def test_reachability_windows(simple_switch_map):
+    lengths = shortest_path_lengths(simple_switch_map)
+
+    for (handle, earliest, latest), agent in zip(reachability_windows(simple_switch_map, 8), simple_switch_map.agents):
+        assert earliest[(*agent.initial_position, agent.direction)] == 0
+        assert latest[(*agent.initial_position, agent.direction)] == 8 - lengths[handle]
+        assert (latest[tuple(agent.target)].max()) == 8
+        assert ((earliest >= 0) == (latest >= 0)).all()
+        assert (earliest[earliest >= 0] <= latest[earliest >= 0] + 1).all()
+
+
+def test_window_symbols_match_window_lines(simple_switch_map):
+    clingo_control = Control()
+    clingo_control.add("base", [], "\n".join(generate_window_lines(simple_switch_map, 8)))
+    clingo_control.ground([("base", [])])
+
+    facts = {atom.symbol for atom in clingo_control.symbolic_atoms}
+
+    assert set(generate_window_symbols(simple_switch_map, 8)) == facts
+
+
+def test_heuristic_symbols_follow_shortest_path(simple_switch_map):
+    lengths = shortest_path_lengths(simple_switch_map)
+    toward = {}
+    for symbol in generate_heuristic_symbols(simple_switch_map, 8):
+        handle, position, orientation, direction = symbol.arguments
+        state = (handle.number, tuple(number.number for number in position.arguments), orientation.number)
+        toward.setdefault(state, []).append(direction.number)
+
+    for agent in simple_switch_map.agents:
+        state = (agent.handle, tuple(agent.initial_position), agent.direction)
+        moves = 0
+        while state in toward:
+            direction = toward[state][0]
+            state = (agent.handle, tuple(a + b for a, b in zip(state[1], DIFFS[direction])), direction)
+            moves += 1
+
+        assert state[1] == tuple(agent.target)
+        assert moves == lengths[agent.handle]
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from rasch.instrumentation import PhaseTimer
+
+
+def test_phases_add_up():
+    timer = PhaseTimer()
+    timer.start()
+    for _ in range(2):
+        with timer.phase('work'):
+            sum(range(10000))
+
+    assert set(timer.phases) == {'work'}
+    assert timer.phases['work']['wall'] > 0
+    assert 'traced_peak' not in timer.phases['work']
+    assert timer.stop(path='unused', name='unused') is None
+
+
+def test_nested_phases_count_once():
+    timer = PhaseTimer()
+    with timer.phase('simulate'):
+        with timer.phase('step'):
+            sum(range(10000))
+        with timer.phase('render'):
+            sum(range(10000))
+
+    simulate, step, render = (timer.phases[name] for name in ['simulate', 'step', 'render'])
+    assert simulate['self'] == pytest.approx(simulate['wall'] - step['wall'] - render['wall'])
+    assert step['self'] == step['wall']
+    assert all(0 <= phase['self'] <= phase['wall'] for phase in (simulate, step, render))
+    # the high-water mark of the process only grows
+    assert 0 < step['rss_high_water'] <= render['rss_high_water'] <= simulate['rss_high_water']
+
+
+def test_tracemalloc_records_traced_peak(tmp_path):
+    timer = PhaseTimer(profiler='tracemalloc')
+    timer.start()
+    with timer.phase('allocate'):
+        data = [0] * 2**20
+    del data
+
+    assert timer.phases['allocate']['traced_peak'] >= 8
+
+    profile = timer.stop(path=str(tmp_path), name='run')
+    assert os.path.exists(profile['file'])
+
+
+def test_nested_phase_keeps_traced_peak_of_outer_phase(tmp_path):
+    timer = PhaseTimer(profiler='tracemalloc')
+    timer.start()
+    with timer.phase('outer'):
+        data = [0] * 2**20
+        del data
+        with timer.phase('inner'):
+            sum(range(1000))
+
+    assert timer.phases['outer']['traced_peak'] >= 8
+    assert timer.phases['inner']['traced_peak'] < 8
+    timer.stop(path=str(tmp_path), name='run')
+
+
+def test_cprofile_writes_profile(tmp_path):
+    timer = PhaseTimer(profiler='cprofile')
+    timer.start()
+    with timer.phase('work'):
+        sorted(range(1000), reverse=True)
+
+    profile = timer.stop(path=str(tmp_path), name='run')
+
+    assert profile['file'] == os.path.join(str(tmp_path), 'run.prof')
+    assert os.path.exists(profile['file'])
+    assert profile['top']
+
+
+def test_unknown_profiler():
+    with pytest.raises(ValueError):
+        PhaseTimer(profiler='perf')
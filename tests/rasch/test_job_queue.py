@@ -0,0 +1,65 @@
+import multiprocessing as mp
+import time
+
+from rasch.job_queue import JobQueue, run_worker
+from rasch.rasch_config import get_config
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"), lease=0.2, max_attempts=2)
+    queue.submit("batch", {("vertex", "a", 20): {'env_name': "a"}})
+
+    assert queue.claim("first") == [("batch", ("vertex", "a", 20), {'env_name': "a"})]
+    assert queue.claim("second") == []
+
+    time.sleep(0.3)
+    assert [job for _, job, _ in queue.claim("second")] == [("vertex", "a", 20)]
+    assert not queue.complete("first", "batch", ("vertex", "a", 20), {'fl_result': "success"})
+    assert queue.complete("second", "batch", ("vertex", "a", 20), {'fl_result': "success"})
+    assert list(queue.results("batch", [("vertex", "a", 20)])) == [(("vertex", "a", 20), {'fl_result': "success"})]
+
+
+def test_job_of_dying_workers_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"), lease=0.1, max_attempts=1)
+    queue.submit("batch", {("vertex", "a", 20): {'env_name': "a"}})
+    queue.claim("first")
+
+    time.sleep(0.2)
+    assert queue.claim("second") == []
+    assert queue.counts("batch") == {'done': 1}
+
+
+def test_cleared_batch_is_solved_again(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite"))
+    queue.submit("batch", {("vertex", "a", 20): {'env_name': "a"}})
+    queue.claim("first")
+    queue.complete("first", "batch", ("vertex", "a", 20), {'fl_result': "success"})
+
+    queue.clear("batch")
+    queue.submit("batch", {("vertex", "a", 20): {'env_name': "a"}})
+
+    assert queue.counts("batch") == {'pending': 1}
+    assert [job for _, job, _ in queue.claim("second")] == [("vertex", "a", 20)]
+
+
+def test_several_workers_drain_the_queue(test_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_config(), 'solver_output_path', f"{tmp_path}/")  # forked workers inherit it
+    path = str(tmp_path / "queue.sqlite")
+    jobs = [(encoding, "simple_switch_map", limit) for encoding in ("vertex", "primitive") for limit in (8, 9, 10)]
+    JobQueue(path).submit("batch", {job: {'enc_name': job[0], 'env_name': job[1], 'limit': job[2], 'loglevel': "warning",
+                                          'validator': "fast", 'use_cache': False,
+                                          'env_path': test_config.flatland_environments_path}
+                                    for job in jobs})
+
+    workers = [mp.Process(target=run_worker, args=(path,), kwargs={'processes': 1, 'idle_exit': True, 'poll': 0.05})
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    results = dict(JobQueue(path).results("batch", jobs, poll=0.05))
+    for worker in workers:
+        worker.join()
+
+    assert set(results) == set(jobs)
+    assert all(statistics['fl_result'] == "success" for statistics in results.values())
+    assert all(statistics['horizon'] == job[2] for job, statistics in results.items())
+    assert all('pipeline' in statistics for statistics in results.values())  # prepared ahead of the solver
@@ -0,0 +1,28 @@
+from clingo.control import Control
+
+from rasch.instance_generation import generate_instance_lines
+from rasch.rail_graph import compress_rail_graph, rail_graph_key
+
+
+def test_compressed_graph_matches_vertex_encoding(test_config, simple_switch_map):
+    with open(f"{test_config.asp_encodings_path}vertex.lp", 'r') as f:
+        encoding = f.read()
+    graph_rules = encoding[:encoding.index("%%% Starting position")]
+
+    clingo_control = Control()
+    clingo_control.add("base", [], "\n".join(generate_instance_lines(simple_switch_map, 20)) + graph_rules)
+    clingo_control.ground([("base", [])])
+
+    grounded = {str(atom.symbol) for atom in clingo_control.symbolic_atoms
+                if atom.symbol.name in ("vertex", "edge")}
+
+    vertices, edges = compress_rail_graph(simple_switch_map)
+    compressed = {f"vertex(({y},{x}))" for y, x in vertices}
+    compressed.update(f"edge(({y},{x}),{o},{d},({y_},{x_}),{d_},{length})"
+                      for (y, x), o, d, (y_, x_), d_, length in edges)
+
+    assert compressed == grounded
+
+
+def test_rail_graph_key_is_stable(simple_switch_map):
+    assert rail_graph_key(simple_switch_map) == rail_graph_key(simple_switch_map)
@@ -0,0 +1,83 @@
+import os
+
+from clingo import Function, Number
+
+from rasch.rasch_config import get_config
+from rasch.rasch_setup import solve_and_simulate
+from rasch.result_cache import ResultCache, result_key
+
+ACTIONS = {0: {0: 2, 1: 4}, 1: {0: 2}}
+
+
+def test_key_ignores_horizon(tmp_path):
+    encoding = tmp_path / "encoding.lp"
+    encoding.write_text("a.")
+    facts = [Function("schedule", [Number(0)])]
+    options = {'threads': 1}
+
+    key = result_key([str(encoding)], [Function("limit", [Number(10)]), *facts], options)
+
+    assert key == result_key([str(encoding)], [Function("limit", [Number(20)]), *facts], options)
+    assert key == result_key([str(encoding)], [*facts, Function("window", [Number(0), Number(20)])], options)
+    assert key != result_key([str(encoding)], facts, {'threads': 2})
+    encoding.write_text("b.")
+    assert key != result_key([str(encoding)], facts, options)
+
+
+def test_key_covers_loaded_files(tmp_path):
+    encoding, reservations = tmp_path / "encoding.lp", tmp_path / "reservations.lp"
+    encoding.write_text("a.")
+    reservations.write_text("b.")
+    facts = [Function("schedule", [Number(0)])]
+
+    key = result_key([str(encoding), str(reservations)], facts, {})
+
+    assert key != result_key([str(encoding)], facts, {})
+    reservations.write_text("c.")
+    assert key != result_key([str(encoding), str(reservations)], facts, {})
+
+
+def test_results_are_reused_across_horizons(test_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_config(), 'result_cache_path', f"{tmp_path}/cache/")
+    monkeypatch.setattr(get_config(), 'solver_output_path', f"{tmp_path}/")
+    monkeypatch.setattr(get_config(), 'prune_rails', True)
+
+    def solve(limit):
+        return solve_and_simulate('simple_switch_map', 'vertex', 'warning', limit=limit, use_cache=True,
+                                  validator='fast', env_path=test_config.flatland_environments_path)
+
+    # the pruned instance has 16 cells at horizon 7 and 12 at horizon 6, both without a schedule
+    unsatisfiable = [solve(7), solve(6)]
+    satisfiable = [solve(8), solve(20)]
+
+    assert [statistics['fl_result'] for statistics in unsatisfiable] == ["no actions", "no actions"]
+    assert 'ground' in unsatisfiable[0]['phases']
+    assert 'ground' not in unsatisfiable[1]['phases']
+    assert [statistics['fl_result'] for statistics in satisfiable] == ["success", "success"]
+    assert satisfiable[0]['cache'] == {'hit': False, 'horizon': None}
+    assert satisfiable[1]['cache'] == {'hit': True, 'horizon': 8}
+
+
+def test_results_hold_for_other_horizons(tmp_path):
+    cache = ResultCache(path=str(tmp_path), max_size=1)
+    cache.put("key", 10, True, ACTIONS, {'summary': {}})
+    cache.put("key", 5, False, {}, {})
+
+    assert cache.get("key", 9) is None
+    assert cache.get("key", 4)["satisfiable"] is False
+    hit = cache.get("key", 20)
+    assert (hit["horizon"], hit["agent_actions"], hit["statistics"]) == (10, ACTIONS, {'summary': {}})
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(path=str(tmp_path), max_size=1)
+    cache.put("old", 10, True, ACTIONS, {})
+    cache.put("new", 10, True, ACTIONS, {})
+    os.utime(tmp_path / "old" / "10.sat.json", (0, 0))
+
+    cache.max_size = os.path.getsize(tmp_path / "new" / "10.sat.json")
+    cache.evict()
+
+    assert cache.get("old", 10) is None
+    assert cache.get("new", 10) is not None
+    assert not (tmp_path / "old").exists()
@@ -0,0 +1,34 @@
+from rasch.results_store import ResultsStore, environment_seed, flatten_statistics
+
+
+def test_runs_are_appended_with_new_columns(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    store.append({'encoding': "vertex", 'environment': "a", 'mode': "default",
+                  **flatten_statistics({'fl_result': "success", 'summary': {'times': {'total': 2.0}, 'costs': [3]}})})
+    store.append({'encoding': "vertex", 'environment': "a", 'mode': "default",
+                  **flatten_statistics({'fl_result': "success", 'solving': {'solvers': {'choices': 7}}})})
+
+    runs = store.load(['environment', 'summary.times.total', 'summary.costs', 'solving.solvers.choices', 'unknown'])
+    assert len(runs) == 2
+    assert runs['summary.times.total'].tolist()[0] == 2.0
+    assert runs['summary.costs'].tolist()[0] == "[3]"
+    assert runs['unknown'].isna().all()
+
+    latest = store.latest(['run_id', 'solving.solvers.choices'])
+    assert latest['run_id'].tolist() == [2]
+    assert latest['solving.solvers.choices'].tolist() == [7]
+
+
+def test_cache_hits_are_not_compared(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    for git_hash, total, hit in [("aaa1", 2.0, False), ("aaa1", 0.1, True)]:
+        store.append({'git_hash': git_hash, 'encoding': "vertex", 'environment': "a", 'mode': "default",
+                      'cache_hit': hit, 'summary.times.total': total})
+
+    assert store.latest(['summary.times.total'])['summary.times.total'].tolist() == [2.0]
+    assert store.revisions(["aaa"], ['summary.times.total'])['summary.times.total'].tolist() == [2.0]
+
+
+def test_seed_of_generated_environments():
+    assert environment_seed("30x30x2-sparse_s4") == 4
+    assert environment_seed("3x4x2-single_cycle") is None
@@ -0,0 +1,53 @@
+import numpy as np
+
+from rasch.scaling import (
+    ScalingCase,
+    find_regressions,
+    generate_environment,
+    scaling_points,
+)
+
+CASE = ScalingCase(width=20, height=20, agents=2, seed=2)
+
+
+def success(atoms, time):
+    return {'fl_result': "success", 'problem': {'lp': {'atoms': atoms, 'rules': atoms}},
+            'summary': {'times': {'total': time}}, 'schedule': {'flowtime': 10, 'makespan': 5}}
+
+
+def test_environments_are_deterministic():
+    env = generate_environment(CASE)
+    other = generate_environment(CASE)
+
+    assert np.array_equal(env.rail.grid, other.rail.grid)
+    assert [(agent.initial_position, agent.target) for agent in env.agents] == \
+        [(agent.initial_position, agent.target) for agent in other.agents]
+
+
+def test_fixed_placements():
+    env = generate_environment(CASE)
+    placements = tuple((agent.initial_position, agent.target, int(agent.initial_direction)) for agent in env.agents)
+
+    fixed_case = CASE._replace(placements=placements[::-1])
+    fixed = generate_environment(fixed_case)
+
+    assert np.array_equal(env.rail.grid, fixed.rail.grid)
+    assert [(agent.initial_position, agent.target, int(agent.initial_direction)) for agent in fixed.agents] == \
+        list(placements[::-1])
+    assert len({CASE.name, fixed_case.name, fixed_case._replace(placements=placements).name}) == 3
+
+
+def test_regressions():
+    cases = [CASE, CASE._replace(seed=3)]
+    baseline = scaling_points({'vertex': {cases[0].name: success(100, 1.0),
+                                          cases[1].name: success(300, 3.0)}}, cases)
+    assert baseline['vertex']['20x20x2'] == {'cells': 400, 'agents': 2, 'runs': 2, 'success_rate': 1.0,
+                                             'atoms': 200, 'rules': 200, 'time': 2.0, 'flowtime': 10}
+
+    noisy = scaling_points({'vertex': {cases[0].name: success(100, 1.5),
+                                       cases[1].name: success(300, 4.0)}}, cases)
+    assert find_regressions(noisy, baseline, tolerance=0.5) == []
+
+    worse = scaling_points({'vertex': {cases[0].name: success(400, 10.0),
+                                       cases[1].name: {'fl_result': "timeout"}}}, cases)
+    assert len(find_regressions(worse, baseline, tolerance=0.5)) == 4
@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+from clingo.control import Control
+from flatland.envs.step_utils.states import TrainState
+
+from rasch.action import Action
+from rasch.rasch_simulator import RaSchSimulator
+from rasch.rasch_solver import RaSchSolver
+from rasch.rasch_validator import RaSchValidator
+from rasch.rolling_horizon import RollingHorizonPlanner
+
+
+@pytest.fixture
+def simulator(simple_switch_map):
+    return RaSchSimulator(environment=simple_switch_map, renderer=None, logger=logging.getLogger("railway"))
+
+
+def test_trajectory_of_halted_agents(simulator):
+    agents = simulator.environment.agents
+    halted = {idx: dict.fromkeys(range(10), Action.HALT.value) for idx in range(len(agents))}
+
+    assert not simulator.simulate_actions(halted, max_steps=8)
+
+    trajectory = simulator.trajectory
+    assert len(trajectory) == 10
+    assert trajectory.at(0)[0].position is None
+    for idx, agent in enumerate(agents):
+        last = trajectory.agent_at(idx, len(trajectory) - 1)
+        assert last.position == agent.initial_position
+        assert last.direction == agent.initial_direction
+        assert last.state == TrainState.STOPPED
+
+    with pytest.raises(IndexError):
+        trajectory.agent_at(0, len(trajectory))
+
+
+def test_rolling_horizon(test_config, simulator):
+    env = simulator.environment
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+    planner = RollingHorizonPlanner(solver=solver, encoding_name="primitive", window=6, config=test_config)
+
+    assert simulator.simulate_rolling(planner, commit=2, max_steps=20)
+
+    assert planner.rounds > 1
+    assert planner.rolling_statistics['max_atoms'] > 0
+    assert set(simulator.agent_actions) == {0, 1}
+
+    env.reset()
+    validator = RaSchValidator(environment=env, logger=logging.getLogger("railway"))
+    assert validator.validate_actions(simulator.agent_actions, max_steps=20)
+
+
+def test_rolling_horizon_needs_encoding(test_config, simulator):
+    solver = RaSchSolver(environment=simulator.environment,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+
+    with pytest.raises(FileNotFoundError):
+        RollingHorizonPlanner(solver=solver, encoding_name="vertex", window=4, config=test_config)
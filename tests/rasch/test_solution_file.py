@@ -0,0 +1,39 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from rasch.solution_file import (
+    SolutionFile,
+    convert_json_solution,
+    read_solution,
+    write_solution,
+)
+
+
+def test_convert_json_solution(tmp_path):
+    json_path = shutil.copy(Path(__file__).parent / 'solutions' / 'test_solve.json', tmp_path)
+
+    npz_path = convert_json_solution(json_path)
+
+    assert npz_path.endswith('.npz')
+    with open(json_path, 'r') as f:
+        assert read_solution(npz_path) == json.load(f)
+
+
+def test_write_and_read_solution_lazily(tmp_path):
+    agent_actions = {0: {0: 2, 1: 2, 2: 4}, 3: {1: 1}}
+    agent_paths = {0: [(1, 2), (1, 1)]}
+    models = [["done(0,2)", "done(3,1)"], ["done(0,2)"]]
+
+    file_path = write_solution(path=tmp_path, file_name='solve.npz',
+                               agent_actions=agent_actions, agent_paths=agent_paths, models=models)
+
+    with SolutionFile(file_path) as solution:
+        assert solution.actions.dtype == np.int8
+        assert solution.actions.shape == (2, 3)
+        assert solution.agent_actions == agent_actions
+        assert solution.agent_paths == agent_paths
+        assert solution.model_count == 2
+        assert solution.model(1) == models[1]
@@ -0,0 +1,247 @@
+import copy
+import logging
+
+import pytest
+from clingo.control import Control
+
+from rasch.instance_generation import (
+    generate_heuristic_symbols,
+    generate_instance_symbols,
+    generate_window_symbols,
+)
+from rasch.rasch_config import get_config
+from rasch.rasch_setup import solve_and_simulate
+from rasch.rasch_simulator import RaSchSimulator
+from rasch.rasch_solver import RaSchSolver, clingo_arguments
+from rasch.rasch_validator import RaSchValidator
+
+LIMIT = 8
+
+
+def validate(env, agent_actions, max_steps=LIMIT):
+    validator = RaSchValidator(environment=env,
+                               logger=logging.getLogger("railway"))
+    return validator.validate_actions(agent_actions, max_steps=max_steps), validator.first_violation
+
+
+def simulate(env, agent_actions, max_steps=LIMIT):
+    simulator = RaSchSimulator(environment=env,
+                               renderer=None,
+                               logger=logging.getLogger("railway"))
+    return simulator.simulate_actions(agent_actions, max_steps=max_steps)
+
+
+@pytest.mark.parametrize("encoding_name", ["vertex", "primitive"])
+def test_solve_incremental_finds_horizon(test_config, simple_switch_map, encoding_name):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+    solver.add_instance_symbols(generate_instance_symbols(env, 20))
+
+    solver.solve_incremental(encoding_name=encoding_name,
+                             instance_name=None,
+                             max_horizon=20)
+
+    assert solver.horizon is not None
+    assert 0 < solver.horizon <= 20
+    assert set(solver.agent_actions) == {0, 1}
+    assert validate(env, solver.agent_actions, max_steps=solver.horizon) == (True, None)
+
+
+def test_solve_incremental_stops_at_max_horizon(test_config):
+    solver = RaSchSolver(clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+
+    solver.solve_incremental(encoding_name="vertex",
+                             instance_name="test_instance",
+                             max_horizon=1)
+
+    assert solver.horizon is None
+    assert solver.agent_actions == {}
+
+
+def test_clingo_arguments_portfolio():
+    arguments = clingo_arguments(threads=4, parallel_mode="split",
+                                 configuration="data/portfolios/railway.txt")
+
+    assert arguments == ["--parallel-mode=4,split",
+                         "--configuration=data/portfolios/railway.txt"]
+    Control(arguments)
+
+
+@pytest.mark.parametrize("encoding_name", ["vertex", "primitive"])
+def test_domain_heuristic(test_config, simple_switch_map, encoding_name):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(clingo_arguments(heuristic="Domain")),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         domain_heuristic=True)
+    solver.add_instance_symbols([*generate_instance_symbols(env, LIMIT), *generate_heuristic_symbols(env, LIMIT)])
+
+    solver.solve(encoding_name=encoding_name)
+
+    assert "--heuristic=Domain" in clingo_arguments(heuristic="Domain")
+    assert solver.model_count > 0
+    assert set(solver.agent_actions) == {0, 1}
+
+
+@pytest.mark.parametrize("keep_models", [False, True])
+def test_keep_models(test_config, keep_models):
+    solver = RaSchSolver(clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         keep_models=keep_models)
+
+    solver.solve(encoding_name="vertex", instance_name="test_instance")
+
+    assert solver.model_count > 0
+    assert len(solver.models) == (solver.model_count if keep_models else 0)
+    assert set(solver.agent_actions) == {0, 1}
+
+
+def test_keep_models_returns_the_same_schedule(test_config, tmp_path):
+    # the first model waits, the optimal one moves and shows more atoms
+    (tmp_path / "better.lp").write_text("""
+        1 { agent_action(0,2,0); agent_action(0,4,0) } 1.
+        passed(1..3) :- agent_action(0,2,0).
+        #minimize { 1: agent_action(0,4,0) }.
+        #heuristic agent_action(0,4,0). [1,true]
+    """)
+    config = copy.copy(test_config)
+    config.asp_encodings_path = f"{tmp_path}/"
+    solvers = [RaSchSolver(clingo_control=Control(clingo_arguments(heuristic="Domain")),
+                           logger=logging.getLogger("railway"),
+                           config=config,
+                           keep_models=keep_models) for keep_models in (False, True)]
+    for solver in solvers:
+        solver.solve(encoding_name="better")
+    lean, kept = solvers
+
+    assert kept.model_count == 2
+    assert kept.agent_actions == lean.agent_actions == {0: {0: 2}}
+    assert kept.cost == lean.cost == [0]
+
+
+def test_anytime_statistics(test_config):
+    improvements = []
+    solver = RaSchSolver(clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         timeout=30,
+                         on_improvement=improvements.append)
+
+    solver.solve(encoding_name="vertex", instance_name="test_instance")
+
+    assert not solver.interrupted
+    assert solver.optimality == "optimal"
+    assert 0 <= solver.first_model_time == improvements[0]['time']
+    assert improvements[-1]['cost'] == solver.cost
+    assert improvements[-1]['agent_actions'] == solver.agent_actions
+
+
+def test_solve_stops_at_deadline(test_config):
+    solver = RaSchSolver(clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         timeout=0)
+
+    solver.solve(encoding_name="vertex", instance_name="test_instance")
+
+    assert solver.interrupted
+    assert solver.optimality is None
+    assert solver.agent_actions == {}
+
+
+def test_windows_encoding_schedule_is_valid(test_config, simple_switch_map):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+    solver.add_instance_symbols([*generate_instance_symbols(env, LIMIT), *generate_window_symbols(env, LIMIT)])
+    solver.solve(encoding_name="primitive", windows=True)
+
+    assert validate(env, solver.agent_actions) == (True, None)
+
+
+@pytest.mark.parametrize("keep_models", [False, True])
+@pytest.mark.parametrize("group_size", [1, 2])
+def test_prioritized_schedule_is_valid(test_config, simple_switch_map, group_size, keep_models):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         keep_models=keep_models)
+    solver.solve_prioritized(encoding_name="primitive",
+                             instance_symbols=generate_instance_symbols(env, LIMIT),
+                             limit=LIMIT,
+                             group_size=group_size)
+
+    assert set(solver.agent_actions) == {0, 1}
+    assert sorted(solver.priority_order) == [0, 1]
+    assert solver.statistics['summary']['times']['total'] > 0
+    assert len(solver.models) == (solver.model_count if keep_models else 0)
+    assert validate(env, solver.agent_actions) == (True, None)
+    assert simulate(env, solver.agent_actions)
+
+
+def test_prioritized_needs_reservations(test_config, simple_switch_map):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+
+    with pytest.raises(FileNotFoundError):
+        solver.solve_prioritized(encoding_name="vertex",
+                                 instance_symbols=generate_instance_symbols(env, LIMIT),
+                                 limit=LIMIT)
+
+
+@pytest.mark.parametrize("keep_models", [False, True])
+def test_cbs_schedule_is_valid(test_config, simple_switch_map, keep_models):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config,
+                         keep_models=keep_models)
+    solver.solve_cbs(encoding_name="primitive",
+                     instance_symbols=generate_instance_symbols(env, LIMIT),
+                     limit=LIMIT)
+
+    assert set(solver.agent_actions) == {0, 1}
+    assert solver.cbs_statistics['nodes_expanded'] >= 1
+    assert solver.cbs_statistics['low_level_solves'] >= 2
+    assert solver.cost == [sum(max(steps) + 1 for steps in solver.agent_actions.values())]
+    assert len(solver.models) == (solver.model_count if keep_models else 0)
+    assert validate(env, solver.agent_actions) == (True, None)
+    assert simulate(env, solver.agent_actions)
+
+
+def test_cbs_needs_constraints(test_config, simple_switch_map):
+    env = simple_switch_map
+    solver = RaSchSolver(environment=env,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+
+    with pytest.raises(FileNotFoundError):
+        solver.solve_cbs(encoding_name="vertex",
+                         instance_symbols=generate_instance_symbols(env, LIMIT),
+                         limit=LIMIT)
+
+
+def test_cbs_statistics_without_schedule(test_config, tmp_path, monkeypatch):
+    monkeypatch.setattr(get_config(), 'solver_output_path', f"{tmp_path}/")
+
+    statistics = solve_and_simulate('simple_switch_map', 'primitive', 'warning', limit=1, use_cache=False,
+                                    strategy='cbs', env_path=test_config.flatland_environments_path)
+
+    assert statistics['fl_result'] == "no actions"
+    assert statistics['cbs']['low_level_solves'] >= 1
@@ -0,0 +1,117 @@
+import logging
+
+import pytest
+from clingo.control import Control
+
+from rasch.action import Action
+from rasch.instance_generation import generate_instance_symbols
+from rasch.instrumentation import PhaseTimer
+from rasch.rasch_setup import SolvedJob, finish_job, solve_and_simulate
+from rasch.rasch_simulator import RaSchSimulator
+from rasch.rasch_solver import RaSchSolver
+from rasch.rasch_validator import RaSchValidator, Violation
+
+HORIZON = 20
+
+
+@pytest.fixture
+def agent_actions(test_config, simple_switch_map):
+    solver = RaSchSolver(environment=simple_switch_map,
+                         clingo_control=Control(),
+                         logger=logging.getLogger("railway"),
+                         config=test_config)
+    solver.add_instance_symbols(generate_instance_symbols(solver.environment, HORIZON))
+    solver.solve(encoding_name="vertex")
+
+    return solver.agent_actions
+
+
+def validate(env, agent_actions):
+    validator = RaSchValidator(environment=env,
+                               logger=logging.getLogger("railway"))
+    return validator.validate_actions(agent_actions, max_steps=HORIZON), validator.first_violation
+
+
+def simulate(env, agent_actions):
+    simulator = RaSchSimulator(environment=env,
+                               renderer=None,
+                               logger=logging.getLogger("railway"))
+    return simulator.simulate_actions(agent_actions, max_steps=HORIZON)
+
+
+def test_valid_schedule(simple_switch_map, agent_actions):
+    assert validate(simple_switch_map, agent_actions) == (True, None)
+    assert simulate(simple_switch_map, agent_actions)
+
+
+def test_missed_target(simple_switch_map, agent_actions):
+    # the agents start on each other's targets, an agent arriving at the cell of a halted agent collides with it
+    halted = {id: dict.fromkeys(range(HORIZON), Action.HALT.value) for id in agent_actions}
+
+    valid, (violation, _, agents) = validate(simple_switch_map, halted)
+
+    assert not valid
+    assert (violation, agents) == (Violation.MISSED_TARGET, [0, 1])
+    assert not simulate(simple_switch_map, halted)
+
+
+def test_missing_action(simple_switch_map, agent_actions):
+    actions = {id: dict(steps) for id, steps in agent_actions.items()}
+    del actions[1][2]
+
+    valid, violation = validate(simple_switch_map, actions)
+
+    assert not valid
+    assert violation == (Violation.MISSING_ACTION, 2, [1])
+
+
+def test_invalid_move(simple_switch_map, agent_actions):
+    simple_switch_map.agents[0].initial_direction = 0  # no rail leaves the start of agent 0 to the north
+
+    valid, violation = validate(simple_switch_map, agent_actions)
+
+    assert not valid
+    assert violation == (Violation.INVALID_MOVE, 1, [0])
+
+
+def test_collision(simple_switch_map):
+    # both agents enter the switch between them
+    forward = {id: dict.fromkeys(range(HORIZON), Action.FORWARD.value) for id in (0, 1)}
+
+    valid, violation = validate(simple_switch_map, forward)
+
+    assert not valid
+    assert violation == (Violation.COLLISION, 0, [0, 1])
+    assert not simulate(simple_switch_map, forward)
+
+
+def test_swap(simple_switch_map):
+    # agent 1 enters the switch, then both agents move into each other's cell
+    actions = {0: {0: Action.HALT.value, **dict.fromkeys(range(1, HORIZON), Action.FORWARD.value)},
+               1: dict.fromkeys(range(HORIZON), Action.FORWARD.value)}
+
+    valid, violation = validate(simple_switch_map, actions)
+
+    assert not valid
+    assert violation == (Violation.SWAP, 1, [0, 1])
+
+
+def test_flatland_decides_rejected_schedules(test_config, simple_switch_map):
+    # agent 1 moves onto the switch while agent 0 halts there, Flatland holds agent 1 back and both still arrive
+    actions = {0: {0: 4, 1: 0, 2: 2, 3: 4, 4: 4, 5: 2, 6: 2, 7: 4, 8: 4, 9: 3},
+               1: {0: 2, 1: 1, 2: 2, 3: 2, 4: 2, 5: 2, 6: 2, 7: 2, 8: 2, 9: 4}}
+    solved = SolvedJob(env=simple_switch_map, enc_name="vertex", env_name="simple_switch_map", agent_actions=actions,
+                       limit=10, statistics={}, details={}, validator='fast', norender=False,
+                       timer=PhaseTimer(), logger=logging.getLogger("railway"))
+
+    statistics = finish_job(solved)
+
+    assert statistics['fl_result'] == "success"
+    assert statistics['validation']['violation'] == {'type': "COLLISION", 'step': 4, 'agents': [0, 1]}
+    assert not statistics['validation']['agree']
+
+
+def test_unknown_validator(test_config):
+    with pytest.raises(ValueError, match="Unknown validator"):
+        solve_and_simulate('simple_switch_map', 'vertex', 'warning', validator='replay',
+                           env_path=test_config.flatland_environments_path)
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from rasch import worker_pool
+from rasch.rasch_config import get_config
+from rasch.rasch_setup import PreparedJob
+from rasch.worker_pool import WorkerPool
+
+
+@pytest.fixture
+def solver_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_config(), 'solver_output_path', f"{tmp_path}/")  # forked workers inherit it
+    return tmp_path
+
+
+def test_workers_keep_environments(test_config, solver_output):
+    kwargs = {'env_name': 'simple_switch_map', 'enc_name': 'vertex', 'loglevel': 'warning', 'limit': 20,
+              'validator': 'fast', 'use_cache': False, 'env_path': test_config.flatland_environments_path}
+    envs = {}
+
+    first = worker_pool.solve_job(kwargs, envs)
+    env = next(iter(envs.values()))
+    second = worker_pool.solve_job(kwargs, envs)
+
+    assert first['fl_result'] == second['fl_result'] == "success"
+    assert next(iter(envs.values())) is env
+    assert (solver_output / "vertex_simple_switch_map_solve.npz").exists()
+
+
+def test_hanging_worker_is_replaced(monkeypatch):
+    def fake_solve_job(kwargs, envs=None):  # runs in the forked workers
+        if kwargs['env_name'] == "hang":
+            time.sleep(60)
+        return {"fl_result": "success", "timeout": kwargs['timeout']}
+
+    monkeypatch.setattr(worker_pool, "solve_job", fake_solve_job)
+
+    with WorkerPool(processes=1, timeout=0.5, hang_grace=0.5) as pool:
+        for job in ["hang", "fast"]:
+            pool.submit(job, {'env_name': job, 'enc_name': "vertex"})
+        results = dict(pool.results())
+
+    assert results == {"hang": {"fl_result": "timeout"}, "fast": {"fl_result": "success", "timeout": 0.5}}
+
+
+def test_streamed_model_survives_hanging_worker(monkeypatch):
+    def fake_solve_job(kwargs, envs=None):  # runs in the forked workers
+        kwargs['on_model']({'cost': [7], 'time': 0.1, 'agent_actions': {0: {0: 2}}})
+        time.sleep(60)
+
+    monkeypatch.setattr(worker_pool, "solve_job", fake_solve_job)
+
+    with WorkerPool(processes=1, timeout=0.5, hang_grace=0.5) as pool:
+        statistics = pool.solve({'env_name': "hang", 'enc_name': "vertex"})
+
+    assert statistics == {'fl_result': "timeout",
+                          'anytime': {'cost': [7], 'time': 0.1, 'agent_actions': {0: {0: 2}}, 'validated': False}}
+
+
+def test_pipelined_workers_solve_all_jobs(test_config, solver_output):
+    kwargs = {'enc_name': 'vertex', 'loglevel': 'warning', 'limit': 20, 'validator': 'fast', 'use_cache': False,
+              'env_path': test_config.flatland_environments_path}
+
+    with WorkerPool(processes=1, timeout=5, pipeline_depth=1) as pool:
+        for job in range(3):
+            pool.submit(job, {**kwargs, 'env_name': 'simple_switch_map'})
+        results = dict(pool.results())
+
+    assert sorted(results) == [0, 1, 2]
+    assert all(statistics['fl_result'] == "success" for statistics in results.values())
+    assert all('solver_wait' in statistics['pipeline'] for statistics in results.values())
+
+
+def test_hanging_preparation_is_replaced(test_config, monkeypatch):
+    def fake_prepare_job(env, limit, **kwargs):  # runs in the forked workers
+        if limit == 60:
+            time.sleep(60)
+        return PreparedJob(env, limit, 'limit', [], {})
+
+    def fake_solve_job(kwargs, envs=None, prepared=None):
+        return {"fl_result": "success"}
+
+    monkeypatch.setattr(worker_pool, "prepare_job", fake_prepare_job)
+    monkeypatch.setattr(worker_pool, "solve_job", fake_solve_job)
+    kwargs = {'enc_name': 'vertex', 'env_name': 'simple_switch_map', 'env_path': test_config.flatland_environments_path}
+
+    with WorkerPool(processes=1, timeout=0.5, hang_grace=0.5, pipeline_depth=1) as pool:
+        for job, limit in [("first", 20), ("hang", 60)]:
+            pool.submit(job, {**kwargs, 'limit': limit})
+        results = dict(pool.results())
+
+    assert results["first"]["fl_result"] == "success"
+    assert results["hang"] == {"fl_result": "timeout"}
+